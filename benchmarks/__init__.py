@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+    Performance benchmarks for Folio.
+
+    Run them from the top level directory::
+
+        $ python -m benchmarks.run --pages 1000 --output results.json
+        $ python -m benchmarks.run --compare results.json
+"""
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+    Runs the Folio benchmarks over a synthetic site and emits the results as
+    JSON, so they can be compared between commits::
+
+        $ python -m benchmarks.run --pages 500 --output before.json
+        $ git checkout feature
+        $ python -m benchmarks.run --pages 500 --compare before.json
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import threading
+import subprocess
+import tracemalloc
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+from benchmarks.sitegen import generate_site
+
+__all__ = ['run_benchmarks', 'compare']
+
+
+def timeit(func, repeat=1):
+    """Call the function `repeat` times and return the best wall time."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def git_revision():
+    """Returns the current commit of the repository, if any."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_build(site, repeat):
+    """Measure the cold build, the no-op rebuild and the rebuild after a
+    single file was modified."""
+    results = {}
+
+    def cold():
+        if os.path.exists(site.build_path):
+            rmtree(site.build_path)
+        site.create_folio().build()
+    results['cold_build'] = timeit(cold, repeat)
+
+    proj = site.create_folio()
+    proj.build()
+    results['noop_rebuild'] = timeit(proj.build, repeat)
+
+    def edit():
+        site.touch(0)
+        proj.build()
+    results['edit_rebuild'] = timeit(edit, repeat)
+
+    # The watcher of the development server only rebuilds the modified
+    # template, this is the best case for an edit.
+    def edit_template():
+        proj.build_template(site.touch(0))
+    results['edit_build_template'] = timeit(edit_template, repeat)
+
+    return results
+
+
+def output_size(path, extensions=('.html', '.css')):
+    """Returns the total size of the HTML and CSS files of a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] in extensions:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def bench_minify(site, repeat):
+    """Measure the cost of minifying the HTML and CSS outputs, without and
+    with a warm cache of minified files, and the bytes saved."""
+    cache_path = os.path.join(site.root, 'minify-cache')
+
+    def build(minify=False, cache=False):
+        if os.path.exists(site.build_path):
+            rmtree(site.build_path)
+        if not cache and os.path.exists(cache_path):
+            rmtree(cache_path)
+        proj = site.create_folio()
+        if minify:
+            proj.config['MINIFY_PATTERNS'] = ['*.html', '*.css']
+            proj.config['MINIFY_CACHE_PATH'] = cache_path
+        proj.build()
+
+    results = {'minify_plain_build': timeit(build, repeat)}
+    size = output_size(site.build_path)
+
+    results['minify_cold_build'] = timeit(lambda: build(True), repeat)
+    minified = output_size(site.build_path)
+    results['minify_warm_build'] = timeit(lambda: build(True, True),
+                                          repeat)
+
+    results['minify_bytes_before'] = size
+    results['minify_bytes_saved'] = size - minified
+    return results
+
+
+def bench_memory(site):
+    """Measure the peak of memory allocated by Python during a cold
+    build."""
+    if os.path.exists(site.build_path):
+        rmtree(site.build_path)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        site.create_folio().build()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_memory': peak}
+
+
+def bench_server(site, requests):
+    """Measure the request throughput of the development server."""
+    from folio.server import FolioHTTPServer, FolioHTTPRequestHandler
+
+    proj = site.create_folio()
+    proj.build()
+
+    server = FolioHTTPServer(proj, ('127.0.0.1', 0), FolioHTTPRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    host, port = server.server_address
+    paths = ['/pages/page%d.html' % (n % site.params['pages'])
+             for n in range(requests)]
+    latencies = []
+    try:
+        start = time.perf_counter()
+        for path in paths:
+            t = time.perf_counter()
+            conn = HTTPConnection(host, port)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    latencies.sort()
+    return {
+        'server_requests_per_second': len(paths) / elapsed,
+        'server_latency_p50': latencies[len(latencies) // 2],
+        'server_latency_p99': latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def bench_startup(site, repeat):
+    """Measure the startup of short invocations in new processes: the
+    interpreter alone, importing Folio, creating the project of the site
+    (with and without the cached extension index), resolving a built-in
+    extension by name compared with importing it, and a no-op build through
+    the daemon client."""
+    from folio.daemon import BuildDaemon
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_path = os.path.join(site.root, 'extensions.json')
+    env = dict(os.environ, PYTHONPATH=root, FOLIO_EXTENSIONS_CACHE=cache_path)
+
+    def python(code, *args, **kwargs):
+        return lambda: subprocess.check_call(
+            [sys.executable, '-c', code] + list(args),
+            env=kwargs.get('env', env), stdout=subprocess.DEVNULL)
+
+    # Without the cached index, as in most processes.
+    uncached = dict(env)
+    uncached.pop('FOLIO_EXTENSIONS_CACHE')
+
+    project = ('import sys\n'
+               'from benchmarks.sitegen import Site\n'
+               'Site(sys.argv[1], **%r).create_folio().init_config()\n'
+               % site.params)
+
+    def cold_registry():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        python(project, site.root)()
+
+    results = {
+        'startup_python': timeit(python('pass'), repeat),
+        'startup_import': timeit(python('import folio'), repeat),
+        'startup_project_cold_registry': timeit(cold_registry, repeat),
+        'startup_project': timeit(python(project, site.root), repeat),
+        'startup_import_builtin': timeit(python(
+            'import folio.ext.themes', env=uncached), repeat),
+        'startup_resolve_builtin': timeit(python(
+            'from folio.registry import registry\n'
+            'registry.resolve("themes")', env=uncached), repeat),
+    }
+
+    address = os.path.join(site.root, 'folio.sock')
+    daemon = BuildDaemon(site.create_folio(), address)
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        while daemon.server is None and thread.is_alive():
+            thread.join(0.01)
+        results['startup_daemon_build'] = timeit(python(
+            'from folio.daemon import main; main()',
+            'build', '--socket', address), repeat)
+    finally:
+        daemon.shutdown()
+        thread.join()
+
+    return results
+
+
+def run_benchmarks(root=None, repeat=3, requests=500, **params):
+    """Generate a site and run every benchmark on it. Returns a dictionary
+    with the environment, the parameters and the measured metrics (times in
+    seconds, memory in bytes).
+
+    :param root: Where to generate the site. A temporary directory is used
+                 and removed at the end if not given.
+    :param repeat: How many times each timing is repeated. The best time is
+                   kept.
+    :param requests: Number of requests made to the development server.
+    :param params: Parameters for :func:`benchmarks.sitegen.generate_site`.
+    """
+    tmp = root is None
+    if tmp:
+        root = mkdtemp(prefix='folio-bench-')
+
+    try:
+        site = generate_site(root, **params)
+
+        metrics = {}
+        metrics.update(bench_build(site, repeat))
+        metrics.update(bench_memory(site))
+        metrics.update(bench_minify(site, repeat))
+        metrics.update(bench_startup(site, repeat))
+        if requests:
+            metrics.update(bench_server(site, requests))
+    finally:
+        if tmp:
+            rmtree(root)
+
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': site.params,
+        'metrics': metrics,
+    }
+
+
+def compare(old, new):
+    """Returns a table comparing the metrics of two results."""
+    lines = ['%-28s %14s %14s %8s' % ('Metric', old.get('revision') or 'old',
+                                      new.get('revision') or 'new', 'Ratio')]
+    for name in sorted(new['metrics']):
+        a = old['metrics'].get(name)
+        b = new['metrics'][name]
+        ratio = '%7.2fx' % (b / a) if a else '-'
+        lines.append('%-28s %14.6g %14.6g %8s' % (
+            name, a if a is not None else float('nan'), b, ratio))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run Folio benchmarks.')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--includes', type=int, default=5)
+    parser.add_argument('--markdown', type=int, default=50)
+    parser.add_argument('--assets', type=int, default=2)
+    parser.add_argument('--asset-size', type=int, default=1024 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--root', help='Generate the site here and keep it.')
+    parser.add_argument('--output', help='Write the JSON results here.')
+    parser.add_argument('--compare', help='JSON results to compare with.')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(root=args.root, repeat=args.repeat,
+                             requests=args.requests, pages=args.pages,
+                             depth=args.depth, includes=args.includes,
+                             markdown=args.markdown, assets=args.assets,
+                             asset_size=args.asset_size)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            sys.stderr.write(compare(json.load(f), results) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    Synthetic site generator for the benchmarks.
+
+    Generates a Folio project with a configurable number of pages, a chain of
+    layouts that extend each other, a set of includes, Markdown sources for
+    the :mod:`folio.ext.mdwnbuilder` extension, a theme for the
+    :mod:`folio.ext.themes` extension and some large static assets.
+"""
+
+from __future__ import with_statement
+
+import os
+import random
+
+__all__ = ['Site', 'generate_site']
+
+
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+
+class Site(object):
+    """A generated site. It knows where everything is and how to create a
+    project for it.
+
+    :param root: The project root directory.
+    :param params: The parameters used to generate the site.
+    """
+
+    def __init__(self, root, **params):
+        self.root = root
+        self.params = params
+
+        self.source_path = os.path.join(root, 'src')
+        self.build_path = os.path.join(root, 'build')
+        self.themes_path = os.path.join(root, 'themes')
+
+    def create_folio(self):
+        """Create a new project for the site."""
+        from folio import Folio
+
+        extensions = ['themes']
+        if self.params.get('markdown'):
+            extensions.append('mdwnbuilder')
+
+        proj = Folio(__name__, source_path=self.source_path,
+                     build_path=self.build_path, extensions=extensions)
+        proj.config.update({
+            'THEME': 'bench',
+            'THEMES_PATHS': [self.themes_path],
+            'MARKDOWN_TEMPLATE': '_layouts/markdown.html',
+        })
+
+        @proj.context('*')
+        def site_context(env):
+            return {'site_name': 'Benchmark', 'nav': self.nav}
+
+        return proj
+
+    @property
+    def nav(self):
+        pages = min(self.params.get('pages', 0), 20)
+        return [('Page %d' % i, 'pages/page%d.html' % i)
+                for i in range(pages)]
+
+    def page_path(self, n=0):
+        """Returns the source path of the n-th page."""
+        return os.path.join(self.source_path, 'pages', 'page%d.html' % n)
+
+    def touch(self, n=0):
+        """Modify the n-th page, changing its content and its modification
+        time. Returns the template name."""
+        filename = self.page_path(n)
+        with open(filename, 'a') as f:
+            f.write('\n<!-- edited -->\n')
+        mtime = os.path.getmtime(filename) + 1
+        os.utime(filename, (mtime, mtime))
+        return os.path.relpath(filename, self.source_path)
+
+
+def _write(filename, content, mode='w'):
+    dirname = os.path.dirname(filename)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(filename, mode) as f:
+        f.write(content)
+
+
+def generate_site(root, pages=100, depth=3, includes=5, markdown=20,
+                  assets=2, asset_size=1024 * 1024, seed=42):
+    """Generate a synthetic site in the given root directory.
+
+    :param root: The project directory. It will be created if not exists.
+    :param pages: Number of HTML template pages.
+    :param depth: Depth of the layout inheritance chain.
+    :param includes: Number of includes used in every page.
+    :param markdown: Number of Markdown sources.
+    :param assets: Number of large static assets.
+    :param asset_size: Size in bytes of each static asset.
+    :param seed: Seed for the random content, to make sites reproducible.
+    """
+    rnd = random.Random(seed)
+    site = Site(root, pages=pages, depth=depth, includes=includes,
+                markdown=markdown, assets=assets, asset_size=asset_size)
+
+    # The theme has the root layout and a stylesheet.
+    theme_path = os.path.join(site.themes_path, 'bench')
+    _write(os.path.join(theme_path, '_base.html'), """<!doctype html>
+<html><head><title>{% block title %}{{ site_name }}{% endblock %}</title>
+<link rel="stylesheet" href="/style.css"></head>
+<body>
+<nav>{% for title, url in nav %}<a href="/{{ url }}">{{ title }}</a>
+{% endfor %}</nav>
+{% block body %}{% endblock %}
+</body></html>
+""")
+    _write(os.path.join(theme_path, 'style.css'),
+           ''.join('.c%d { margin: %dpx; }\n' % (i, i) for i in range(200)))
+
+    # A chain of layouts, each one extending the previous one.
+    layouts = os.path.join(site.source_path, '_layouts')
+    parent = 'theme("_base.html")'
+    for level in range(depth):
+        _write(os.path.join(layouts, 'level%d.html' % level),
+               '{%% extends %s %%}\n'
+               '{%% block body %%}<div class="level%d">{{ super() }}'
+               '{%% block level%d %%}{%% endblock %%}</div>{%% endblock %%}\n'
+               % (parent, level, level))
+        parent = '"_layouts/level%d.html"' % level
+    last = 'level%d' % (depth - 1) if depth else None
+    block = last or 'body'
+
+    _write(os.path.join(layouts, 'markdown.html'),
+           '{%% extends %s %%}\n'
+           '{%% block %s %%}<article>{{ content }}</article>{%% endblock %%}\n'
+           % (parent, block))
+
+    for i in range(includes):
+        _write(os.path.join(site.source_path, '_includes', 'inc%d.html' % i),
+               '<aside class="inc%d">{%% for i in range(10) %%}'
+               '<p>{{ i }} %s</p>{%% endfor %%}</aside>\n' % (i, LOREM))
+
+    for n in range(pages):
+        body = ''.join('{%% include "_includes/inc%d.html" %%}\n' % i
+                       for i in range(includes))
+        body += '<p>%s</p>\n' % (LOREM * rnd.randint(5, 50))
+        _write(site.page_path(n),
+               '{%% extends %s %%}\n'
+               '{%% block title %%}Page %d{%% endblock %%}\n'
+               '{%% block %s %%}\n%s{%% endblock %%}\n'
+               % (parent, n, block, body))
+
+    for n in range(markdown):
+        paragraphs = '\n\n'.join(LOREM * rnd.randint(2, 10)
+                                 for _ in range(rnd.randint(5, 20)))
+        _write(os.path.join(site.source_path, 'posts', 'post%d.md' % n),
+               '# Post %d\n\n* one\n* two\n\n%s\n' % (n, paragraphs))
+
+    for n in range(assets):
+        _write(os.path.join(site.source_path, 'static', 'asset%d.bin' % n),
+               bytes(bytearray(rnd.getrandbits(8) for _ in range(1024)))
+               * (asset_size // 1024), mode='wb')
+
+    return site
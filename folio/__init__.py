@@ -6,15 +6,24 @@
 import os
 import sys
 import fnmatch
+import inspect
+import time
 import logging
+import threading
+
+from contextlib import contextmanager
 
 if sys.version > '3':
     basestring = str
 
-from jinja2 import Environment, ChoiceLoader, FileSystemLoader
-
-from .builders import static_builder, template_builder
+# Jinja and the builders are imported when a project is created or built, so
+# importing Folio is fast, for example for the daemon client.
+from .contexts import BatchContext, EventLoop, resolve_awaitables
 from .helpers import lazy_property
+from .manifest import Manifest, builder_key
+from .output import DirectoryOutput
+from .pipeline import Pipeline
+from .profiling import null_span
 
 __all__ = ['Folio']
 __version__ = '0.4'
@@ -54,6 +63,40 @@ class Folio(object):
 
         'STATIC_BUILDER_PATTERN':               '*',
         'TEMPLATE_BUILDER_PATTERN':             '*.html',
+
+        'INDEX_PATTERNS':                       [],
+        'CONTEXT_WORKERS':                      0,
+
+        'DATA_PATH':                            'data',
+        'DATA_FORMATS':                         ['json', 'csv', 'ini'],
+        'DATA_CHECK':                           'mtime',
+
+        'MINIFY_PATTERNS':                      [],
+        'MINIFY_CACHE_PATH':                    None,
+
+        'BUILD_TIMEOUT':                        None,
+        'BUILD_WORKERS':                        0,
+        'BUILD_FORKS':                          0,
+
+        'BUNDLES':                              {},
+        'BUNDLES_MINIFY':                       False,
+        'BUNDLES_URL':                          '/',
+
+        'SEARCH_PATTERNS':                      [],
+        'SEARCH_INDEX':                         'search.json',
+        'SEARCH_CHUNKS':                        False,
+        'SEARCH_STATE_PATH':                    None,
+
+        'LINK_CHECK':                           False,
+        'LINK_CHECK_WORKERS':                   None,
+
+        'MANIFEST_PATH':                        None,
+        'SHARD_PATH':                           '%(build_path)s.shard'
+                                                '%(index)d',
+
+        'PROFILE':                              False,
+        'PROFILE_MEMORY':                       False,
+        'PROFILE_TRACE':                        None,
     }
 
     def __init__(self, import_name, source_path='src', build_path='build',
@@ -103,6 +146,9 @@ class Folio(object):
         #:
         #: Only the jinja environment is passed to the context function. If
         #: you need more control, you should write an extension.
+        #:
+        #: Context functions could be `async` functions too. The ones for the
+        #: same template are awaited concurrently.
         self.contexts = []
 
         #: Builders are the core of folio, this will link a filename match with
@@ -114,6 +160,76 @@ class Folio(object):
         #: as output file in the build directory.
         self.builders = []
 
+        #: The transforms applied to the outputs of the builders before they
+        #: are written, by template name pattern. Add them with
+        #: :meth:`add_transform`.
+        self.pipeline = Pipeline()
+
+        #: Functions called at the beginning of every build, with the project
+        #: as the only argument. Register them with :meth:`before_build`.
+        self.before_build_funcs = []
+
+        #: Functions called at the end of every build, with the project and
+        #: the set of builded templates. Register them with
+        #: :meth:`after_build`.
+        self.after_build_funcs = []
+
+        #: The content index, an instance of :class:`folio.index.ContentIndex`
+        #: with the front matter of the templates that match the patterns of
+        #: the `INDEX_PATTERNS` configuration. None if there are no patterns.
+        self.index = None
+
+        #: The loader of the data files, an instance of
+        #: :class:`folio.data.DataLoader`. None if the `DATA_PATH` directory
+        #: doesn't exists.
+        self.data = None
+
+        #: Files other than its source that a template used to be built, by
+        #: template name. For example the data files it read. This is used to
+        #: know which templates to rebuild when one of these files changes.
+        self.dependencies = {}
+
+        #: The record of the last build of every template, an instance of
+        #: :class:`folio.manifest.Manifest`. Incremental builds use it to
+        #: skip the templates that are up to date.
+        self.manifest = Manifest()
+
+        #: The templates that failed in the last isolated or forked build, a
+        #: list of :class:`folio.isolation.Failure`. See the `BUILD_TIMEOUT`
+        #: and `BUILD_FORKS` configuration.
+        self.failures = []
+
+        #: The asset bundles, an instance of :class:`folio.bundles.Bundler`.
+        #: None until a bundle is added with :meth:`add_bundle` or the
+        #: `BUNDLES` configuration.
+        self.bundles = None
+
+        #: The client side search index, an instance of
+        #: :class:`folio.search.SearchIndex`, if the `SEARCH_PATTERNS`
+        #: configuration is set.
+        self.search_index = None
+
+        #: The result of the last link check, an instance of
+        #: :class:`folio.linkcheck.LinkReport`. See :meth:`check_links`.
+        self.link_report = None
+        self._link_checker = None
+
+        # The manifest version of the last sync, by target directory.
+        self._synced = {}
+
+        #: Per thread state, like the template being built.
+        self._local = threading.local()
+
+        # The positions of the builders and transforms registered by
+        # init_config.
+        self._configured = (slice(0, 0), slice(0, 0))
+
+        # The event loop of the build being run, created when the first
+        # awaitable context is resolved and closed at the end of the build.
+        self._building = False
+        self._event_loop = None
+        self._event_loop_lock = threading.Lock()
+
         #: The jinja environment is used to make a list of the templates, and
         #: it's used by the builders to dump output files.
         self.env = self._create_jinja_environment(jinja_extensions)
@@ -167,6 +283,15 @@ class Folio(object):
         configuration."""
         new_config = {}
         new_config.update(self.default_config)
+
+        # Copy the lists and dictionaries, so they are not shared between
+        # projects.
+        for key, value in new_config.items():
+            if isinstance(value, list):
+                new_config[key] = list(value)
+            elif isinstance(value, dict):
+                new_config[key] = dict(value)
+
         return new_config
 
     def init_config(self):
@@ -175,7 +300,14 @@ class Folio(object):
         if self.config_initialized:
             return
 
+        # The builders and transforms registered from the configuration, the
+        # variants register their own instead of sharing them.
+        builders = len(self.builders)
+        transforms = len(self.pipeline.transforms)
+
         if not self.builders:
+            from .builders import static_builder, template_builder
+
             self.add_builder(self.config['STATIC_BUILDER_PATTERN'],
                              static_builder)
             self.add_builder(self.config['TEMPLATE_BUILDER_PATTERN'],
@@ -189,17 +321,86 @@ class Folio(object):
         for jinja_extension in self.config.get('JINJA_EXTENSIONS', []):
             self.env.add_extension(jinja_extension)
 
+        # Create the content index. It could be already given, shared with
+        # another project.
+        if self.config['INDEX_PATTERNS'] or self.index is not None:
+            from .index import ContentIndex, FrontMatterExtension
+
+            if self.index is None:
+                self.index = ContentIndex(self,
+                                          self.config['INDEX_PATTERNS'])
+            self.env.add_extension(FrontMatterExtension)
+            self.env.globals['index'] = self.index
+
+        # Create the data loader, only if there is a data directory.
+        data_path = self._make_abspath(self.config['DATA_PATH'])
+        if self.data is None and os.path.isdir(data_path):
+            from .data import DataLoader
+
+            self.data = DataLoader(self, data_path,
+                                   self.config['DATA_FORMATS'],
+                                   self.config['DATA_CHECK'])
+        if self.data is not None:
+            from .data import DataNamespace
+
+            self.env.globals['data'] = DataNamespace(self.data)
+
+        # Minify the outputs that match the patterns.
+        if self.config['MINIFY_PATTERNS']:
+            from .minify import Minifier
+
+            cache_path = self.config['MINIFY_CACHE_PATH']
+            if cache_path:
+                cache_path = self._make_abspath(cache_path)
+            self.add_transform(self.config['MINIFY_PATTERNS'],
+                               Minifier(cache_path))
+
+        # Add the bundles of the configuration.
+        for name, members in sorted(self.config['BUNDLES'].items()):
+            self.add_bundle(name, members)
+
+        # Index the words of the pages that match the patterns.
+        if self.config['SEARCH_PATTERNS'] and self.search_index is None:
+            from .search import SearchIndex
+
+            state_path = self.config['SEARCH_STATE_PATH']
+            if state_path:
+                state_path = self._make_abspath(state_path)
+            self.search_index = SearchIndex(self,
+                                            self.config['SEARCH_PATTERNS'],
+                                            self.config['SEARCH_INDEX'],
+                                            self.config['SEARCH_CHUNKS'],
+                                            state_path)
+            self.add_transform(self.config['SEARCH_PATTERNS'],
+                               self.search_index)
+            self.before_build(self.search_index.begin)
+            self.after_build(self.search_index.finish)
+
+        # Enable the profiler if requested by the configuration.
+        if self.config['PROFILE'] and self.profiler is None:
+            self.profile(self.config['PROFILE_MEMORY'])
+
+        self._configured = (slice(builders, len(self.builders)),
+                            slice(transforms, len(self.pipeline.transforms)))
         self.config_initialized = True
 
     @lazy_property
     def jinja_loader(self):
-        """Create a Jinja loader."""
-        return ChoiceLoader([
-            FileSystemLoader(searchpath=self.source_path)
-        ])
+        """Create a Jinja loader. If the source path is an archive, the
+        templates are loaded from its members."""
+        from jinja2 import ChoiceLoader, FileSystemLoader
+        from .archive import ArchiveLoader, is_archive
+
+        if is_archive(self.source_path):
+            loader = ArchiveLoader(self.source_path, self.encoding)
+        else:
+            loader = FileSystemLoader(searchpath=self.source_path)
+        return ChoiceLoader([loader])
 
     def _create_jinja_environment(self, extensions):
         """Create a Jinja environment."""
+        from jinja2 import Environment
+
         env = Environment(loader=self.jinja_loader,
                           extensions=extensions)
         env.globals.update({
@@ -207,8 +408,84 @@ class Folio(object):
             'version': __version__,
         })
 
+        # The profiler is stored in the environment so the builders can
+        # report their own phases with :func:`folio.profiling.span`.
+        env.extend(profiler=None)
+
+        # The builders apply the transforms of the pipeline to their outputs,
+        # and write them with the output backend.
+        env.extend(pipeline=self.pipeline, output=DirectoryOutput())
+
+        # The templates loaded while building another one, like layouts and
+        # includes, are recorded as its dependencies.
+        get_template = env.get_template
+
+        def get_template_dependency(*args, **kwargs):
+            template = get_template(*args, **kwargs)
+            if template.filename and \
+                    template.name != self.current_template:
+                self.add_dependency(template.filename)
+            return template
+
+        env.get_template = get_template_dependency
+
         return env
 
+    @property
+    def profiler(self):
+        """The :class:`folio.profiling.Profiler` recording the builds, or
+        None if profiling is disabled."""
+        return self.env.profiler
+
+    def _get_output(self):
+        return self.env.output
+
+    def _set_output(self, output):
+        if output.root is None:
+            output.root = self.build_path
+        self.env.output = output
+
+    output = property(_get_output, _set_output, doc="""
+        The output backend where the builders write, an instance of
+        :class:`folio.output.DirectoryOutput` by default. See
+        :mod:`folio.output`.
+
+        .. versionadded:: 0.5
+        """)
+    del _get_output, _set_output
+
+    def profile(self, trace_memory=False):
+        """Enable the profiling of the builds. Every template build will be
+        measured per phase: builder lookup, context resolution (and every
+        context function), template compilation and the builder call.
+
+        The profiler can be also enabled with the `PROFILE` configuration key.
+        In that case the summary is logged at the end of every build and, if
+        `PROFILE_TRACE` is set, a Chrome trace-event file is written.
+
+        .. versionadded:: 0.5
+
+        The spans are cleared at the beginning of every build, so the profiler
+        has the ones of the last build. A previous profiler is closed, see
+        :meth:`folio.profiling.Profiler.close`.
+
+        :param trace_memory: Also record the memory peaks with tracemalloc.
+        """
+        from .profiling import Profiler
+
+        if self.profiler is not None:
+            self.profiler.close()
+        profiler = Profiler(trace_memory)
+        profiler.install(self.env)
+        return profiler
+
+    def _span(self, phase, template_name, name=None):
+        """Returns a profiler span or a null span if not profiling."""
+        profiler = self.env.profiler
+        if profiler is None:
+            return null_span
+        return profiler.span(phase, template_name, name)
+
     def add_extension(self, extension):
         """Add an extension to the registry."""
         self.config.get('EXTENSIONS', []).append(extension)
@@ -226,33 +503,27 @@ class Folio(object):
         configuration.
 
         If the extension is an string, it will try to load it from the buildin
-        extension package, or as folio_<extname>.
+        extension package, as folio_<extname> or from the entry points of the
+        `folio.extensions` group. The names are looked up in the cached index
+        of :mod:`folio.registry`, so the import path is not probed.
 
         The extension could have an `register` function that will be called
         with the Folio project instance as first argument.
 
+        .. versionchanged:: 0.5
+            Extensions can be registered with entry points.
+
         :param extension: The extension itself or an string of the extension
                           name that could be found inside the build-in package
                           or as folio_<extname>.
         """
         if isinstance(extension, basestring):
-            for modnameformat in ('folio.ext.%s', 'folio_%s'):
-                modname = modnameformat % extension
-                try:
-                    module = __import__(modname, None, None, [extension])
-                except ImportError:
-                    continue
-
-                self.logger.debug("Extension '%s' found." % extension)
+            from .registry import registry
 
-                # Consider the module as an extension. Use the first one to
-                # prioritize build-in extensions.
-                extname, extension = extension, module
-                break
+            # Raises `LookupError` if the extension was not found.
+            extname, extension = extension, registry.resolve(extension)
 
-            # If it's still an string, the extension was not found.
-            if isinstance(extension, basestring):
-                raise LookupError("Extension '%s' not found." % extension)
+            self.logger.debug("Extension '%s' found." % extname)
         else:
             try:
                 extname = extension.__name__
@@ -281,38 +552,358 @@ class Folio(object):
         if hasattr(extension, 'register'):
             extension.register(self)
 
-    def build(self):
+    def build(self, incremental=False, shard=None):
         """Build templates to the build directory. It will create the build
-        path if not exists, and build all matched templates."""
+        path if not exists, and build all matched templates.
+
+        .. versionchanged:: 0.5
+            Added the `incremental` and `shard` parameters.
+
+        :param incremental: Build only the templates that changed since the
+                            previous build: the ones whose source, builder or
+                            any of the files they depend on (layouts, includes,
+                            data files, indexed pages) were modified, and the
+                            ones whose outputs are missing. Context functions
+                            are assumed to return the same context while their
+                            dependencies don't change.
+        :param shard: A tuple with the index and the number of shards, to
+                      build only a part of the templates into the directory
+                      of the shard. See :mod:`folio.sharding`.
+        """
 
         # Initialize the configuration.
         self.init_config()
-
-        # If the build directory does exits, create it.
-        if not os.path.exists(self.build_path):
-            os.mkdir(self.build_path)
+        self._load_manifest()
 
         # Get a list of the templates to be builded. For the moment is all the
         # files in the templates directory, except for the ones that start with
         # a dot or an underscore.
         templates = self.list_templates()
 
+        if shard is not None:
+            return self._build_shard(templates, shard, incremental)
+
+        builded = self._build(templates, incremental)
+        if self.manifest.path:
+            self.manifest.save()
+
+        if self.config['LINK_CHECK']:
+            self.check_links(builded if incremental else None)
+            if self.link_report.broken:
+                self.logger.warning('%s', self.link_report)
+
+        return builded
+
+    def _build(self, templates, incremental=False, after_build=True):
+        """Build the given templates. The after build functions are not
+        called if `after_build` is False."""
+
+        # The outputs of other processes are not seen by this one.
+        isolated = self.config['BUILD_TIMEOUT'] or \
+            self.config['BUILD_WORKERS']
+        if isolated and not self.output.shared:
+            raise ValueError('Isolated builds require a directory output.')
+        forked = not isolated and self.config['BUILD_FORKS'] > 1
+        if forked and not self.output.shared:
+            raise ValueError('Forked builds require a directory output.')
+
+        # The profiler only keeps the spans of the last build, so long running
+        # processes don't grow without bound.
+        if self.profiler is not None:
+            self.profiler.clear()
+
+        # Synchronize the content index with the sources, only the modified
+        # ones are read.
+        if self.index is not None:
+            self.index.scan()
+
+        # Data files are checked for changes once per build.
+        if self.data is not None:
+            self.data.reset()
+
+        # The dependencies are recorded again while building.
+        self.dependencies.clear()
+
+        # Templates that don't exist anymore are forgotten.
+        removed = set(self.manifest.records) - set(templates)
+        if removed:
+            self.manifest.forget(removed)
+
         # A set of builded files. This will be returned by the method so you
         # could do something with the new modified templates. The format is a
         # tuple with source path, destination path, and the result of the
-        # builder.
+        # builder. Generator builders add one tuple for each output.
         builded = set()
 
-        for template_name in templates:
-            rv = self.build_template(template_name)
+        output = self.output
+        batches = []
+
+        self._building = True
+        try:
+            # Start the output, it creates the build directory if it doesn't
+            # exist. It's ended even if a before build function fails, so an
+            # archive is not left open.
+            output.begin(self.build_path)
+
+            # The signatures of the files are cached during the build, so the
+            # ones shared by many templates are checked once.
+            self.manifest.begin()
+
+            for func in self.before_build_funcs:
+                func(self)
+
+            if incremental:
+                templates = self._outdated_templates(templates)
+
+            # Batch contexts are resolved once for all the templates.
+            batches = self._prefetch_batch_contexts(templates)
+
+            self.failures = []
+            if isolated:
+                from .isolation import build_isolated
+
+                # Every template is built in a worker process.
+                builded, self.failures = build_isolated(
+                    self, templates, self.config['BUILD_WORKERS'] or 1,
+                    self.config['BUILD_TIMEOUT'])
+            elif forked:
+                from .forking import build_forked
+
+                # The templates are built in workers forked from the warm
+                # project.
+                builded = build_forked(self, templates,
+                                       self.config['BUILD_FORKS'])
+            else:
+                for template_name, context in self._iter_contexts(templates):
+                    rv = self.build_template(template_name, context)
+
+                    if isinstance(rv, list):
+                        builded.update(rv)
+                    elif rv:
+                        # Add the response to the builded list if is not
+                        # False.
+                        builded.add(rv)
+
+            # The output is still open, so these functions can write their
+            # own outputs.
+            if after_build:
+                for func in self.after_build_funcs:
+                    func(self, builded)
+        finally:
+            for batch in batches:
+                batch.clear()
+            self._building = False
+            loop, self._event_loop = self._event_loop, None
+            if loop is not None:
+                loop.close()
+            self.manifest.end()
+            output.end()
+
+        profiler = self.profiler
+        if profiler is not None and self.config['PROFILE']:
+            self.logger.info('Build profile:\n%s', profiler.report())
+            if self.config['PROFILE_TRACE']:
+                profiler.dump_trace(
+                    self._make_abspath(self.config['PROFILE_TRACE']))
 
-            if rv:
-                # Add the response to the builded list if is not False.
-                builded.add(rv)
+        return builded
 
+    def _load_manifest(self):
+        """Load the manifest of the previous build, if the `MANIFEST_PATH`
+        configuration is set."""
+        path = self.config['MANIFEST_PATH']
+        if path:
+            path = self._make_abspath(path)
+            if self.manifest.path != path:
+                self.manifest.path = path
+                self.manifest.load()
+
+    def _build_shard(self, templates, shard, incremental=False):
+        """Build the templates of a shard into its own directory, with its
+        own manifest."""
+        from .sharding import MANIFEST_NAME, plan_shards, shard_path
+
+        index, count = shard
+        if not 0 <= index < count:
+            raise ValueError('Invalid shard %d of %d.' % (index, count))
+
+        durations = dict((name, record.duration) for name, record
+                         in self.manifest.records.items())
+        templates = plan_shards(templates, count, durations)[index]
+
+        build_path, manifest = self.build_path, self.manifest
+        self.build_path = shard_path(self, index)
+        self.manifest = Manifest(os.path.join(self.build_path, MANIFEST_NAME))
+        self.manifest.load()
+        try:
+            # The after build functions, like the search index, write outputs
+            # of the whole site. They run when the shards are merged.
+            builded = self._build(templates, incremental, after_build=False)
+            self.manifest.save()
+        finally:
+            self.build_path, self.manifest = build_path, manifest
         return builded
 
-    def build_template(self, template_name):
+    def merge_shards(self, count):
+        """Merge the outputs and manifests of a sharded build into the build
+        path. See :func:`folio.sharding.merge_shards`.
+
+        .. versionadded:: 0.5
+
+        :param count: The number of shards.
+        """
+        from .sharding import merge_shards
+
+        self.init_config()
+        self._load_manifest()
+        return merge_shards(self, count)
+
+    def check_links(self, builded=None):
+        """Check the internal links of the HTML outputs. Returns a
+        :class:`folio.linkcheck.LinkReport`, also available as
+        :attr:`link_report`. See :mod:`folio.linkcheck`.
+
+        .. versionadded:: 0.5
+
+        :param builded: The result of an incremental build. Only the pages it
+                        built are parsed again.
+        """
+        from .linkcheck import LinkChecker
+
+        if not self.output.shared:
+            raise ValueError('Only the outputs of a directory can be '
+                             'checked.')
+        if self._link_checker is None:
+            self._link_checker = LinkChecker(
+                self, self.config['LINK_CHECK_WORKERS'])
+        self.link_report = self._link_checker.check(builded)
+        return self.link_report
+
+    def sync(self, target, link=False, verify=False):
+        """Copy the outputs that changed since the previous sync to the target
+        directory and remove the orphans, in steps that are atomic. Only the
+        outputs of the templates built since the previous sync to the target
+        are checked, unless it's the first one of the project. See
+        :func:`folio.sync.sync`.
+
+        .. versionadded:: 0.5
+
+        :param target: The target directory.
+        :param link: Hard link the outputs instead of copying them.
+        :param verify: Check every output.
+        """
+        from .sync import sync
+
+        if not self.output.shared:
+            raise ValueError('Only the outputs of a directory can be synced.')
+        self._load_manifest()
+
+        target = os.path.abspath(target)
+        version = self.manifest.version
+        since = self._synced.get(target)
+        template_names = None
+        if since is not None and not verify:
+            template_names = self.manifest.changed_since(since)
+        result = sync(self, target, link, template_names=template_names)
+        self._synced[target] = version
+        return result
+
+    def _outdated_templates(self, templates):
+        """Returns the templates that aren't up to date in the manifest. The
+        dependencies of the fresh ones are taken from their records."""
+        outdated = []
+        for template_name in templates:
+            record = self.manifest.get(template_name)
+            if record is not None:
+                builder = self._builder_key(template_name)
+                src = self._source(template_name)
+                if self.manifest.is_fresh(template_name, src, builder,
+                                          self.output.exists):
+                    self.dependencies[template_name] = \
+                        set(record.dependencies)
+                    continue
+            outdated.append(template_name)
+        return outdated
+
+    def build_variants(self, variants, jobs=None):
+        """Build many variants of the project, each one with its own theme,
+        configuration and output subdirectory. The work that doesn't depend
+        on the variant is done once, and the variants are built in parallel.
+        See :mod:`folio.variants`.
+
+        .. versionadded:: 0.5
+
+        :param variants: A list of :class:`folio.variants.Variant`.
+        :param jobs: The number of variants to build at the same time.
+        """
+        from .variants import build_variants
+        return build_variants(self, variants, jobs)
+
+    def _prefetch_batch_contexts(self, templates):
+        """Call every batch context with all the templates it matches. The
+        async ones are awaited concurrently. Returns the batch contexts."""
+        batches = []
+        for pattern, ctx in self.contexts:
+            if isinstance(ctx, BatchContext) and ctx not in batches:
+                batches.append(ctx)
+
+        pending = []
+        for batch in batches:
+            patterns = [pattern for pattern, ctx in self.contexts
+                        if ctx is batch]
+            names = [name for name in templates
+                     if any(fnmatch.fnmatch(name, p) for p in patterns)]
+            rv = batch.call(self.env, names)
+            if inspect.isawaitable(rv):
+                pending.append((batch, rv))
+            else:
+                batch.prefetch(rv)
+
+        results = resolve_awaitables([rv for _, rv in pending],
+                                     self._get_event_loop())
+        for (batch, _), rv in zip(pending, results):
+            batch.prefetch(rv)
+
+        return batches
+
+    def _get_event_loop(self):
+        """Returns the event loop of the build being run, or None outside of
+        a build. All the async contexts of a build are resolved in it."""
+        if not self._building:
+            return None
+        with self._event_loop_lock:
+            if self._event_loop is None:
+                self._event_loop = EventLoop()
+            return self._event_loop
+
+    def _iter_contexts(self, templates):
+        """Yields every template name with its context. If `CONTEXT_WORKERS`
+        is set, the contexts are resolved ahead in a thread pool while the
+        previous templates are being built."""
+        workers = self.config['CONTEXT_WORKERS']
+        if not workers:
+            for template_name in templates:
+                yield template_name, None
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Keep a window of contexts being resolved, bigger than the pool so
+        # the workers are never idle.
+        window = workers * 2
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for template_name in templates[:window]:
+                futures.append(executor.submit(self.get_context,
+                                               template_name))
+            for i, template_name in enumerate(templates):
+                if i + window < len(templates):
+                    futures.append(executor.submit(self.get_context,
+                                                   templates[i + window]))
+                yield template_name, futures[i].result()
+                futures[i] = None
+
+    def build_template(self, template_name, context=None):
         """Build a template with it's corresponding builder.
 
         The builder is responsible of generating the destination file in the
@@ -323,23 +914,64 @@ class Folio(object):
         name, a dictionary with the context, the source and destination paths
         and the output encoding.
 
+        If the builder is a generator (has a `generate` method, like
+        :class:`folio.builders.Generator`) the template will be rendered once
+        for each destination it yields, and a list of tuples is returned.
+
+        The build is recorded in the :attr:`manifest`.
+
         :param template_name: The template name to build.
+        :param context: The context of the template, if it was already
+                        resolved. By default :meth:`get_context` is used.
         """
+        # Forget the dependencies, they are recorded again while the context
+        # is resolved and the template rendered.
+        if context is None:
+            self.dependencies.pop(template_name, None)
+
+        start = time.time()
+        with self._span('template', template_name):
+            with self._current_template(template_name):
+                rv = self._build_template(template_name, context)
+
+        if rv:
+            results = rv if isinstance(rv, list) else [rv]
+            src = results[0][0] if results else \
+                self._source(template_name)
+            self.manifest.record(
+                template_name, src,
+                self._builder_key(template_name),
+                [dst for _, dst, _ in results],
+                self.dependencies.get(template_name, ()),
+                time.time() - start)
+
+        return rv
+
+    def _build_template(self, template_name, context=None):
         self.logger.info('Building %s', template_name)
 
         #: Retrieve the builder for this template, normally this will never be
         #: empty, because the static builder is as a "catch all".
-        builder = self.get_builder(template_name)
+        with self._span('lookup', template_name):
+            builder = self.get_builder(template_name)
 
         #: This is the full path of the template. This is useful if the file is
         #: not actually a jinja template but another format that you need to
         #: open and process.
-        src = os.path.join(self.source_path, template_name)
+        src = self._source(template_name)
 
-        # If the template is not in the src directory, it has to be inside a
-        # theme. So we tried to load it from the ChoiceLoader.
-        if not os.path.exists(src):
-            src = self.jinja_loader.get_source(self.env, template_name)[1]
+        #: Retrieve the context. Will call all the context functions and merge
+        #: the results together. If no context are found, an empty dictionary
+        #: is returned.
+        if context is None:
+            with self._span('context', template_name):
+                context = self.get_context(template_name)
+
+        # Generator builders choose their own destinations.
+        if hasattr(builder, 'generate'):
+            with self._span('build', template_name):
+                return self._build_generator(builder, template_name, context,
+                                             src)
 
         try:
             # Maybe the builder is an instance of class and has a method for
@@ -349,35 +981,110 @@ class Folio(object):
             dstname = self.translate_template_name(template_name)
 
         #: This is the full path destination.
-        dst = os.path.join(self.build_path, dstname)
-
-        # If the destination directory doesn't exists, create it.
-        dstdir = os.path.join(self.build_path, os.path.dirname(dst))
-        if not os.path.exists(dstdir):
-            os.makedirs(dstdir)
-
-        #: Retrieve the context. Will call all the context functions and merge
-        #: the results together. If no context are found, an empty dictionary
-        #: is returned.
-        context = self.get_context(template_name)
+        dst = self._make_destination(dstname)
 
         # Call the real builder. For the moment, don't care what the returned
         # value is, if any. But, in case that it return something, we grab it
         # and return it again.
-        rv = builder(self.env, template_name, context, src, dst, self.encoding)
+        with self._span('build', template_name):
+            rv = builder(self.env, template_name, context, src, dst,
+                         self.encoding)
 
         # If no exception was raised, assume that the build was made.
         return (src, dst, rv)
 
-    def add_builder(self, pattern, builder):
+    def _source(self, template_name):
+        """Returns the full path of the template source."""
+        from .archive import source_exists
+
+        src = os.path.join(self.source_path, template_name)
+
+        # If the template is not in the src directory, it has to be inside a
+        # theme. So we tried to load it from the ChoiceLoader.
+        if not source_exists(src):
+            src = self.jinja_loader.get_source(self.env, template_name)[1]
+
+        return src
+
+    @property
+    def current_template(self):
+        """The name of the template being built in this thread, or None."""
+        return getattr(self._local, 'template_name', None)
+
+    @contextmanager
+    def _current_template(self, template_name):
+        previous = self.current_template
+        self._local.template_name = template_name
+        try:
+            yield
+        finally:
+            self._local.template_name = previous
+
+    def add_dependency(self, filename, template_name=None):
+        """Record that a template depends on a file. If the file changes, the
+        template will be rebuilt by the development server.
+
+        .. versionadded:: 0.5
+
+        :param filename: The file the template depends on.
+        :param template_name: The template. Defaults to the one being built in
+                              this thread, if none is being built nothing is
+                              recorded.
+        """
+        if template_name is None:
+            template_name = self.current_template
+            if template_name is None:
+                return
+        self.dependencies.setdefault(template_name, set()).add(filename)
+
+    def _build_generator(self, builder, template_name, context, src):
+        """Render the template of a generator builder once for every
+        destination name and context it yields. The template is loaded only
+        once."""
+        template = builder.get_template(self.env, template_name)
+
+        builded = []
+        for dstname, extra in builder.generate(self.env, template_name,
+                                               context):
+            dst = self._make_destination(dstname)
+
+            page_context = dict(context)
+            page_context.update(extra)
+
+            rv = builder.render(template, page_context, dst, self.encoding,
+                                template_name)
+            builded.append((src, dst, rv))
+
+        return builded
+
+    def _make_destination(self, dstname):
+        """Returns the full destination path for the given name. The output
+        backend is prepared to write it, the directory output creates the
+        destination directory if it doesn't exists.
+
+        :param dstname: The destination name, relative to the build path.
+        """
+        dst = os.path.join(self.build_path, dstname)
+        self.output.prepare(dst)
+        return dst
+
+    def add_builder(self, pattern, builder, transforms=()):
         """Adds a new builder related with the given file pattern. If the
         pattern is a iterable, will add several times the same builder.
 
+        .. versionchanged:: 0.5
+            Added the `transforms` parameter.
+
         :param pattern: One or more file patterns.
         :param builder: The builder to be related with the file pattern(s).
+        :param transforms: A list of transforms for the outputs of the
+                           templates that match the pattern. See
+                           :meth:`add_transform`.
         """
         if not callable(builder):
             raise TypeError('Invalid builder. Must be a callable.')
+        for transform in transforms:
+            self.add_transform(pattern, transform)
         if isinstance(pattern, basestring):
             try:
                 enabled = builder.enabled
@@ -394,6 +1101,56 @@ class Folio(object):
             for item in iterator:
                 self.add_builder(item, builder)
 
+    def add_transform(self, pattern, transform):
+        """Adds a transform for the outputs of the templates that match the
+        pattern. The transform is called with the jinja environment, the
+        template name, the destination path and the output bytes, and returns
+        the new bytes. Transforms are applied in memory in the order they were
+        added, and the output is written only once. See
+        :mod:`folio.pipeline`.
+
+        .. versionadded:: 0.5
+
+        :param pattern: One or more template name patterns.
+        :param transform: The transform.
+        """
+        if isinstance(pattern, basestring):
+            self.pipeline.add(pattern, transform)
+        else:
+            for item in pattern:
+                self.add_transform(item, transform)
+
+    def add_bundle(self, name, members, minify=None):
+        """Adds a bundle of stylesheets or scripts, built in one output with
+        a fingerprint. Templates get its URL with the `bundle` Jinja global.
+        See :mod:`folio.bundles`.
+
+        .. versionadded:: 0.5
+
+        :param name: The bundle name, relative to the build path.
+        :param members: The template names of the files to concatenate, in
+                        order. They could be in the source path or a theme.
+        :param minify: Minify the bundle. Defaults to the `BUNDLES_MINIFY`
+                       configuration.
+        """
+        if self.bundles is None:
+            from .bundles import Bundler
+
+            self.bundles = Bundler(self, self.config['BUNDLES_URL'],
+                                   self.config['BUNDLES_MINIFY'])
+            self.before_build(self.bundles.build)
+            self.env.globals['bundle'] = self.bundles.url
+        return self.bundles.add(name, members, minify)
+
+    def _builder_key(self, template_name):
+        """Returns the key of the builder of a template for the manifest,
+        with the identity of its transforms."""
+        key = builder_key(self.get_builder(template_name))
+        transforms = self.pipeline.key(template_name)
+        if transforms:
+            key = '%s|%s' % (key, transforms)
+        return key
+
     def get_builder(self, template_name):
         """Returns the builder for the given template name or None if there are
         not related builders.
@@ -442,15 +1199,23 @@ class Folio(object):
         """Returns a list of templates."""
         return self.env.list_templates(filter_func=self.is_template)
 
-    def add_context(self, pattern, context):
+    def add_context(self, pattern, context, batch=False):
         """Add a new context to the given pattern of a template name. If the
         pattern is a iterable, will add several times the same context.
 
         :param pattern: One or more template name patterns to add the context.
         :param context: The context itself or a function that will accept the
                         jinja environment as first parameter and return the
-                        context for the template.
+                        context for the template. The function could be
+                        `async`.
+        :param batch: If true, the context is a function that accepts the
+                      jinja environment and a list of template names, and
+                      returns a dictionary with the context of each template.
+                      See :class:`folio.contexts.BatchContext`.
         """
+        if batch and not isinstance(context, BatchContext):
+            context = BatchContext(context)
+
         if isinstance(pattern, basestring):
             self.contexts.append((pattern, context))
         else:
@@ -474,17 +1239,49 @@ class Folio(object):
             proj.get_context('index.html')
             # Returns {'name': 'Flor', 'files': []}
 
+        If some of the context functions are `async`, they are awaited
+        concurrently. The merge order is always the order they were added.
+
         :param template_name: The template name to retrieve the context.
         """
-        context = {}
+        with self._current_template(template_name):
+            return self._get_context(template_name)
+
+    def _get_context(self, template_name):
+        contexts = []
+        pending = []
+        profiler = self.env.profiler
         for pattern, ctx in self.contexts:
             if fnmatch.fnmatch(template_name, pattern):
-                if callable(ctx):
-                    ctx = ctx(self.env)
-                context.update(ctx)
+                if isinstance(ctx, BatchContext):
+                    ctx = ctx.get(self.env, template_name,
+                                  self._get_event_loop())
+                elif callable(ctx):
+                    # Async providers are measured while they are awaited.
+                    if profiler is None or \
+                            inspect.iscoroutinefunction(ctx):
+                        ctx = ctx(self.env)
+                    else:
+                        name = getattr(ctx, '__name__', repr(ctx))
+                        with profiler.span('provider', template_name, name):
+                            ctx = ctx(self.env)
+                    if inspect.isawaitable(ctx):
+                        pending.append((len(contexts), ctx))
+                contexts.append(ctx)
+
+        if pending:
+            with self._span('provider', template_name, 'async'):
+                results = resolve_awaitables([ctx for _, ctx in pending],
+                                             self._get_event_loop())
+            for (i, _), ctx in zip(pending, results):
+                contexts[i] = ctx
+
+        context = {}
+        for ctx in contexts:
+            context.update(ctx)
         return context
 
-    def context(self, pattern):
+    def context(self, pattern, batch=False):
         """A decorator that is used to register a context function for a given
         template. This make the same thing as the method `add_context` passed
         with a function.
@@ -500,8 +1297,34 @@ class Folio(object):
 
         :param pattern: The template name pattern (or more than one) to make a
                         context.
+        :param batch: If true, the function is a batch context. See
+                      :meth:`add_context`.
         """
         def wrapper(func):
-            self.add_context(pattern, func)
+            self.add_context(pattern, func, batch)
             return func
         return wrapper
+
+    def before_build(self, func):
+        """Register a function to be called at the beginning of every build.
+        The function is called with the project as first argument.
+
+        .. versionadded:: 0.5
+
+        :param func: The function to register.
+        """
+        self.before_build_funcs.append(func)
+        return func
+
+    def after_build(self, func):
+        """Register a function to be called at the end of every build. The
+        function is called with the project and the set of builded templates,
+        as returned by :meth:`build`. It's called before the output backend
+        is closed, so it can write more outputs with :attr:`output`.
+
+        .. versionadded:: 0.5
+
+        :param func: The function to register.
+        """
+        self.after_build_funcs.append(func)
+        return func
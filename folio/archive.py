@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+    Source archives for Folio.
+
+    The source path of a project could be a zip or tar archive instead of a
+    directory, so the sources don't have to be extracted::
+
+        proj = Folio(__name__, source_path='site-src.zip')
+
+    The templates are loaded from the archive members and static files are
+    copied from the archive to the outputs, directly from a memory map of the
+    archive file if the member is not compressed. The members are found in an
+    index of names, read once from the central directory of zip archives or
+    from the member headers of tar archives. The index is read again when the
+    archive is modified.
+
+    A compressed tar archive can't be read at random positions without
+    decompressing it from the start every time, so it's decompressed in
+    memory, in one pass, when it's opened.
+
+    The members are seen by the rest of Folio as files inside the archive,
+    ``<source_path>/<name>``. The helpers :func:`open_source`,
+    :func:`source_exists` and :func:`source_mtime` work with both real files
+    and members, and the signatures of the members in the build manifest are
+    their modification times and sizes, so incremental builds work too.
+"""
+
+from __future__ import with_statement
+
+import io
+import os
+import mmap
+import time
+import struct
+import threading
+
+from jinja2 import BaseLoader, TemplateNotFound
+
+__all__ = ['SourceArchive', 'ArchiveLoader', 'is_archive', 'open_archive',
+           'close_archives', 'find_member', 'open_source', 'source_exists',
+           'source_mtime']
+
+#: The extensions of the supported archives.
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2',
+                      '.tar.xz')
+
+#: The size of the fixed part of a zip local file header.
+_ZIP_HEADER_SIZE = 30
+
+
+def is_archive(path):
+    """True if the path is an archive file that can be used as source."""
+    return path.endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+class Member(object):
+    """A file of an archive."""
+
+    __slots__ = ('name', 'size', 'mtime', 'info', 'offset')
+
+    def __init__(self, name, size, mtime, info, offset=None):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        #: The `ZipInfo` or `TarInfo` of the member.
+        self.info = info
+        #: The position of the data in the archive file, if it's not
+        #: compressed, so it can be read from the memory map. For compressed
+        #: tar archives, the position in the decompressed archive.
+        self.offset = offset
+
+
+class SourceArchive(object):
+    """The index of the files of an archive, to read them by name.
+
+    :param path: The archive file name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        #: The modification time and size of the archive when it was opened.
+        self.signature = (stat.st_mtime, stat.st_size)
+
+        self._file = open(path, 'rb')
+        self._map = None
+        if stat.st_size:
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except (mmap.error, ValueError, OSError):
+                pass
+
+        # The buffer the members with an offset are read from, the memory
+        # map or the decompressed tar archive.
+        self._data = self._map
+
+        self._lock = threading.Lock()
+
+        #: The members of the archive, by name.
+        self.members = {}
+        if path.endswith('.zip'):
+            self._index_zip()
+        else:
+            self._index_tar()
+
+    def _index_zip(self):
+        import zipfile
+
+        self.archive = zipfile.ZipFile(self._file)
+        for info in self.archive.infolist():
+            if info.filename.endswith('/'):
+                continue
+            offset = None
+            if info.compress_type == zipfile.ZIP_STORED and \
+                    self._map is not None:
+                offset = self._zip_data_offset(info)
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            self.members[info.filename] = Member(
+                info.filename, info.file_size, mtime, info, offset)
+
+    def _zip_data_offset(self, info):
+        """Returns the position of the data of a zip member. The local header
+        can have a different extra field than the central directory."""
+        start = info.header_offset
+        header = self._map[start:start + _ZIP_HEADER_SIZE]
+        if len(header) < _ZIP_HEADER_SIZE or header[:4] != b'PK\x03\x04':
+            return None
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        return start + _ZIP_HEADER_SIZE + name_length + extra_length
+
+    def _index_tar(self):
+        import tarfile
+
+        self.archive = tarfile.open(fileobj=self._file)
+        if self.archive.fileobj is not self._file:
+            # Every member is read from the decompressed archive.
+            self.archive.fileobj.seek(0)
+            self._data = self.archive.fileobj.read()
+            self.archive.close()
+            self.archive = tarfile.open(fileobj=io.BytesIO(self._data))
+        mapped = self._data is not None
+        for info in self.archive.getmembers():
+            if not info.isfile():
+                continue
+            name = info.name
+            if name.startswith('./'):
+                name = name[2:]
+            self.members[name] = Member(
+                name, info.size, info.mtime, info,
+                info.offset_data if mapped else None)
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    def names(self):
+        """Returns the sorted names of the files."""
+        return sorted(self.members)
+
+    def read(self, name):
+        """Returns the content of a file."""
+        member = self.members[name]
+        if member.offset is not None:
+            return self._data[member.offset:member.offset + member.size]
+        with self._lock:
+            if self.path.endswith('.zip'):
+                return self.archive.read(member.info)
+            return self.archive.extractfile(member.info).read()
+
+    def open(self, name):
+        """Returns a binary file object to read a file."""
+        return io.BytesIO(self.read(name))
+
+    def copy(self, name, fdst):
+        """Write the content of a file to a file object. Uncompressed files
+        are written from the memory map, without copies."""
+        member = self.members[name]
+        if member.offset is not None:
+            view = memoryview(self._data)
+            try:
+                fdst.write(view[member.offset:member.offset + member.size])
+            finally:
+                view.release()
+        else:
+            fdst.write(self.read(name))
+
+    def close(self):
+        self.archive.close()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+#: The open archives, by path.
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(path):
+    """Returns the :class:`SourceArchive` of a path. It's shared by all the
+    callers and opened again if the archive was modified."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None or \
+                archive.signature != (stat.st_mtime, stat.st_size):
+            if archive is not None:
+                archive.close()
+            archive = _archives[path] = SourceArchive(path)
+    return archive
+
+
+def close_archives():
+    """Close every open archive."""
+    with _archives_lock:
+        for archive in _archives.values():
+            archive.close()
+        _archives.clear()
+
+
+def find_member(filename):
+    """Returns the archive and the member name of a file inside an archive,
+    or None and None if it's not inside an archive."""
+    path = filename
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+        if os.path.exists(path):
+            break
+    if not is_archive(path):
+        return None, None
+    archive = open_archive(path)
+    name = os.path.relpath(filename, path).replace(os.sep, '/')
+    if name not in archive:
+        return None, None
+    return archive, name
+
+
+def source_exists(filename):
+    """True if the file or archive member exists."""
+    if os.path.exists(filename):
+        return True
+    return find_member(filename)[0] is not None
+
+
+def source_mtime(filename):
+    """Returns the modification time of a file or archive member."""
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        archive, name = find_member(filename)
+        if archive is None:
+            raise
+        return archive.members[name].mtime
+
+
+def member_signature(filename):
+    """Returns the signature of an archive member, like
+    :func:`folio.manifest.file_signature`, or None."""
+    archive, name = find_member(filename)
+    if archive is None:
+        return None
+    member = archive.members[name]
+    return [member.mtime, member.size]
+
+
+def open_source(filename, mode='rb', encoding=None):
+    """Open a file or archive member for reading.
+
+    :param filename: The file name.
+    :param mode: ``'rb'`` or ``'r'``.
+    :param encoding: The encoding in text mode.
+    """
+    if os.path.exists(filename):
+        if mode == 'rb':
+            return open(filename, mode)
+        return io.open(filename, mode, encoding=encoding)
+    archive, name = find_member(filename)
+    if archive is None:
+        raise IOError('No such file: %s' % filename)
+    f = archive.open(name)
+    if mode == 'rb':
+        return f
+    return io.TextIOWrapper(f, encoding=encoding)
+
+
+class ArchiveLoader(BaseLoader):
+    """A Jinja loader for the files of an archive.
+
+    :param path: The archive file name.
+    :param encoding: The encoding of the templates.
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = os.path.abspath(path)
+        self.encoding = encoding
+
+    def get_source(self, environment, template):
+        archive = open_archive(self.path)
+        if template not in archive:
+            raise TemplateNotFound(template)
+        source = bytes(archive.read(template)).decode(self.encoding)
+        filename = os.path.join(self.path, *template.split('/'))
+        signature = archive.signature
+
+        def uptodate():
+            try:
+                return open_archive(self.path).signature == signature
+            except OSError:
+                return False
+        return source, filename, uptodate
+
+    def list_templates(self):
+        return open_archive(self.path).names()
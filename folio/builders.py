@@ -7,16 +7,64 @@
 from __future__ import with_statement
 
 import os
-import shutil
+
+from .archive import open_source, source_mtime
+from .index import (DELIMITER, MAX_LINES, FrontMatterExtension,
+                    strip_front_matter)
+from .pipeline import copy_output, render_output
+from .profiling import span
 
 
 def static_builder(env, template_name, context, src, dst, encoding):
-    shutil.copy(src, dst)
+    copy_output(env, template_name, src, dst)
 
 
 def template_builder(env, template_name, context, src, dst, encoding):
     template = env.get_template(template_name)
-    template.stream(**context).dump(dst, encoding=encoding)
+    render_output(env, template_name, template, context, dst, encoding)
+
+
+#: The size, in characters, of the chunks read by streaming wrappers.
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(f, size=CHUNK_SIZE):
+    """Yields the content of a text file in chunks of about `size`
+    characters. The chunks end at a line end, unless a line is longer than
+    the chunk size."""
+    rest = ''
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        data = rest + data
+        end = data.rfind('\n') + 1
+        if end:
+            data, rest = data[:end], data[end:]
+        else:
+            rest = ''
+        if data:
+            yield data
+    if rest:
+        yield rest
+
+
+class StreamedContent(object):
+    """The content of a streaming :class:`Wrapper`, as an iterable of chunks.
+    Every iteration reads the source again, so the decorator template could
+    iterate it more than once::
+
+        {% for chunk in content %}{{ chunk }}{% endfor %}
+    """
+
+    def __init__(self, wrapper, env, template_name, src):
+        self.wrapper = wrapper
+        self.env = env
+        self.template_name = template_name
+        self.src = src
+
+    def __iter__(self):
+        return self.wrapper.iter_read(self.env, self.template_name, self.src)
 
 
 class Wrapper(object):
@@ -25,30 +73,115 @@ class Wrapper(object):
     This will read a template, transform it (if provided) and pass it as a
     normal variable to a base template.
 
+    With `stream`, the source is never loaded whole. The variable is a
+    :class:`StreamedContent`, the transformer is called with an iterator of
+    chunks and returns an iterable of chunks, and the decorator template is
+    streamed to the output, so the memory used doesn't depend on the size of
+    the source. The output transforms of the template, if any, still need the
+    whole output in memory.
+
     :param template: The decorator template.
     :param variable: The variable name that will be passed to the decorator
                      template.
     :param transformer: The callable transformer. Will be called with the
                         content as first argument.
+    :param stream: Pass the content as an iterable of chunks.
+    :param chunk_size: The size of the chunks, in characters.
+
+    .. versionadded:: 0.5
+       The `stream` and `chunk_size` parameters.
     """
 
-    def __init__(self, template, variable='content', transformer=None):
+    #: A dictionary to share the transformed content of the sources between
+    #: builders of the same class, for example in variant builds. The key is
+    #: the builder class, the transformer, the source and its modification
+    #: time. None to not share the content.
+    memo = None
+
+    def __init__(self, template, variable='content', transformer=None,
+                 stream=False, chunk_size=CHUNK_SIZE):
         self.template = template
         self.variable = variable
 
         self.transformer = transformer
 
+        self.stream = stream
+        self.chunk_size = chunk_size
+
     def __call__(self, env, template_name, context, src, dst, encoding):
-        with open(src, 'r') as f:
+        if self.stream:
+            content = StreamedContent(self, env, template_name, src)
+        else:
+            content = self.read(env, template_name, src)
+        context[self.variable] = content
+
+        template = env.get_template(self.template)
+        render_output(env, template_name, template, context, dst, encoding)
+
+    def transformer_key(self):
+        """Returns the key of the transformer in :attr:`memo`. The methods of
+        other instances of the same class are the same transformer, so the
+        builders of the variants share the content. Transformers could have
+        a `cache_key` attribute instead."""
+        transformer = self.transformer
+        key = getattr(transformer, 'cache_key', None)
+        if key is not None:
+            return key
+        return getattr(transformer, '__func__', transformer)
+
+    def read(self, env, template_name, src):
+        """Returns the transformed content of the source."""
+        memo = self.memo
+        if memo is not None:
+            key = (type(self), self.transformer_key(), src,
+                   source_mtime(src))
+            try:
+                return memo[key]
+            except KeyError:
+                pass
+
+        with open_source(src, 'r') as f:
             content = f.read()
 
+        # Remove the front matter if the project has a content index.
+        if FrontMatterExtension.identifier in env.extensions:
+            content = strip_front_matter(content)
+
         if callable(self.transformer):
-            content = self.transformer(content)
+            with span(env, 'transform', template_name):
+                content = self.transformer(content)
 
-        context[self.variable] = content
+        if memo is not None:
+            memo[key] = content
+        return content
 
-        template = env.get_template(self.template)
-        template.stream(**context).dump(dst, encoding=encoding)
+    def iter_read(self, env, template_name, src):
+        """Returns an iterator of the transformed content of the source, in
+        chunks. It's not shared in :attr:`memo`, every call reads the source
+        again."""
+        chunks = self._iter_source(env, src)
+        if callable(self.transformer):
+            chunks = iter(self.transformer(chunks))
+        return chunks
+
+    def _iter_source(self, env, src):
+        with open_source(src, 'r') as f:
+            # Remove the front matter if the project has a content index.
+            # The block is read line by line, up to its maximum length.
+            if FrontMatterExtension.identifier in env.extensions:
+                head = f.readline(self.chunk_size)
+                if head.strip() == DELIMITER:
+                    for _ in range(MAX_LINES + 1):
+                        line = f.readline(self.chunk_size)
+                        head += line
+                        if not line or line.strip() == DELIMITER:
+                            break
+                    head = strip_front_matter(head)
+                if head:
+                    yield head
+
+            for chunk in iter_chunks(f, self.chunk_size):
+                yield chunk
 
     def translate_template_name(self, filename):
         """Always replace the original extension with HTML.
@@ -57,3 +190,200 @@ class Wrapper(object):
         """
         name, _ = os.path.splitext(filename)
         return '.'.join([name, 'html'])
+
+
+class Generator(object):
+    """Base class for builders that generate many outputs from one template,
+    like paginated archives or a page for each tag.
+
+    Instead of being called as a normal builder, the project calls the method
+    :meth:`generate` that yields pairs of destination name (relative to the
+    build path) and a context for that output. The context is merged over the
+    template context and the template, loaded only once, is rendered for each
+    one of them.
+
+    :param template: The template to render for every output. Defaults to the
+                     source template itself.
+    """
+
+    def __init__(self, template=None):
+        self.template = template
+
+    def __call__(self, env, template_name, context, src, dst, encoding):
+        """Render every output when the generator is called as a normal
+        builder. The destination names are relative to the build path, found
+        from `dst`, the destination of the source template. Returns the list
+        of destination paths."""
+        build_path = dst
+        for _ in template_name.split('/'):
+            build_path = os.path.dirname(build_path)
+
+        template = self.get_template(env, template_name)
+        output = getattr(env, 'output', None)
+
+        dsts = []
+        for dstname, extra in self.generate(env, template_name, context):
+            path = os.path.join(build_path, *dstname.split('/'))
+            if output is not None:
+                output.prepare(path)
+            elif not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            page_context = dict(context)
+            page_context.update(extra)
+            self.render(template, page_context, path, encoding, template_name)
+            dsts.append(path)
+        return dsts
+
+    def get_template(self, env, template_name):
+        """Returns the template to render for every output."""
+        return env.get_template(self.template or template_name)
+
+    def generate(self, env, template_name, context):
+        """Yields the destination name and the context of every output.
+
+        :param env: The jinja environment.
+        :param template_name: The source template name.
+        :param context: The context of the source template.
+        """
+        raise NotImplementedError
+
+    def render(self, template, context, dst, encoding, template_name=None):
+        """Render one output to the destination path. The transforms of the
+        source template, if given, are applied."""
+        render_output(template.environment, template_name or template.name,
+                      template, context, dst, encoding)
+
+    def destination_name(self, template_name, pattern, **values):
+        """Make a destination name with the given pattern. The pattern is
+        formatted with `name` and `ext` (the template name split in name and
+        extension) and the given values."""
+        name, ext = os.path.splitext(template_name)
+        return pattern % dict(values, name=name, ext=ext)
+
+
+class Page(object):
+    """A page generated by the :class:`Paginator`."""
+
+    def __init__(self, number, items, count, previous=None, next=None):
+        self.number = number
+        self.items = items
+        self.count = count
+        self.previous = previous
+        self.next = next
+
+
+class Paginator(Generator):
+    """Split a list of the context in pages. The first page is generated with
+    the same name of the template and the next ones using the pattern. For
+    example, `archive.html` will generate `archive.html`, `archive/2.html`,
+    `archive/3.html` and so on.
+
+    Every page has a `page` variable with the `number`, the `items` in the
+    page, the `count` of pages and the destination names of the `previous`
+    and `next` pages, or None.
+
+    :param variable: The name of the context variable to split.
+    :param per_page: The number of items per page.
+    :param pattern: The destination name pattern for pages after the first.
+    :param template: The template to render. Defaults to the source template.
+    """
+
+    def __init__(self, variable='items', per_page=10,
+                 pattern='%(name)s/%(number)d%(ext)s', template=None):
+        super(Paginator, self).__init__(template)
+
+        self.variable = variable
+        self.per_page = per_page
+        self.pattern = pattern
+
+    def generate(self, env, template_name, context):
+        items = list(context.get(self.variable, ()))
+        count = max(1, (len(items) + self.per_page - 1) // self.per_page)
+
+        names = [template_name]
+        for number in range(2, count + 1):
+            names.append(self.destination_name(template_name, self.pattern,
+                                               number=number))
+
+        for number, dstname in enumerate(names, 1):
+            start = (number - 1) * self.per_page
+            yield dstname, {'page': Page(
+                number, items[start:start + self.per_page], count,
+                names[number - 2] if number > 1 else None,
+                names[number] if number < count else None)}
+
+
+class Taxonomy(Generator):
+    """Generate a page for every term used by the items of a list in the
+    context, for example a page for each tag of the articles.
+
+    Items could be dictionaries or objects, and the value of the key could be
+    a single term or a list of them. Every page has a `term` variable and the
+    `items` with that term. The source template is also generated as an index
+    with `term` as None, `terms`, a dictionary of terms and its items, and
+    `slugs`, a dictionary of terms and their slugs.
+
+    Distinct terms with the same slug, like ``Python`` and ``python``, get a
+    number after the slug of all but the first one: ``python``,
+    ``python-2``.
+
+    :param variable: The name of the context variable with the items.
+    :param key: The key or attribute of the items with the terms.
+    :param pattern: The destination name pattern. Could use `term`, `name`
+                    and `ext`.
+    :param template: The template to render. Defaults to the source template.
+    """
+
+    def __init__(self, variable='items', key='tags',
+                 pattern='%(name)s/%(term)s%(ext)s', template=None):
+        super(Taxonomy, self).__init__(template)
+
+        self.variable = variable
+        self.key = key
+        self.pattern = pattern
+
+    def get_terms(self, item):
+        """Returns the list of terms of an item."""
+        if isinstance(item, dict):
+            terms = item.get(self.key)
+        else:
+            terms = getattr(item, self.key, None)
+        if terms is None:
+            return []
+        if isinstance(terms, (list, tuple, set)):
+            return terms
+        return [terms]
+
+    def slugify(self, term):
+        """Make a safe file name for the term."""
+        return '-'.join(str(term).replace('/', ' ').lower().split())
+
+    def get_slugs(self, terms):
+        """Returns a dictionary of the terms and their slugs. The slugs are
+        unique, the terms are taken in order."""
+        slugs = {}
+        used = set()
+        for term in sorted(terms):
+            base = slug = self.slugify(term)
+            number = 1
+            while slug in used:
+                number += 1
+                slug = '%s-%d' % (base, number)
+            used.add(slug)
+            slugs[term] = slug
+        return slugs
+
+    def generate(self, env, template_name, context):
+        terms = {}
+        for item in context.get(self.variable, ()):
+            for term in self.get_terms(item):
+                terms.setdefault(term, []).append(item)
+        slugs = self.get_slugs(terms)
+
+        yield template_name, {'term': None, 'terms': terms, 'slugs': slugs}
+
+        for term in sorted(terms):
+            dstname = self.destination_name(template_name, self.pattern,
+                                            term=slugs[term])
+            yield dstname, {'term': term, 'items': terms[term]}
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+    Asset bundles for Folio.
+
+    A bundle concatenates many stylesheets or scripts, of the source path or
+    of the active theme, in one output with a fingerprint in its name, so a
+    page loads one file that can be cached forever::
+
+        proj.add_bundle('css/site.css', ['reset.css', 'theme.css',
+                                         'css/local.css'], minify=True)
+
+    Or with the configuration::
+
+        proj.config['BUNDLES'] = {'js/site.js': ['js/menu.js', 'js/app.js']}
+
+    The members are template names, found like the templates: first in the
+    source path, then in the theme (or ``_themes/<theme>/<name>`` for a
+    specific one). They are concatenated as they are, without rendering them.
+    The templates get the URL of a bundle with the `bundle` Jinja global:
+
+    .. sourcecode:: html+jinja
+
+        <link rel="stylesheet" href="{{ bundle('css/site.css') }}">
+
+    which returns ``/css/site.1b2c3d4e5f.css``. The fingerprint is a hash of
+    the content, so it changes only when a member changes.
+
+    The bundles are checked at the beginning of every build and when their
+    URL is requested. A bundle is built again only if the signature of one of
+    its members changed, and the templates that use it depend on its
+    members, so incremental builds and the development server rebuild them
+    with the new URL.
+
+    :param BUNDLES: The members of every bundle, by bundle name.
+    :param BUNDLES_MINIFY: Minify the bundles. Only stylesheets are
+                           minified, see :mod:`folio.minify`.
+    :param BUNDLES_URL: The URL prefix of the bundles. Defaults to ``'/'``.
+"""
+
+from __future__ import with_statement
+
+import os
+import hashlib
+import threading
+
+from .archive import open_source
+from .manifest import reserved_name
+from .minify import MINIFIERS
+from .pipeline import write_output
+
+__all__ = ['Bundle', 'Bundler']
+
+#: The length of the fingerprint, in hex digits.
+FINGERPRINT_LENGTH = 10
+
+#: The separator between the members, by extension. Scripts are separated
+#: with a semicolon in case a member doesn't end its last statement.
+SEPARATORS = {'.js': b'\n;\n'}
+
+
+class Bundle(object):
+    """An asset bundle.
+
+    :param name: The bundle name, relative to the build path. The
+                 fingerprint is added before the extension.
+    :param members: The template names of the members, in order.
+    :param minify: Minify the bundle.
+    """
+
+    def __init__(self, name, members, minify=False):
+        self.name = name
+        self.members = list(members)
+        self.minify = minify
+
+        #: The output name of the last build, with the fingerprint.
+        self.output_name = None
+
+        #: The member files and their signatures of the last build.
+        self.signatures = None
+
+    def __repr__(self):
+        return '<Bundle %s>' % self.name
+
+    def fingerprinted(self, data):
+        """Returns the output name for the content."""
+        digest = hashlib.sha1(data).hexdigest()[:FINGERPRINT_LENGTH]
+        base, ext = os.path.splitext(self.name)
+        return '%s.%s%s' % (base, digest, ext)
+
+    def join(self, parts):
+        """Concatenate the members, and minify them if requested."""
+        ext = os.path.splitext(self.name)[1].lower()
+        data = SEPARATORS.get(ext, b'\n').join(
+            part.rstrip(b'\n') for part in parts) + b'\n'
+        minify = MINIFIERS.get(ext) if self.minify else None
+        if minify is not None:
+            data = minify(data.decode('latin-1')).encode('latin-1')
+        return data
+
+
+class Bundler(object):
+    """The bundles of a project.
+
+    :param folio: The project.
+    :param url: The URL prefix of the bundles.
+    :param minify: The default of the bundles for minification.
+    """
+
+    def __init__(self, folio, url='/', minify=False):
+        self.folio = folio
+        self.url_prefix = url
+        self.minify = minify
+
+        #: The bundles, by name.
+        self.bundles = {}
+
+        #: The number of times a bundle was built.
+        self.builds = 0
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.bundles)
+
+    def add(self, name, members, minify=None):
+        """Add a bundle. Returns the :class:`Bundle`."""
+        if minify is None:
+            minify = self.minify
+        bundle = self.bundles[name] = Bundle(name, members, minify)
+        return bundle
+
+    def sources(self, bundle):
+        """Returns the files of the members of a bundle."""
+        return [self.folio._source(member) for member in bundle.members]
+
+    def _signatures(self, sources):
+        signature = self.folio.manifest.signature
+        return [(src, signature(src)) for src in sources]
+
+    def update(self, bundle):
+        """Build a bundle if one of its members changed or the output is
+        missing. Returns True if it was built."""
+        folio = self.folio
+        sources = self.sources(bundle)
+        with self._lock:
+            signatures = self._signatures(sources)
+            dst = None
+            if bundle.output_name is not None:
+                dst = os.path.join(folio.build_path,
+                                   *bundle.output_name.split('/'))
+            if signatures == bundle.signatures and dst is not None and \
+                    folio.output.exists(dst):
+                return False
+
+            parts = []
+            for src in sources:
+                with open_source(src) as f:
+                    parts.append(f.read())
+            data = bundle.join(parts)
+            output_name = bundle.fingerprinted(data)
+
+            # The previous output of a directory is removed, the outputs of
+            # other backends are created again on every build.
+            if dst is not None and output_name != bundle.output_name and \
+                    folio.output.shared and os.path.exists(dst):
+                os.remove(dst)
+
+            dst = folio._make_destination(output_name)
+            folio.logger.info('Building bundle %s', output_name)
+            write_output(folio.env, bundle.name, dst, data)
+            bundle.output_name = output_name
+            bundle.signatures = signatures
+            self.builds += 1
+            return True
+
+    def record(self, bundle):
+        """Record the output of a bundle in the manifest, so it's synced and
+        its links are checked like the other outputs. The record has a
+        reserved name, see :func:`folio.manifest.reserved_name`."""
+        folio = self.folio
+        sources = self.sources(bundle)
+        dst = os.path.join(folio.build_path, *bundle.output_name.split('/'))
+        folio.manifest.record(reserved_name('folio.bundles', bundle.name),
+                              sources[0] if sources else dst,
+                              'folio.bundles', [dst], sources[1:])
+
+    def build(self, folio):
+        """Build the bundles that changed. Called at the beginning of every
+        build."""
+        for name in sorted(self.bundles):
+            bundle = self.bundles[name]
+            self.update(bundle)
+            self.record(bundle)
+
+    def url(self, name):
+        """Returns the URL of a bundle, built if it changed. The template
+        being built depends on the members of the bundle."""
+        bundle = self.bundles[name]
+        for src in self.sources(bundle):
+            self.folio.add_dependency(src)
+        if self.update(bundle):
+            self.record(bundle)
+        return self.url_prefix + bundle.output_name
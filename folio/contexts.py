@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+    Context resolution helpers for Folio.
+"""
+
+import os
+import inspect
+import threading
+
+__all__ = ['BatchContext', 'EventLoop', 'resolve_awaitables']
+
+
+async def _gather(awaitables):
+    import asyncio
+    return await asyncio.gather(*awaitables)
+
+
+class EventLoop(object):
+    """An event loop running in its own thread. The project keeps one for
+    the whole build, so the resources bound to a loop, like client sessions
+    or locks, can be shared by the contexts of all the templates. As it runs
+    in another thread, the awaitables can be resolved from any thread, even
+    one with its own running loop.
+    """
+
+    def __init__(self):
+        # Imported only when needed, it's slow to import.
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name='folio-event-loop')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def usable(self):
+        """False in a forked process, where the thread of the loop doesn't
+        exist, or in the thread of the loop itself."""
+        return os.getpid() == self._pid and \
+            threading.current_thread() is not self._thread
+
+    def run(self, awaitables):
+        """Await the awaitables concurrently in the loop and return their
+        results, in the same order."""
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(_gather(awaitables),
+                                                  self.loop)
+        return future.result()
+
+    def close(self):
+        """Stop the loop and wait for its thread."""
+        import asyncio
+        loop = self.loop
+        if os.getpid() != self._pid or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(),
+                                         loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+def resolve_awaitables(awaitables, loop=None):
+    """Await all the given awaitables concurrently and return their results,
+    in the same order.
+
+    .. versionchanged:: 0.5
+        Added the `loop` parameter.
+
+    :param awaitables: A list of coroutines or awaitables.
+    :param loop: The :class:`EventLoop` to use. By default, or if it can't be
+                 used from this process or thread, a new one is used only for
+                 these awaitables.
+    """
+    if not awaitables:
+        return []
+
+    if loop is not None and loop.usable():
+        return loop.run(awaitables)
+
+    loop = EventLoop()
+    try:
+        return loop.run(awaitables)
+    finally:
+        loop.close()
+
+
+class BatchContext(object):
+    """A context provider that resolves the context of many templates in one
+    call. The function is called with the jinja environment and a list of
+    template names, and must return a dictionary with the context of each
+    template (the missing ones get an empty context). It could be an `async`
+    function too.
+
+    During a build the function is called only once, with all the matching
+    templates. Register it with ``batch=True``::
+
+        @proj.context('articles/*.html', batch=True)
+        def comments(env, template_names):
+            rows = db.comments_for(template_names)
+            return dict((name, {'comments': rows[name]})
+                        for name in template_names)
+
+    :param func: The batch function.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = getattr(func, '__name__', repr(func))
+
+        #: The contexts resolved for the current build, or None.
+        self.results = None
+
+        self._lock = threading.Lock()
+
+    def call(self, env, template_names):
+        """Call the function, returns the result or an awaitable."""
+        return self.func(env, list(template_names))
+
+    def prefetch(self, results):
+        """Store the results of a call for the current build."""
+        with self._lock:
+            self.results = results or {}
+
+    def clear(self):
+        """Forget the results of the current build."""
+        with self._lock:
+            self.results = None
+
+    def get(self, env, template_name, loop=None):
+        """Returns the context for one template. Uses the prefetched results
+        if any, or calls the function for the template alone, awaited in the
+        given :class:`EventLoop` if it's async."""
+        results = self.results
+        if results is None:
+            results = self.call(env, [template_name])
+            if inspect.isawaitable(results):
+                results = resolve_awaitables([results], loop)[0]
+        return (results or {}).get(template_name) or {}
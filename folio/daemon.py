@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+    Folio build daemon.
+
+    The daemon keeps a project loaded, with its Jinja environment, compiled
+    templates, caches and build manifest, and listens on a Unix domain socket
+    for commands. Builds are incremental, so a build where nothing changed
+    returns in milliseconds.
+
+    Requests and responses are JSON objects, one per line::
+
+        {"command": "build"}
+        {"ok": true, "result": {"count": 1, "builded": [...], ...}}
+
+    The commands are:
+
+    * ``ping``, to know if the daemon is running.
+    * ``build``, with an optional ``full`` argument to build everything.
+    * ``build-template``, with the ``template`` name.
+    * ``stats``, the build counters and cache statistics.
+    * ``invalidate``, with an optional list of ``templates``. Without it,
+      every cache is cleared and the next build is a full build.
+    * ``shutdown``, to stop the daemon.
+
+    From the command line::
+
+        python -m folio.daemon serve myproject:proj
+        python -m folio.daemon build myproject:proj
+
+    Where ``myproject:proj`` is the module and the name of the project. If no
+    daemon is running, ``build`` builds the project in the same process.
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import time
+import json
+import socket
+import threading
+
+if sys.version > '3':
+    basestring = str
+
+try:
+    from SocketServer import (UnixStreamServer, StreamRequestHandler,
+                              ThreadingMixIn)
+except ImportError:
+    from socketserver import (UnixStreamServer, StreamRequestHandler,
+                              ThreadingMixIn)
+
+__all__ = ['BuildDaemon', 'Client', 'DaemonError', 'DaemonUnavailable',
+           'build', 'load_project']
+
+#: The default socket file, relative to the current directory.
+DEFAULT_ADDRESS = '.folio.sock'
+
+
+class DaemonError(Exception):
+    """The daemon couldn't run a command."""
+
+
+class DaemonUnavailable(DaemonError):
+    """There is no daemon listening on the socket."""
+
+
+def build_result(builded, duration, folio, failures=()):
+    """Returns the JSON serializable result of a build."""
+    return {
+        'failures': [failure.to_json() for failure in failures],
+        'count': len(builded),
+        'builded': sorted([src, dst] for src, dst, _ in builded),
+        'templates': len(folio.manifest),
+        'duration': duration,
+    }
+
+
+class BuildDaemon(object):
+    """Serves the commands for a project.
+
+    :param folio: The project.
+    :param address: The socket file name.
+    """
+
+    def __init__(self, folio, address=DEFAULT_ADDRESS):
+        self.folio = folio
+        self.address = address
+
+        #: The time the daemon started.
+        self.started = time.time()
+
+        #: Number of builds and the result of the last one, without the list
+        #: of builded files.
+        self.builds = 0
+        self.last_build = None
+
+        #: The commands, by name.
+        self.commands = {
+            'ping': self.ping,
+            'build': self.build,
+            'build-template': self.build_template,
+            'stats': self.stats,
+            'invalidate': self.invalidate,
+            'shutdown': self.shutdown,
+        }
+
+        self.server = None
+
+        # Commands that use the project run one at a time, while `ping` and
+        # `stats` answer at any moment.
+        self._lock = threading.Lock()
+
+    def handle(self, request):
+        """Run a request and returns the response."""
+        command = self.commands.get(request.get('command'))
+        if command is None:
+            return {'ok': False,
+                    'error': 'Unknown command %r' % request.get('command')}
+        try:
+            result = command(**request.get('args', {}))
+        except Exception as e:
+            self.folio.logger.exception('Command %s failed',
+                                        request['command'])
+            return {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+        return {'ok': True, 'result': result}
+
+    def ping(self):
+        return {'pid': os.getpid()}
+
+    def build(self, full=False):
+        """Build the project, only the outdated templates unless `full` is
+        true."""
+        with self._lock:
+            start = time.time()
+            builded = self.folio.build(incremental=not full)
+            result = build_result(builded, time.time() - start, self.folio,
+                                  self.folio.failures)
+            self.builds += 1
+            self.last_build = dict(result, builded=None)
+        return result
+
+    def build_template(self, template):
+        """Build one template."""
+        with self._lock:
+            self.folio.init_config()
+            start = time.time()
+            rv = self.folio.build_template(template)
+            builded = rv if isinstance(rv, list) else [rv] if rv else []
+            return build_result(builded, time.time() - start, self.folio)
+
+    def stats(self):
+        folio = self.folio
+        stats = {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'builds': self.builds,
+            'last_build': self.last_build,
+            'templates': len(folio.manifest),
+            'dependencies': sum(len(files) for files in
+                                folio.dependencies.values()),
+        }
+        if folio.data is not None:
+            stats['data'] = {'parses': folio.data.parses,
+                             'hits': folio.data.hits}
+        if folio.index is not None:
+            stats['index'] = len(folio.index)
+        cache = getattr(folio.env, 'fragment_cache', None)
+        if cache is not None:
+            stats['fragment_cache'] = {'size': len(cache),
+                                       'hits': cache.hits,
+                                       'misses': cache.misses}
+        profiler = folio.profiler
+        if profiler is not None:
+            stats['profile'] = profiler.report()
+        return stats
+
+    def invalidate(self, templates=None):
+        """Forget the builds of the given templates, or clear every cache so
+        the next build is a full build."""
+        with self._lock:
+            folio = self.folio
+            folio.manifest.forget(templates)
+            if templates is None:
+                if folio.env.cache is not None:
+                    folio.env.cache.clear()
+                if folio.data is not None:
+                    folio.data.cache.clear()
+                cache = getattr(folio.env, 'fragment_cache', None)
+                if cache is not None:
+                    cache.clear()
+            return {'templates': len(folio.manifest)}
+
+    def shutdown(self):
+        """Stop serving, after answering this request."""
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown).start()
+        return {}
+
+    def serve_forever(self, warm=True):
+        """Listen on the socket until the shutdown command is received.
+
+        :param warm: Build the project before listening, so the first build
+                     requested is already incremental.
+        """
+        if os.path.exists(self.address):
+            if Client(self.address).is_running():
+                raise DaemonError('A daemon is already listening on %s'
+                                  % self.address)
+            os.remove(self.address)
+
+        if warm:
+            self.build()
+
+        self.server = DaemonServer(self, self.address)
+        self.folio.logger.info('Listening on %s', self.address)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.server = None
+            if self.folio.profiler is not None:
+                self.folio.profiler.close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+
+
+class DaemonRequestHandler(StreamRequestHandler):
+    """Reads requests and writes responses, one JSON object per line, until
+    the client closes the connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                response = {'ok': False, 'error': 'Invalid request'}
+            else:
+                response = self.server.daemon.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class DaemonServer(ThreadingMixIn, UnixStreamServer, object):
+    """The socket server of a :class:`BuildDaemon`."""
+
+    daemon_threads = True
+
+    def __init__(self, daemon, address):
+        self.daemon = daemon
+        UnixStreamServer.__init__(self, address, DaemonRequestHandler)
+
+
+class Client(object):
+    """Sends commands to a daemon.
+
+    :param address: The socket file name.
+    :param timeout: The timeout in seconds of every command, or None.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        self.address = address
+        self.timeout = timeout
+
+    def request(self, command, **args):
+        """Run a command, returns its result. Raises
+        :exc:`DaemonUnavailable` if there is no daemon listening and
+        :exc:`DaemonError` if the command failed."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            try:
+                sock.connect(self.address)
+            except socket.error as e:
+                raise DaemonUnavailable(str(e))
+
+            request = {'command': command, 'args': args}
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        finally:
+            sock.close()
+
+        if not line:
+            raise DaemonError('Connection closed by the daemon')
+        response = json.loads(line.decode('utf-8'))
+        if not response.get('ok'):
+            raise DaemonError(response.get('error'))
+        return response['result']
+
+    def is_running(self):
+        """True if a daemon is listening."""
+        try:
+            self.request('ping')
+        except DaemonUnavailable:
+            return False
+        return True
+
+
+def load_project(spec):
+    """Returns the project of a ``module:name`` specification. The module is
+    imported from the current directory."""
+    modname, _, name = spec.partition(':')
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    module = __import__(modname, None, None, ['__name__'])
+    return getattr(module, name or 'proj')
+
+
+def build(project=None, address=DEFAULT_ADDRESS, full=False):
+    """Build with the daemon listening on the address, or in this process if
+    there is no daemon. Returns the result of the build.
+
+    :param project: The project, a function that returns it or a
+                    ``module:name`` specification, used only if there is no
+                    daemon.
+    :param address: The socket file name.
+    :param full: Build every template, not only the outdated ones.
+    """
+    try:
+        return Client(address).request('build', full=full)
+    except DaemonUnavailable:
+        if project is None:
+            raise
+
+    if isinstance(project, basestring):
+        project = load_project(project)
+    elif not hasattr(project, 'build'):
+        project = project()
+
+    start = time.time()
+    builded = project.build(incremental=not full)
+    return build_result(builded, time.time() - start, project,
+                        project.failures)
+
+
+def main(argv=None):
+    import argparse
+
+    # Only serve and build take the project, the other commands only talk
+    # to the daemon.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--socket', default=DEFAULT_ADDRESS,
+                        help='the socket file (default: %(default)s)')
+
+    parser = argparse.ArgumentParser(prog='python -m folio.daemon',
+                                     description='Folio build daemon.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    serve = commands.add_parser('serve', parents=[common],
+                                help='start the daemon')
+    serve.add_argument('project', help='the project, as module:name')
+
+    build_parser = commands.add_parser(
+        'build', parents=[common],
+        help='build, in this process if there is no daemon')
+    build_parser.add_argument('project', nargs='?',
+                              help='the project, as module:name')
+    build_parser.add_argument('--full', action='store_true',
+                              help='build every template')
+
+    build_template = commands.add_parser('build-template', parents=[common],
+                                         help='build the templates')
+    build_template.add_argument('templates', nargs='+',
+                                help='template names')
+
+    invalidate = commands.add_parser(
+        'invalidate', parents=[common],
+        help='forget the builds of the templates, or clear every cache')
+    invalidate.add_argument('templates', nargs='*', help='template names')
+
+    commands.add_parser('stats', parents=[common],
+                        help='show the daemon statistics')
+    commands.add_parser('shutdown', parents=[common], help='stop the daemon')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        BuildDaemon(load_project(args.project), args.socket).serve_forever()
+        return 0
+
+    try:
+        if args.command == 'build':
+            result = build(args.project, args.socket, args.full)
+        elif args.command == 'build-template':
+            client = Client(args.socket)
+            result = [client.request('build-template', template=name)
+                      for name in args.templates]
+        elif args.command == 'invalidate':
+            result = Client(args.socket).request(
+                'invalidate', templates=args.templates or None)
+        else:
+            result = Client(args.socket).request(args.command)
+    except DaemonError as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+
+    sys.stdout.write(json.dumps(result, indent=1, sort_keys=True) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
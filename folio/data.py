@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+    Data files for Folio.
+
+    The files in the data directory of the project (``data`` by default) are
+    available in the templates as the `data` global, by their name without
+    extension::
+
+        data/authors.json       ->  data.authors
+        data/menu/main.csv      ->  data.menu.main
+
+    Files are parsed the first time they are used and shared by every
+    template. They are checked for changes at most once per build, and the
+    project records which templates read which files, so the development
+    server only rebuilds the pages that use a modified file.
+"""
+
+from __future__ import with_statement
+
+import os
+import io
+import csv
+import json
+import hashlib
+import threading
+
+try:
+    from configparser import RawConfigParser
+except ImportError:
+    from ConfigParser import RawConfigParser
+
+__all__ = ['DataLoader', 'DataNamespace', 'PARSERS']
+
+
+def parse_json(f):
+    return json.load(f)
+
+
+def parse_csv(f):
+    return list(csv.DictReader(f))
+
+
+def parse_ini(f):
+    parser = RawConfigParser()
+    parser.read_file(f)
+    return dict((section, dict(parser.items(section)))
+                for section in parser.sections())
+
+
+#: Parsers for every file extension. They are called with the file opened in
+#: text mode.
+PARSERS = {
+    'json': parse_json,
+    'csv': parse_csv,
+    'ini': parse_ini,
+}
+
+
+class DataNamespace(object):
+    """A directory of the data path. Files and subdirectories are available
+    as attributes or items."""
+
+    def __init__(self, loader, prefix=''):
+        self._loader = loader
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._loader.get(self._prefix + name)
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._loader.names(self._prefix))
+
+    def __repr__(self):
+        return '<DataNamespace %r>' % (self._prefix or '/')
+
+
+class DataLoader(object):
+    """Finds, parses and caches the data files.
+
+    :param folio: The project.
+    :param path: The data directory.
+    :param formats: The file extensions to load, in order of preference.
+    :param check: How to detect modified files, ``'mtime'`` (modification
+                  time and size) or ``'hash'`` (the content hash).
+    """
+
+    def __init__(self, folio, path, formats=('json', 'csv', 'ini'),
+                 check='mtime'):
+        self.folio = folio
+        self.path = path
+        self.formats = formats
+        self.check = check
+
+        #: The parsed files, by filename, with the signature they had.
+        self.cache = {}
+
+        #: Files already checked for changes in this build.
+        self.checked = set()
+
+        #: Number of times a file was parsed and served from the cache.
+        self.parses = 0
+        self.hits = 0
+
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """Check the files again the next time they are used. Called at the
+        beginning of every build."""
+        with self._lock:
+            self.checked.clear()
+
+    def find(self, name):
+        """Returns the filename for a data name, the directory if it's a
+        namespace, or None if not found."""
+        base = os.path.join(self.path, *name.split('.'))
+        for ext in self.formats:
+            filename = '%s.%s' % (base, ext)
+            if os.path.isfile(filename):
+                return filename
+        if os.path.isdir(base):
+            return base
+        return None
+
+    def names(self, prefix=''):
+        """Returns the names available in a namespace."""
+        path = os.path.join(self.path, *prefix.split('.')[:-1])
+        found = set()
+        for filename in sorted(os.listdir(path)):
+            name, ext = os.path.splitext(filename)
+            if name.startswith(('.', '_')):
+                continue
+            if ext[1:] in self.formats or \
+                    os.path.isdir(os.path.join(path, filename)):
+                found.add(name)
+        return sorted(found)
+
+    def get(self, name):
+        """Returns the parsed data for a name, or a :class:`DataNamespace` if
+        it's a directory. The file is recorded as a dependency of the
+        template being built.
+
+        :param name: The data name, with dots for subdirectories.
+        """
+        filename = self.find(name)
+        if filename is None:
+            raise KeyError(name)
+        if os.path.isdir(filename):
+            return DataNamespace(self, name + '.')
+
+        self.folio.add_dependency(filename)
+        return self.load(filename)
+
+    def signature(self, filename):
+        """Returns the value used to detect changes of a file."""
+        if self.check == 'hash':
+            with open(filename, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        stat = os.stat(filename)
+        return (stat.st_mtime, stat.st_size)
+
+    def load(self, filename):
+        """Returns the parsed file, parsing it only if it's not cached or was
+        modified."""
+        with self._lock:
+            cached = self.cache.get(filename)
+            if cached is not None and filename in self.checked:
+                self.hits += 1
+                return cached[1]
+
+            signature = self.signature(filename)
+            self.checked.add(filename)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                return cached[1]
+
+            _, ext = os.path.splitext(filename)
+            parser = PARSERS[ext[1:]]
+            with io.open(filename, 'r', encoding=self.folio.encoding,
+                         newline='') as f:
+                value = parser(f)
+
+            self.cache[filename] = (signature, value)
+            self.parses += 1
+            return value
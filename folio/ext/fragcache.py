@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+    Fragment cache for Folio.
+
+    Adds a ``cache`` tag to Jinja to render a fragment of a template only once
+    and reuse it in the following pages::
+
+        {% cache "sidebar", section %}
+            ... expensive navigation tree ...
+        {% endcache %}
+
+    The first argument is the key of the fragment, the following ones are its
+    dependencies: values that, if changed, make the fragment to be rendered
+    again. The key is also built with a hash of the template source, so
+    editing the template invalidates its fragments.
+
+    The files loaded while a fragment is rendered, like included templates,
+    macros or data files, are stored with it. If the signature of one of them
+    changed, the fragment is rendered again, and when it's reused they are
+    recorded again as dependencies of the template being built.
+
+    The Jinja extension :class:`FragmentCacheExtension` can be used alone in
+    `JINJA_EXTENSIONS`, in that case the fragments are kept in memory while the
+    environment lives. When registered as a Folio extension, the cache is
+    cleared on every build, or persisted between builds if
+    `FRAGMENT_CACHE_PATH` is set.
+
+    :param FRAGMENT_CACHE_SIZE: Maximum number of fragments to keep. The least
+                                recently used are evicted. Defaults to 1000.
+    :param FRAGMENT_CACHE_PATH: File where the fragments are persisted between
+                                builds. Defaults to None (not persisted).
+"""
+
+from __future__ import with_statement
+
+import os
+import json
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from folio.manifest import file_signature
+
+
+__all__ = ['FragmentCache', 'FragmentCacheExtension']
+
+FRAGMENT_CACHE_SIZE = 1000
+FRAGMENT_CACHE_PATH = None
+
+
+class FragmentCache(object):
+    """A bounded cache of rendered fragments with LRU eviction. Every
+    fragment is stored with the signatures of the files it depends on.
+
+    :param size: The maximum number of fragments.
+    :param path: Optional file name to load and save the fragments.
+    """
+
+    def __init__(self, size=FRAGMENT_CACHE_SIZE, path=None):
+        self.size = size
+        self.path = path
+
+        #: Hits and misses counters since the cache was created.
+        self.hits = 0
+        self.misses = 0
+
+        #: The function that returns the signature of a dependency.
+        self.signature = file_signature
+
+        #: Called with every dependency of a fragment when it's reused.
+        #: Defaults to :meth:`add_dependency`.
+        self.replay = self.add_dependency
+
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def _recordings(self):
+        try:
+            return self._local.recordings
+        except AttributeError:
+            recordings = self._local.recordings = []
+            return recordings
+
+    def begin_recording(self):
+        """Start recording the dependencies of a fragment rendered in this
+        thread. Fragments can be nested."""
+        self._recordings().append(set())
+
+    def end_recording(self):
+        """Stop recording and return the dependencies of the fragment."""
+        return self._recordings().pop()
+
+    def add_dependency(self, filename):
+        """Record a dependency of the fragments being rendered in this
+        thread, if any."""
+        for recording in self._recordings():
+            recording.add(filename)
+
+    def get(self, key):
+        """Returns the fragment for the key, or None if not cached or if one
+        of its dependencies changed."""
+        with self._lock:
+            try:
+                value, dependencies = self._fragments.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            for filename, signature in dependencies.items():
+                if self.signature(filename) != signature:
+                    self.misses += 1
+                    return None
+            self._fragments[key] = (value, dependencies)
+            self.hits += 1
+        for filename in dependencies:
+            self.replay(filename)
+        return value
+
+    def set(self, key, value, dependencies=()):
+        """Store a fragment, evicting the least recently used if the cache is
+        full.
+
+        :param key: The fragment key.
+        :param value: The rendered fragment.
+        :param dependencies: The files the fragment depends on.
+        """
+        dependencies = dict((filename, self.signature(filename))
+                            for filename in dependencies)
+        with self._lock:
+            self._fragments.pop(key, None)
+            self._fragments[key] = (value, dependencies)
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        """Remove all the fragments."""
+        with self._lock:
+            self._fragments.clear()
+
+    def load(self):
+        """Load the fragments from the file, if exists."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                fragments = json.load(f)
+        except ValueError:
+            # A corrupted cache is the same as no cache.
+            return
+        with self._lock:
+            self._fragments = OrderedDict(
+                (key, tuple(value)) for key, value in fragments[-self.size:]
+                if isinstance(value, list))
+
+    def save(self):
+        """Save the fragments to the file, from the least to the most recently
+        used."""
+        if not self.path:
+            return
+        with self._lock:
+            fragments = list(self._fragments.items())
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(fragments, f)
+        os.rename(tmp, self.path)
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension that adds the ``cache`` tag. The cache is available
+    in the environment as `fragment_cache`. The templates loaded while
+    rendering a fragment are recorded as its dependencies."""
+
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        cache = FragmentCache()
+        environment.extend(fragment_cache=cache)
+
+        #: Hashes of the sources of the templates, by name. They are taken
+        #: before the template is parsed.
+        self.source_hashes = {}
+
+        get_template = environment.get_template
+
+        def get_template_dependency(*args, **kwargs):
+            template = get_template(*args, **kwargs)
+            if template.filename:
+                cache.add_dependency(template.filename)
+            return template
+
+        environment.get_template = get_template_dependency
+
+    def preprocess(self, source, name, filename=None):
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        self.source_hashes[name] = digest
+        return source
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key = parser.parse_expression()
+        deps = []
+        while parser.stream.skip_if('comma'):
+            deps.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+
+        args = [nodes.Const(self.source_hashes.get(parser.name, '')),
+                nodes.Const(lineno), key, nodes.List(deps)]
+        call = self.call_method('_render_fragment', args)
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, source_hash, lineno, key, deps, caller):
+        cache = self.environment.fragment_cache
+
+        # Dependencies are compared by their representation, so they should
+        # be simple values like strings or numbers.
+        ident = repr((source_hash, lineno, key, deps)).encode('utf-8')
+        ident = hashlib.sha1(ident).hexdigest()
+
+        fragment = cache.get(ident)
+        if fragment is None:
+            cache.begin_recording()
+            try:
+                fragment = caller()
+            finally:
+                dependencies = cache.end_recording()
+            cache.set(ident, str(fragment), dependencies)
+        return Markup(fragment)
+
+
+def register(folio):
+    folio.env.add_extension(FragmentCacheExtension)
+
+    cache = folio.env.fragment_cache
+    cache.size = folio.config.get('FRAGMENT_CACHE_SIZE', FRAGMENT_CACHE_SIZE)
+
+    path = folio.config.get('FRAGMENT_CACHE_PATH', FRAGMENT_CACHE_PATH)
+    if path:
+        cache.path = folio._make_abspath(path)
+
+    # The dependencies of the project, like the data files, are also
+    # dependencies of the fragments being rendered. When a fragment is
+    # reused, its dependencies are recorded for the template being built.
+    add_dependency = folio.add_dependency
+
+    def add_fragment_dependency(filename, template_name=None):
+        if template_name is None:
+            cache.add_dependency(filename)
+        add_dependency(filename, template_name)
+
+    def signature(filename):
+        # The signatures are cached by the manifest during a build.
+        return folio.manifest.signature(filename)
+
+    folio.add_dependency = add_fragment_dependency
+    cache.replay = add_fragment_dependency
+    cache.signature = signature
+
+    @folio.before_build
+    def load_fragments(folio):
+        # Fragments only live during a build, unless they are persisted.
+        if cache.path:
+            if not len(cache):
+                cache.load()
+        else:
+            cache.clear()
+
+    @folio.after_build
+    def save_fragments(folio, builded):
+        # Nothing is rendered when the shards of a build are merged, the
+        # saved fragments are kept.
+        if len(cache):
+            cache.save()
@@ -15,15 +15,17 @@
                                        to the builder.
 """
 
+import threading
 
-try:
-    import markdown
-except ImportError:
-    markdown = False
+from importlib.util import find_spec
 
 from folio.builders import Wrapper
 from folio.helpers import lazy_property
 
+#: True if python markdown is installed. It's imported the first time a file
+#: is parsed.
+available = find_spec('markdown') is not None
+
 
 DEFAULT_TEMPLATE = '_markdown.html'
 DEFAULT_VARIABLE = 'content'
@@ -50,18 +52,23 @@ class MarkdownBuilder(Wrapper):
     :param variable: Variable name to set.
     """
 
-    #: False if the import of python markdown failed.
-    enable = bool(markdown)
+    #: False if python markdown is not installed.
+    enabled = available
 
     def __init__(self, template=DEFAULT_TEMPLATE, variable=DEFAULT_VARIABLE):
         super().__init__(template, variable, self.parse)
+        self._lock = threading.Lock()
 
     @lazy_property
     def markdown(self):
+        import markdown
         return markdown.Markdown()
 
     def parse(self, content):
-        return self.markdown.convert(content)
+        # The parser keeps the references and footnotes of the last page, it
+        # is reset for every page and used by one thread at a time.
+        with self._lock:
+            return self.markdown.reset().convert(content)
 
 
 def register(folio):
@@ -71,4 +78,4 @@ def register(folio):
     patterns = folio.config.get('MARKDOWN_PATTERNS', DEFAULT_PATTERNS)
 
     # Add the builder.
-    folio.add_builder(patterns, Wrapper(template, variable))
+    folio.add_builder(patterns, MarkdownBuilder(template, variable))
@@ -2,18 +2,33 @@
 """
     Theming support for Folio.
 
+    A theme is a directory inside one of the themes paths. It could inherit
+    from another theme with a `theme.conf` file::
+
+        [theme]
+        inherit = basic
+
+    Templates not found in the theme are taken from its parent.
+
     :param THEME: The active theme name. Defaults to 'basic'.
     :param THEMES_PATHS: A list of directories where the themes could be
                          defined.
 """
 
+from __future__ import with_statement
+
 import os
 import sys
 
 if sys.version > '3':
     basestring = str
 
-from jinja2 import BaseLoader, FileSystemLoader
+try:
+    from configparser import RawConfigParser
+except ImportError:
+    from ConfigParser import RawConfigParser
+
+from jinja2 import BaseLoader, FileSystemLoader, TemplateNotFound
 
 from folio.helpers import lazy_property
 
@@ -23,62 +38,164 @@ __all__ = ['Theme', 'ThemeManager', 'ThemeTemplateLoader']
 THEME = 'basic'
 THEMES_PATHS = ['themes']
 
+#: The theme configuration file name. It's not considered a template.
+THEME_CONF = 'theme.conf'
+
 
 class Theme(object):
-    """An instance of a theme. It has a name, path, some settings and a jinja
-    loader."""
+    """An instance of a theme. It has a name, path, some settings, an
+    optional parent theme and an index of its files."""
 
-    def __init__(self, name, path, **settings):
+    def __init__(self, name, path, parent=None, **settings):
         self.name = name
         self.path = os.path.join(path, name)
+        self.parent = parent
         self.settings = settings
 
+        #: The files of the theme (without the parents), by template name.
+        self.files = {}
+
+        #: The modification time of every directory of the theme, used to
+        #: know when files were added or removed.
+        self.mtimes = {}
+
+        self.scan()
+
     @lazy_property
     def jinja_loader(self):
         return FileSystemLoader(self.path)
 
+    @staticmethod
+    def read_settings(path):
+        """Returns the settings of the `theme.conf` file in the given theme
+        directory, or an empty dictionary."""
+        filename = os.path.join(path, THEME_CONF)
+        if not os.path.exists(filename):
+            return {}
+        parser = RawConfigParser()
+        parser.read(filename)
+        if not parser.has_section('theme'):
+            return {}
+        return dict(parser.items('theme'))
+
+    def scan(self):
+        """Walk the theme directory and index its files."""
+        files = {}
+        mtimes = {}
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            mtimes[dirpath] = os.path.getmtime(dirpath)
+            relpath = os.path.relpath(dirpath, self.path)
+            for filename in filenames:
+                if relpath == '.':
+                    if filename == THEME_CONF:
+                        continue
+                    name = filename
+                else:
+                    name = '/'.join(relpath.split(os.path.sep) + [filename])
+                files[name] = os.path.join(dirpath, filename)
+        self.files = files
+        self.mtimes = mtimes
+
+    def is_modified(self):
+        """True if a file was added or removed since the last scan."""
+        for dirpath, mtime in self.mtimes.items():
+            try:
+                if os.path.getmtime(dirpath) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def lineage(self):
+        """Returns the theme and its parents, the theme first."""
+        theme, lineage = self, []
+        while theme is not None:
+            lineage.append(theme)
+            theme = theme.parent
+        return lineage
+
 
 class ThemeManager(object):
-    """Controls all themes."""
+    """Controls all themes.
 
-    #: A list of paths where the themes can be found in.
-    paths = []
+    :param folio: The project.
+    :param paths: A list of paths where the themes can be found in.
+    """
 
-    #: Cache for the instances of the class:class:`folio.ext.themes.Theme` of
-    #: every theme which was used. Each instance is created by the method
-    #: :meth:`folio.ext.themes.ThemeManager.get_theme`.
-    themes = {}
+    def __init__(self, folio=None, paths=None):
+        #: A list of paths where the themes can be found in.
+        self.paths = list(paths or [])
 
-    #: The current theme.
-    theme = None
+        #: Cache for the instances of the class:class:`folio.ext.themes.Theme`
+        #: of every theme which was used. Each instance is created by the
+        #: method :meth:`folio.ext.themes.ThemeManager.get_theme`.
+        self.themes = {}
+
+        #: The templates of every theme merged with the ones of its parents,
+        #: by theme name. Each one is a dictionary of template names and file
+        #: names.
+        self.index = {}
+
+        #: The current theme.
+        self.theme = None
 
-    def __init__(self, folio=None):
         if folio is not None:
             self.bind_proj(folio)
 
     def bind_proj(self, folio):
         self.folio = folio
 
-    def get_theme(self, name, path=None):
+    def get_theme(self, name, path=None, _children=()):
         if name in self.themes:
             return self.themes[name]
 
+        if name in _children:
+            raise LookupError('Theme %s inherits from itself.' % name)
+
         # Where to lookup the theme.
         paths = self.paths if path is None else [path]
 
         for path in paths:
             if os.path.exists(os.path.join(path, name)):
-                theme = Theme(name, path)
+                settings = Theme.read_settings(os.path.join(path, name))
+                parent = settings.pop('inherit', None)
+                if parent:
+                    parent = self.get_theme(parent,
+                                            _children=_children + (name,))
+                theme = Theme(name, path, parent, **settings)
                 self.themes[name] = theme
                 return theme
 
         raise LookupError('Theme %s not found.' % name)
 
+    def get_index(self, theme):
+        """Returns the templates of a theme and its parents, by name."""
+        try:
+            return self.index[theme.name]
+        except KeyError:
+            pass
+
+        index = {}
+        for ancestor in reversed(theme.lineage()):
+            index.update(ancestor.files)
+        self.index[theme.name] = index
+        return index
+
+    def refresh(self):
+        """Scan again the themes where files were added or removed."""
+        modified = False
+        for theme in list(self.themes.values()):
+            if theme.is_modified():
+                theme.scan()
+                modified = True
+        if modified:
+            self.index.clear()
+
     def get_template(self, template_name, theme=None):
         if theme is None:
             theme = self.theme
         elif isinstance(theme, basestring):
-            theme = self.themes[theme]
+            theme = self.get_theme(theme)
 
         return '_themes/%s/%s' % (theme.name, template_name)
 
@@ -86,25 +203,50 @@ class ThemeManager(object):
 class ThemeTemplateLoader(BaseLoader):
     """Load templates of the themes controlled by the given theme manager."""
 
-    def __init__(self, manager):
+    def __init__(self, manager, encoding='utf-8'):
         BaseLoader.__init__(self)
 
         #: One theme manager to rule them all.
         self.manager = manager
 
+        #: The templates encoding.
+        self.encoding = encoding
+
     def get_source(self, environment, template):
         if template.startswith('_themes/'):
-            theme_name, template = template[8:].split('/', 1)
-            theme = self.manager.themes[theme_name]
+            try:
+                theme_name, name = template[8:].split('/', 1)
+                theme = self.manager.get_theme(theme_name)
+            except (ValueError, LookupError):
+                raise TemplateNotFound(template)
         else:
-            theme = self.manager.theme
+            theme, name = self.manager.theme, template
 
-        return theme.jinja_loader.get_source(environment, template)
+        filename = self.manager.get_index(theme).get(name)
+        if filename is None:
+            raise TemplateNotFound(template)
+
+        try:
+            mtime = os.path.getmtime(filename)
+            with open(filename, 'rb') as f:
+                source = f.read().decode(self.encoding)
+        except (IOError, OSError):
+            raise TemplateNotFound(template)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(filename) == mtime
+            except OSError:
+                return False
+
+        return source, filename, uptodate
 
     def list_templates(self):
+        self.manager.refresh()
+
         found = set()
-        for theme in self.manager.themes.itervalues():
-            found.update(theme.jinja_loader.list_templates())
+        for theme in list(self.manager.themes.values()):
+            found.update(self.manager.get_index(theme))
         return sorted(found)
 
 
@@ -124,7 +266,7 @@ def register(folio):
     #: that inside you want to include the `themes/basic/style.css`. You need
     #: to use the method :meth:`folio.ext.themes.ThemeManager.get_template`
     #: that is available as `theme` in jinja.
-    loader = ThemeTemplateLoader(manager)
+    loader = ThemeTemplateLoader(manager, folio.encoding)
 
     # Add the theme template loader to the list of loaders. This is possible
     # because the :attr:`folio.Folio.jinja_loader` is an instance of the Jinja
@@ -135,3 +277,6 @@ def register(folio):
     folio.env.globals.update({
         'theme': manager.get_template,
     })
+
+    # Other extensions could use the manager through the environment.
+    folio.env.extend(theme_manager=manager)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+    Forked builds for Folio.
+
+    A forked build renders the templates in worker processes forked from a
+    warm project, so the workers don't repeat its cold start. It's enabled
+    with the configuration::
+
+        proj.config['BUILD_FORKS'] = 8
+
+    Before forking, the project is warmed once:
+
+    * the configuration and the extensions are initialized, and the content
+      index and the batch contexts are ready, as in every build,
+    * the templates are compiled into the cache of the Jinja environment,
+      with the layouts and includes they reference and the templates of the
+      wrapper and generator builders. The cache is enlarged if it can't hold
+      all of them, so none is evicted before the fork,
+    * the contexts of all the templates are resolved (in a thread pool if
+      `CONTEXT_WORKERS` is set).
+
+    Then the garbage collector is frozen, so the workers don't write to the
+    memory of the objects inherited from the parent, and that memory is
+    shared by all of them until they exit. Every worker only renders its
+    slice of the templates, balanced with the build times of the manifest
+    like the shards (see :mod:`folio.sharding`) if they are known.
+
+    A template that raises an error doesn't stop its worker: as in isolated
+    builds, it's recorded in :attr:`folio.Folio.failures` and the other
+    templates are built. The records of the templates and their
+    dependencies, the failures and the spans of the profiler are sent back
+    to the project. As in isolated builds, the results of the builders
+    are not, the builded tuples have None as result. The other state changed
+    in the workers is lost too: the entries of the fragment cache (see
+    :mod:`folio.ext.fragcache`) and the parse and hit counters of the data
+    cache (see :mod:`folio.data`). This requires a platform with `fork`,
+    otherwise the templates are built in the project process.
+
+    :param BUILD_FORKS: The number of worker processes. Zero or one to build
+                        in the project process.
+"""
+
+from __future__ import with_statement
+
+import gc
+import time
+import weakref
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+from jinja2 import TemplateError, meta
+from jinja2.utils import LRUCache
+
+from .builders import Wrapper, static_builder
+from .isolation import Failure
+from .manifest import Record
+from .profiling import Span
+from .sharding import plan_shards
+
+__all__ = ['ForkedBuild', 'build_forked', 'can_fork']
+
+
+def can_fork():
+    """True if the platform can fork the workers."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+class ForkedBuild(object):
+    """The state of a forked build, warmed in the project and inherited by
+    the workers.
+
+    :param folio: The project.
+    :param templates: The template names to build.
+    :param forks: The number of worker processes.
+    """
+
+    def __init__(self, folio, templates, forks):
+        self.folio = folio
+        self.templates = list(templates)
+        self.forks = max(1, min(forks, len(self.templates)))
+
+        #: The template names of every worker.
+        self.slices = []
+
+        #: The context of every template, by name.
+        self.contexts = {}
+
+        #: The names of the templates compiled in the environment cache.
+        self.compiled = []
+
+    def _jinja_templates(self, template_name):
+        """Returns the names of the Jinja templates a builder renders for a
+        template."""
+        folio = self.folio
+        builder = folio.get_builder(template_name)
+        if builder is static_builder:
+            return []
+        if isinstance(builder, Wrapper):
+            return [builder.template]
+        if hasattr(builder, 'generate'):
+            return [builder.template or template_name]
+        return [template_name]
+
+    def _reserve(self, size):
+        """Make the template cache of the environment hold at least `size`
+        templates. It's at least doubled, so it grows a few times."""
+        env = self.folio.env
+        cache = env.cache
+        if isinstance(cache, LRUCache) and cache.capacity < size:
+            resized = LRUCache(max(size, cache.capacity * 2))
+            # The least recently used first, so the order is kept.
+            for key, template in reversed(cache.items()):
+                resized[key] = template
+            env.cache = resized
+
+    def _compile(self, name, seen):
+        """Compile a template into the environment cache, as
+        `get_template` does, and find the templates it references. The
+        source is parsed once for both. Returns the names of the referenced
+        templates."""
+        env = self.folio.env
+        if name in seen:
+            return []
+        seen.add(name)
+        try:
+            if env.bytecode_cache is not None:
+                # The bytecode cache is only used by the loader.
+                env.get_template(name)
+            source, filename, uptodate = env.loader.get_source(env, name)
+            tree = env.parse(source, name, filename)
+            references = list(meta.find_referenced_templates(tree))
+            key = (weakref.ref(env.loader), name)
+            cached = env.cache.get(key) if env.cache is not None else None
+            if env.cache is not None and (cached is None or env.auto_reload
+                                          and not cached.is_up_to_date):
+                self._reserve(len(env.cache) + 1)
+                code = env.compile(tree, name, filename)
+                env.cache[key] = env.template_class.from_code(
+                    env, code, env.make_globals(None), uptodate)
+        except TemplateError:
+            # The template is built (and fails) in its worker.
+            return []
+        self.compiled.append(name)
+        return [ref for ref in references if ref]
+
+    def warm(self):
+        """Compile the templates and resolve the contexts. The referenced
+        templates, like layouts, are compiled last."""
+        folio = self.folio
+        seen = set()
+        references = []
+        for template_name in self.templates:
+            for name in self._jinja_templates(template_name):
+                references.extend(self._compile(name, seen))
+        while references:
+            name = references.pop(0)
+            references.extend(self._compile(name, seen))
+
+        for template_name, context in folio._iter_contexts(self.templates):
+            if context is None:
+                # As in build_template, the dependencies recorded while the
+                # context is resolved are the template's.
+                with folio._current_template(template_name):
+                    context = folio.get_context(template_name)
+            self.contexts[template_name] = context
+
+        # Without the build times of a previous build, the templates are
+        # dealt in turn.
+        durations = dict((name, record.duration) for name, record
+                         in folio.manifest.records.items())
+        if durations:
+            slices = plan_shards(self.templates, self.forks, durations)
+        else:
+            slices = [self.templates[i::self.forks]
+                      for i in range(self.forks)]
+        self.slices = [names for names in slices if names]
+
+    def build_slice(self, i):
+        """Build the templates of a slice, in a worker. Returns the builded
+        tuples, the dependencies and the manifest record of every template,
+        and the failures and profiler spans recorded while building them.
+        """
+        folio = self.folio
+        profiler = folio.profiler
+        failures = len(folio.failures)
+        spans = len(profiler.spans) if profiler is not None else 0
+        builded = []
+        dependencies = {}
+        records = {}
+        for template_name in self.slices[i]:
+            started = time.time()
+            try:
+                rv = folio.build_template(template_name,
+                                          self.contexts[template_name])
+            except Exception as e:
+                folio.failures.append(Failure(
+                    template_name, 'error', time.time() - started,
+                    error='%s: %s' % (type(e).__name__, e)))
+                continue
+            results = rv if isinstance(rv, list) else [rv] if rv else []
+            builded.extend((src, dst, None) for src, dst, _ in results)
+            dependencies[template_name] = \
+                sorted(folio.dependencies.get(template_name, ()))
+            record = folio.manifest.get(template_name)
+            if record is not None:
+                records[template_name] = record.to_json()
+
+        # They are taken out, so the slices built in the project process
+        # are merged like the forked ones.
+        new_failures = folio.failures[failures:]
+        del folio.failures[failures:]
+        new_spans = []
+        if profiler is not None:
+            new_spans = [span.to_json() for span in profiler.spans[spans:]]
+            del profiler.spans[spans:]
+        return builded, dependencies, records, new_failures, new_spans
+
+    def merge(self, results):
+        """Add the results of the workers to the project. Returns the set of
+        builded templates."""
+        folio = self.folio
+        profiler = folio.profiler
+        builded = set()
+        for slice_builded, dependencies, records, failures, spans in results:
+            builded.update(slice_builded)
+            for template_name, files in dependencies.items():
+                folio.dependencies[template_name] = set(files)
+            for template_name, record in records.items():
+                folio.manifest.set(template_name, Record.from_json(record))
+            for failure in failures:
+                folio.failures.append(failure)
+                folio.logger.error('Failed %s', failure)
+            if profiler is not None:
+                profiler.spans.extend(Span.from_json(profiler, span)
+                                      for span in spans)
+        return builded
+
+
+#: The build being run, inherited by the forked workers.
+_current = None
+
+
+def _build_slice(i):
+    return _current.build_slice(i)
+
+
+def build_forked(folio, templates, forks):
+    """Build the templates in worker processes forked from the warm project.
+    Returns the set of builded templates.
+
+    :param folio: The project.
+    :param templates: The template names.
+    :param forks: The number of worker processes.
+    """
+    global _current
+
+    run = ForkedBuild(folio, templates, forks)
+    if not run.templates:
+        return set()
+    run.warm()
+
+    if len(run.slices) < 2 or not can_fork():
+        return run.merge([run.build_slice(i)
+                          for i in range(len(run.slices))])
+
+    # The objects of the parent are moved out of the collected generations,
+    # so the workers don't touch their memory.
+    freeze = getattr(gc, 'freeze', None)
+    if freeze is not None:
+        gc.collect()
+        freeze()
+    try:
+        _current = run
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(len(run.slices),
+                                 mp_context=context) as executor:
+            results = list(executor.map(_build_slice,
+                                        range(len(run.slices))))
+    finally:
+        _current = None
+        if freeze is not None:
+            gc.unfreeze()
+
+    return run.merge(results)
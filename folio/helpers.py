@@ -3,6 +3,9 @@
     Helpers for Folio.
 """
 
+import os
+import shutil
+
 
 class lazy_property(object):
     def __init__(self, fget):
@@ -17,3 +20,14 @@ class lazy_property(object):
         val = self.fget(obj)
         obj.__dict__[self.__name__] = val
         return val
+
+
+def link_or_copy(src, dst):
+    """Hard link a file, or copy it if the file system doesn't support hard
+    links. The destination is replaced if exists."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except (OSError, AttributeError):
+        shutil.copy(src, dst)
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+    Content index for Folio.
+
+    The index knows every page of the site and its metadata, taken from a
+    front matter block at the beginning of the source::
+
+        ---
+        title: Hello World
+        date: 2013-02-28
+        tags: [python, folio]
+        ---
+        {% extends "_base.html" %}
+        ...
+
+    Only the front matter is read, not the whole file, and only the sources
+    that changed since the last scan are read again.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import sys
+import fnmatch
+import datetime
+import threading
+
+if sys.version > '3':
+    basestring = str
+
+from jinja2.ext import Extension
+
+from .archive import open_source, source_exists, source_mtime
+
+__all__ = ['ContentIndex', 'Collection', 'Entry', 'read_front_matter',
+           'strip_front_matter']
+
+#: The line that opens and closes a front matter block.
+DELIMITER = '---'
+
+#: Maximum number of lines of a front matter block. If the closing delimiter
+#: is not found before, the file is considered to not have front matter.
+MAX_LINES = 100
+
+_date_re = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_datetime_re = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2})?$')
+
+
+def _comparable(value):
+    """Returns a value that can be compared with the others of the same
+    kind. Dates are made datetimes at midnight, because front matter could
+    have both and they can't be compared."""
+    if isinstance(value, datetime.date) and \
+            not isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value, datetime.time())
+    return value
+
+
+def parse_value(value):
+    """Parse a front matter value. Understands lists between brackets,
+    booleans, integers, dates and quoted strings."""
+    value = value.strip()
+    if value.startswith('[') and value.endswith(']'):
+        return [parse_value(item) for item in value[1:-1].split(',')
+                if item.strip()]
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value in ('true', 'yes'):
+        return True
+    if value in ('false', 'no'):
+        return False
+    if value.isdigit():
+        return int(value)
+    if _date_re.match(value):
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if _datetime_re.match(value):
+        value = value.replace('T', ' ')
+        if value.count(':') == 1:
+            value += ':00'
+        return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def parse_front_matter(lines):
+    """Parse the lines of a front matter block (without the delimiters) as
+    `key: value` pairs."""
+    meta = {}
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        key, sep, value = line.partition(':')
+        if sep:
+            meta[key.strip()] = parse_value(value)
+    return meta
+
+
+def read_front_matter(filename, encoding='utf-8'):
+    """Read the front matter block of a file. Only the lines of the block are
+    read. Returns an empty dictionary if there is no front matter.
+
+    :param filename: The source file name.
+    :param encoding: The source encoding.
+    """
+    with open_source(filename) as f:
+        # Don't read a long first line, it can't be the delimiter. It's
+        # compared as bytes, the cut could split a multibyte character.
+        if f.readline(16).strip() != DELIMITER.encode('ascii'):
+            return {}
+        lines = []
+        for line in f:
+            line = line.decode(encoding)
+            if line.strip() == DELIMITER:
+                return parse_front_matter(lines)
+            lines.append(line)
+            if len(lines) > MAX_LINES:
+                break
+    return {}
+
+
+def strip_front_matter(source):
+    """Remove the front matter block from a source. The block is replaced with
+    empty lines, so the line numbers are preserved."""
+    if not source.startswith(DELIMITER):
+        return source
+    lines = source.split('\n', MAX_LINES + 2)
+    if lines[0].strip() != DELIMITER:
+        return source
+    for i in range(1, min(len(lines), MAX_LINES + 2)):
+        if lines[i].strip() == DELIMITER:
+            parts = source.split('\n', i + 1)
+            body = parts[i + 1] if len(parts) > i + 1 else ''
+            return '\n' * (i + 1) + body
+    return source
+
+
+class FrontMatterExtension(Extension):
+    """Jinja extension that removes the front matter from the templates."""
+
+    def preprocess(self, source, name, filename=None):
+        return strip_front_matter(source)
+
+
+class Entry(object):
+    """A page of the index. The metadata is available as attributes.
+
+    :param name: The template name.
+    :param url: The destination name, relative to the build path.
+    :param meta: The front matter.
+    :param mtime: The modification time of the source when it was read.
+    """
+
+    def __init__(self, name, url, meta, mtime):
+        self.name = name
+        self.url = url
+        self.meta = meta
+        self.mtime = mtime
+
+    @property
+    def title(self):
+        return self.meta.get('title', self.name)
+
+    @property
+    def date(self):
+        return self.meta.get('date')
+
+    @property
+    def tags(self):
+        tags = self.meta.get('tags', [])
+        if isinstance(tags, basestring):
+            return [tags]
+        return tags
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['meta'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return '<Entry %s>' % self.name
+
+
+class Collection(list):
+    """A list of entries that could be filtered, sorted and paginated. Every
+    method returns a new collection."""
+
+    def filter(self, pattern=None, tag=None, since=None, until=None, **meta):
+        """Returns the entries that match all the given conditions.
+
+        :param pattern: A template name pattern, e.g. ``'blog/*'``.
+        :param tag: A tag the entries must have.
+        :param since: The minimum date (inclusive).
+        :param until: The maximum date (exclusive).
+        :param meta: Values that the metadata must have.
+        """
+        entries = self
+        if pattern is not None:
+            entries = [e for e in entries if fnmatch.fnmatch(e.name, pattern)]
+        if tag is not None:
+            entries = [e for e in entries if tag in e.tags]
+        if since is not None:
+            since = _comparable(since)
+            entries = [e for e in entries if e.date is not None and
+                       _comparable(e.date) >= since]
+        if until is not None:
+            until = _comparable(until)
+            entries = [e for e in entries if e.date is not None and
+                       _comparable(e.date) < until]
+        for key, value in meta.items():
+            entries = [e for e in entries if e.meta.get(key) == value]
+        return Collection(entries)
+
+    def order_by(self, key='date'):
+        """Returns the entries sorted by an attribute. Prefix the key with a
+        minus to sort in reverse order, e.g. ``'-date'`` for the newest first.
+        Entries without the attribute are always last. Dates and datetimes
+        could be mixed, a date is sorted as midnight of that day."""
+        reverse = key.startswith('-')
+        key = key.lstrip('-')
+        entries = [e for e in self if getattr(e, key, None) is not None]
+        missing = [e for e in self if getattr(e, key, None) is None]
+        entries.sort(key=lambda entry: _comparable(getattr(entry, key)),
+                     reverse=reverse)
+        return Collection(entries + missing)
+
+    def paginate(self, number, per_page=10):
+        """Returns the entries of the page `number` (starting at 1)."""
+        start = (number - 1) * per_page
+        return Collection(self[start:start + per_page])
+
+    def pages(self, per_page=10):
+        """Returns the number of pages."""
+        return max(1, (len(self) + per_page - 1) // per_page)
+
+    def tags(self):
+        """Returns a dictionary of tags and the collection of its entries."""
+        found = {}
+        for entry in self:
+            for tag in entry.tags:
+                found.setdefault(tag, Collection()).append(entry)
+        return found
+
+
+class ContentIndex(object):
+    """Index of the pages of a project with their front matter.
+
+    The index is scanned with :meth:`scan` at the beginning of every build.
+    Only the sources that were modified after the previous scan are read. The
+    development server calls :meth:`update` with the modified templates.
+
+    It's available as the `index` Jinja global, so in templates and in
+    context functions::
+
+        @proj.context('index.html')
+        def index_context(env):
+            index = env.globals['index']
+            return {'latest': index.filter('blog/*').order_by('-date')[:5]}
+
+    :param folio: The project.
+    :param patterns: Template name patterns of the pages to index.
+    """
+
+    def __init__(self, folio, patterns):
+        self.folio = folio
+        self.patterns = patterns
+
+        self._entries = {}
+        self._collection = None
+        self._files = ()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def match(self, template_name):
+        """True if the template should be indexed."""
+        for pattern in self.patterns:
+            if fnmatch.fnmatch(template_name, pattern):
+                return True
+        return False
+
+    def _source(self, template_name):
+        filename = os.path.join(self.folio.source_path, template_name)
+        if source_exists(filename):
+            return filename
+        return None
+
+    def _read(self, template_name, filename, mtime):
+        meta = read_front_matter(filename, self.folio.encoding)
+        url = self.folio.translate_template_name(template_name)
+        builder = self.folio.get_builder(template_name)
+        if hasattr(builder, 'translate_template_name'):
+            url = builder.translate_template_name(template_name)
+        return Entry(template_name, url, meta, mtime)
+
+    def scan(self):
+        """Synchronize the index with the sources. New and modified sources
+        are read, the deleted ones are removed."""
+        names = [name for name in self.folio.list_templates()
+                 if self.match(name)]
+        removed = set(self._entries) - set(names)
+        self.update(names + list(removed))
+
+    def update(self, template_names):
+        """Update the given templates only. Templates that don't exist anymore
+        are removed from the index.
+
+        :param template_names: The names of the modified templates.
+        """
+        with self._lock:
+            changed = False
+            for template_name in template_names:
+                filename = self._source(template_name)
+                if filename is None or not self.match(template_name):
+                    changed |= self._entries.pop(template_name, None) \
+                        is not None
+                    continue
+
+                mtime = source_mtime(filename)
+                entry = self._entries.get(template_name)
+                if entry is not None and entry.mtime == mtime:
+                    continue
+
+                self._entries[template_name] = self._read(template_name,
+                                                          filename, mtime)
+                changed = True
+
+            if changed:
+                self._collection = None
+
+    def get(self, template_name):
+        """Returns the entry of a template, or None."""
+        return self._entries.get(template_name)
+
+    def all(self):
+        """Returns a collection with every entry, sorted by name.
+
+        The template being built depends on the indexed sources and their
+        directories, so it's rebuilt when a page is modified, added or
+        removed.
+        """
+        collection = self._collection
+        if collection is None:
+            collection = Collection(sorted(self._entries.values(),
+                                           key=lambda entry: entry.name))
+            files = set([self.folio.source_path])
+            for entry in collection:
+                filename = os.path.join(self.folio.source_path, entry.name)
+                files.add(filename)
+                files.add(os.path.dirname(filename))
+            self._files = files
+            self._collection = collection
+        if self.folio.current_template is not None:
+            for filename in self._files:
+                self.folio.add_dependency(filename)
+        return collection
+
+    def filter(self, *args, **kwargs):
+        """Shortcut for :meth:`Collection.filter` over all the entries."""
+        return self.all().filter(*args, **kwargs)
+
+    def order_by(self, key='date'):
+        """Shortcut for :meth:`Collection.order_by` over all the entries."""
+        return self.all().order_by(key)
+
+    def tags(self):
+        """Shortcut for :meth:`Collection.tags` over all the entries."""
+        return self.all().tags()
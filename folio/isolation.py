@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+    Isolated builds for Folio.
+
+    In an isolated build every template is built in a worker process, under a
+    wall-clock budget. A worker that takes longer is killed and replaced, and
+    the build continues with the next templates. The templates that timed
+    out, raised an exception or crashed their worker are reported at the end,
+    with the time spent in every phase until they stopped.
+
+    It's enabled with the configuration::
+
+        proj.config['BUILD_TIMEOUT'] = 30     # Seconds per template.
+        proj.config['BUILD_WORKERS'] = 4      # Worker processes.
+
+    The workers are forked from the project, so they see everything that was
+    set up before the build: contexts, extensions, the content index, etc.
+    The results of the builders are not sent back, the builded tuples have
+    None as result.
+
+    :param BUILD_TIMEOUT: The maximum time in seconds to build a template, or
+                          None for no limit.
+    :param BUILD_WORKERS: The number of worker processes. Defaults to one if
+                          only the timeout is set.
+"""
+
+from __future__ import with_statement
+
+import time
+import multiprocessing
+
+from collections import deque
+from multiprocessing.connection import wait
+
+from .manifest import Record
+from .profiling import Profiler, Span
+
+__all__ = ['Failure', 'build_isolated']
+
+
+class Failure(object):
+    """A template that couldn't be built.
+
+    :param template_name: The template name.
+    :param reason: ``'timeout'``, ``'error'`` or ``'crash'``.
+    :param elapsed: The time in seconds since the build of the template
+                    started.
+    :param timings: The time spent in every phase, by phase name. The phases
+                    of context functions are named ``provider:<function>``.
+    :param running: The phases that were running when the template stopped,
+                    the innermost last.
+    :param error: The error message.
+    """
+
+    def __init__(self, template_name, reason, elapsed, timings=None,
+                 running=(), error=None):
+        self.template_name = template_name
+        self.reason = reason
+        self.elapsed = elapsed
+        self.timings = timings or {}
+        self.running = list(running)
+        self.error = error
+
+    def __str__(self):
+        message = '%s: %s after %.3fs' % (self.template_name, self.reason,
+                                          self.elapsed)
+        if self.running:
+            message += ' in %s' % ' > '.join(self.running)
+        if self.error:
+            message += ' (%s)' % self.error
+        if self.timings:
+            message += ' [%s]' % ', '.join(
+                '%s %.3fs' % (phase, self.timings[phase])
+                for phase in sorted(self.timings))
+        return message
+
+    def __repr__(self):
+        return '<Failure %s>' % self
+
+    def to_json(self):
+        return dict(self.__dict__)
+
+
+def _phase_name(phase, name):
+    return phase if name == phase else '%s:%s' % (phase, name)
+
+
+class ReportingSpan(Span):
+    """A span that tells the parent process when it's opened and closed."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        self.profiler.conn.send(('enter', _phase_name(self.phase, self.name)))
+        return Span.__enter__(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        rv = Span.__exit__(self, exc_type, exc_value, traceback)
+        self.profiler.conn.send(('exit', self.wall))
+        return rv
+
+
+class ReportingProfiler(Profiler):
+    """The profiler of the workers. It sends the phases to the parent, so
+    they are known even if the worker is killed."""
+
+    def __init__(self, conn):
+        Profiler.__init__(self)
+        self.conn = conn
+
+    def span(self, phase, template_name, name=None):
+        return ReportingSpan(self, phase, template_name, name)
+
+
+def _serve(folio, conn):
+    """The loop of a worker. Receives template names and sends back the
+    results, until it receives None."""
+    profiler = ReportingProfiler(conn)
+    profiler.install(folio.env)
+
+    while True:
+        template_name = conn.recv()
+        if template_name is None:
+            break
+
+        try:
+            rv = folio.build_template(template_name)
+        except Exception as e:
+            conn.send(('error', '%s: %s' % (type(e).__name__, e)))
+        else:
+            results = rv if isinstance(rv, list) else [rv] if rv else []
+            record = folio.manifest.get(template_name)
+            conn.send(('done',
+                       [(src, dst, None) for src, dst, _ in results],
+                       sorted(folio.dependencies.get(template_name, ())),
+                       record.to_json() if record is not None else None))
+        profiler.clear()
+
+
+class Worker(object):
+    """A worker process, and the state of the template it's building."""
+
+    def __init__(self, folio, context):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = context.Process(target=_serve,
+                                       args=(folio, child_conn))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+        self.template_name = None
+        self.started = None
+        self.stack = []
+        self.timings = {}
+
+    def assign(self, template_name):
+        self.template_name = template_name
+        self.started = time.time()
+        self.stack = []
+        self.timings = {}
+        self.conn.send(template_name)
+
+    def enter(self, phase):
+        self.stack.append((phase, time.time()))
+
+    def exit(self, wall):
+        phase, _ = self.stack.pop()
+        self.timings[phase] = self.timings.get(phase, 0.0) + wall
+
+    def failure(self, reason, error=None):
+        """Returns the failure of the current template, with the timings of
+        the phases still running."""
+        now = time.time()
+        timings = dict(self.timings)
+        for phase, started in self.stack:
+            timings[phase] = timings.get(phase, 0.0) + now - started
+        return Failure(self.template_name, reason, now - self.started,
+                       timings, [phase for phase, _ in self.stack], error)
+
+    def stop(self, timeout=1):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def build_isolated(folio, templates, workers=1, timeout=None):
+    """Build the templates in worker processes. Returns the set of builded
+    templates and the list of :class:`Failure`.
+
+    :param folio: The project.
+    :param templates: The template names.
+    :param workers: The number of worker processes.
+    :param timeout: The maximum time in seconds to build a template.
+    """
+    context = multiprocessing.get_context('fork')
+
+    pending = deque(templates)
+    idle = [Worker(folio, context)
+            for _ in range(min(workers, len(pending)))]
+    busy = {}
+    builded = set()
+    failures = []
+
+    def replace(worker, failure):
+        worker.kill()
+        del busy[worker.conn]
+        failures.append(failure)
+        folio.logger.error('Failed %s', failure)
+        if pending:
+            idle.append(Worker(folio, context))
+
+    try:
+        while pending or busy:
+            while pending and idle:
+                worker = idle.pop()
+                worker.assign(pending.popleft())
+                busy[worker.conn] = worker
+
+            wait_timeout = None
+            if timeout is not None:
+                now = time.time()
+                wait_timeout = max(0, min(worker.started + timeout - now
+                                          for worker in busy.values()))
+
+            for conn in wait(list(busy), wait_timeout):
+                worker = busy[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, IOError, OSError):
+                    replace(worker, worker.failure(
+                        'crash', 'exit code %s' % worker.process.exitcode))
+                    continue
+
+                kind = message[0]
+                if kind == 'enter':
+                    worker.enter(message[1])
+                elif kind == 'exit':
+                    worker.exit(message[1])
+                elif kind == 'done':
+                    _, results, dependencies, record = message
+                    builded.update(results)
+                    template_name = worker.template_name
+                    folio.dependencies[template_name] = set(dependencies)
+                    if record is not None:
+                        folio.manifest.set(template_name,
+                                           Record.from_json(record))
+                    del busy[conn]
+                    idle.append(worker)
+                elif kind == 'error':
+                    failure = worker.failure('error', message[1])
+                    failures.append(failure)
+                    folio.logger.error('Failed %s', failure)
+                    del busy[conn]
+                    idle.append(worker)
+
+            if timeout is not None:
+                now = time.time()
+                for worker in list(busy.values()):
+                    if now - worker.started > timeout:
+                        replace(worker, worker.failure('timeout'))
+    finally:
+        for worker in idle:
+            worker.stop()
+        for worker in busy.values():
+            worker.kill()
+
+    return builded, failures
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+    Internal link checker for Folio.
+
+    The link checker reads the HTML outputs of a build, finds the `href` and
+    `src` references and reports the ones to outputs that don't exist::
+
+        report = proj.check_links()
+        print(report)
+
+        # 2 broken links in 1 of 12 pages
+        # blog/post.html: /images/missing.png, ../about.htm
+
+    It can run after every build with the configuration::
+
+        proj.config['LINK_CHECK'] = True
+
+    The references are resolved against the index of outputs of the build
+    manifest, without looking at the file system. External links, like the
+    ones with a scheme or to another host, are not checked. The pages are
+    parsed in worker processes, and the references of every page are kept,
+    so after an incremental build only the pages that were built are parsed
+    again. The other pages are checked again with their known references, in
+    case their targets were removed.
+
+    :param LINK_CHECK: Check the links after every build.
+    :param LINK_CHECK_WORKERS: The number of worker processes. Defaults to
+                               the number of CPUs, zero to parse the pages in
+                               the same process.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import posixpath
+import multiprocessing
+
+try:
+    from urllib.parse import unquote, urlsplit
+except ImportError:
+    from urllib import unquote
+    from urlparse import urlsplit
+
+__all__ = ['BrokenLink', 'LinkChecker', 'LinkReport', 'extract_links']
+
+#: The extensions of the pages to check.
+PAGE_EXTENSIONS = ('.html', '.htm')
+
+#: The page served for a directory.
+INDEX_PAGE = 'index.html'
+
+#: Pages parsed in the same process if there are less than this.
+MIN_PARALLEL_PAGES = 50
+
+_link_re = re.compile(br'''<[a-zA-Z][^>]*?\s(?:href|src)\s*=\s*
+                           (?:"([^"]*)"|'([^']*)'|([^\s>"']+))''', re.X)
+
+_comment_re = re.compile(br'<!--.*?-->', re.S)
+
+
+def extract_links(data):
+    """Returns the `href` and `src` references of an HTML document, in order.
+
+    :param data: The document, as bytes.
+    """
+    data = _comment_re.sub(b'', data)
+    links = []
+    for match in _link_re.finditer(data):
+        value = match.group(1) or match.group(2) or match.group(3) or b''
+        links.append(value.decode('utf-8', 'replace').strip())
+    return links
+
+
+def resolve(url, page):
+    """Returns the output name a reference points to, or None if it's not an
+    internal reference to check.
+
+    :param url: The reference.
+    :param page: The name of the page with the reference.
+    """
+    if not url or url.startswith('#'):
+        return None
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc:
+        return None
+    path = unquote(parts.path)
+    if not path:
+        return None
+    if path.startswith('/'):
+        name = posixpath.normpath(path.lstrip('/'))
+    else:
+        name = posixpath.normpath(posixpath.join(posixpath.dirname(page),
+                                                 path))
+    if name.startswith('../') or name == '..':
+        return name
+    if name == '.':
+        name = ''
+    if path.endswith('/') or not name:
+        name = posixpath.join(name, INDEX_PAGE)
+    return name
+
+
+def _parse(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return extract_links(f.read())
+    except (IOError, OSError):
+        return None
+
+
+class BrokenLink(object):
+    """A reference to an output that doesn't exist.
+
+    :param template_name: The template that built the page.
+    :param page: The name of the page, relative to the build path.
+    :param url: The reference, as written in the page.
+    """
+
+    __slots__ = ('template_name', 'page', 'url')
+
+    def __init__(self, template_name, page, url):
+        self.template_name = template_name
+        self.page = page
+        self.url = url
+
+    def __repr__(self):
+        return '<BrokenLink %s -> %s>' % (self.page, self.url)
+
+    def to_json(self):
+        return {'template_name': self.template_name, 'page': self.page,
+                'url': self.url}
+
+
+class LinkReport(object):
+    """The result of a link check.
+
+    :param broken: The list of :class:`BrokenLink`.
+    :param pages: The number of pages checked.
+    :param parsed: The number of pages parsed in this check.
+    :param links: The number of internal references checked.
+    """
+
+    def __init__(self, broken, pages, parsed, links):
+        self.broken = broken
+        self.pages = pages
+        self.parsed = parsed
+        self.links = links
+
+    def __bool__(self):
+        return not self.broken
+    __nonzero__ = __bool__
+
+    def by_template(self):
+        """Returns the broken references by template name."""
+        rv = {}
+        for link in self.broken:
+            rv.setdefault(link.template_name, []).append(link.url)
+        return rv
+
+    def __str__(self):
+        templates = self.by_template()
+        lines = ['%d broken links in %d of %d pages' % (
+            len(self.broken), len(set(link.page for link in self.broken)),
+            self.pages)]
+        for template_name in sorted(templates):
+            lines.append('%s: %s' % (template_name,
+                                     ', '.join(templates[template_name])))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {'broken': [link.to_json() for link in self.broken],
+                'pages': self.pages, 'parsed': self.parsed,
+                'links': self.links}
+
+
+class LinkChecker(object):
+    """Checks the links of the outputs of a project, and keeps the
+    references of every page between checks.
+
+    :param folio: The project.
+    :param workers: The number of worker processes, None for the number of
+                    CPUs or zero to parse in the same process.
+    """
+
+    def __init__(self, folio, workers=None):
+        self.folio = folio
+        self.workers = workers
+
+        #: The references of every page, by output path.
+        self.links = {}
+
+    def outputs(self):
+        """Returns the template name of every output, by name."""
+        folio = self.folio
+        rv = {}
+        for template_name, record in folio.manifest.records.items():
+            for dst in record.outputs:
+                name = os.path.relpath(dst, folio.build_path)
+                rv[name.replace(os.sep, '/')] = (template_name, dst)
+        return rv
+
+    def parse(self, filenames):
+        """Parse the pages, in worker processes if there are many of them.
+        Returns their references, in order."""
+        workers = self.workers
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers < 2 or len(filenames) < MIN_PARALLEL_PAGES or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            return [_parse(filename) for filename in filenames]
+
+        context = multiprocessing.get_context('fork')
+        pool = context.Pool(workers)
+        try:
+            chunksize = max(1, len(filenames) // (workers * 4))
+            return pool.map(_parse, filenames, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    def check(self, builded=None):
+        """Check the links of every page. Returns a :class:`LinkReport`.
+
+        :param builded: The result of the build, to parse only the pages
+                        that were built. The references of the other pages
+                        are the ones of the previous check.
+        """
+        outputs = self.outputs()
+        pages = dict((name, value) for name, value in outputs.items()
+                     if name.lower().endswith(PAGE_EXTENSIONS))
+
+        # Forget the pages that are not outputs anymore.
+        current = set(dst for _, dst in pages.values())
+        for dst in list(self.links):
+            if dst not in current:
+                del self.links[dst]
+
+        if builded is None:
+            changed = current
+        else:
+            changed = set(dst for _, dst, _ in builded) & current
+        pending = sorted(dst for dst in current
+                         if dst in changed or dst not in self.links)
+        for dst, links in zip(pending, self.parse(pending)):
+            self.links[dst] = links or []
+
+        broken = []
+        count = 0
+        for page in sorted(pages):
+            template_name, dst = pages[page]
+            for url in self.links.get(dst, ()):
+                name = resolve(url, page)
+                if name is None:
+                    continue
+                count += 1
+                if name not in outputs and \
+                        posixpath.join(name, INDEX_PAGE) not in outputs:
+                    broken.append(BrokenLink(template_name, page, url))
+
+        return LinkReport(broken, len(pages), len(pending), count)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+    Build manifest for Folio.
+
+    The manifest records, for every built template, the signature of its
+    source and of the files it depends on, the builder that built it and its
+    outputs. Incremental builds use it to skip the templates that are up to
+    date.
+"""
+
+from __future__ import with_statement
+
+import os
+import json
+import threading
+
+__all__ = ['Manifest', 'Record', 'builder_key', 'file_signature',
+           'is_reserved', 'reserved_name']
+
+
+def file_signature(filename):
+    """Returns the signature of a file, its modification time and size, or
+    None if it doesn't exists. Files inside a source archive are supported.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        from .archive import member_signature
+        return member_signature(filename)
+    return [stat.st_mtime, stat.st_size]
+
+
+def builder_key(builder):
+    """Returns a string that identifies a builder. If the builder has a
+    `cache_key` attribute it's used, otherwise the name of its function or
+    class."""
+    key = getattr(builder, 'cache_key', None)
+    if key is not None:
+        return key
+    if not hasattr(builder, '__qualname__'):
+        builder = type(builder)
+    return '%s.%s' % (builder.__module__, builder.__qualname__)
+
+
+def reserved_name(owner, name):
+    """Returns the record name of an output that isn't built from a
+    template, like the search index or a bundle. The names start with the
+    owner in angle brackets, so they don't collide with template names.
+
+    :param owner: The module that builds the output.
+    :param name: The output name.
+    """
+    return '<%s>/%s' % (owner, name)
+
+
+def is_reserved(name):
+    """True if a record name was returned by :func:`reserved_name`."""
+    return name.startswith('<') and '>/' in name
+
+
+class Record(object):
+    """What is known about the last build of a template.
+
+    :param src: The source file.
+    :param signature: The signature of the source file.
+    :param builder: The builder key.
+    :param outputs: The destination files.
+    :param dependencies: The signature of every dependency, by filename.
+    :param duration: The build time in seconds.
+    """
+
+    __slots__ = ('src', 'signature', 'builder', 'outputs', 'dependencies',
+                 'duration')
+
+    def __init__(self, src, signature, builder, outputs, dependencies=None,
+                 duration=0.0):
+        self.src = src
+        self.signature = signature
+        self.builder = builder
+        self.outputs = outputs
+        self.dependencies = dependencies or {}
+        self.duration = duration
+
+    def to_json(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**data)
+
+
+class Manifest(object):
+    """The records of the built templates, by template name.
+
+    :param path: Optional file name where the manifest is saved.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = {}
+
+        #: A counter of the records set in this process, see
+        #: :meth:`changed_since`.
+        self.version = 0
+        self._versions = {}
+
+        self._signatures = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, template_name):
+        return template_name in self.records
+
+    def get(self, template_name):
+        return self.records.get(template_name)
+
+    def begin(self):
+        """Start a build. The signatures of the files are cached until
+        :meth:`end` is called, so the files shared by many templates, like
+        layouts, are checked only once."""
+        self._signatures = {}
+
+    def end(self):
+        """Finish a build."""
+        self._signatures = None
+
+    def signature(self, filename):
+        signatures = self._signatures
+        if signatures is None:
+            return file_signature(filename)
+        try:
+            return signatures[filename]
+        except KeyError:
+            signature = signatures[filename] = file_signature(filename)
+            return signature
+
+    def is_fresh(self, template_name, src, builder, exists=os.path.exists):
+        """True if the template doesn't need to be built again: it was built
+        with the same builder, its source and dependencies didn't change and
+        its outputs exist.
+
+        :param template_name: The template name.
+        :param src: The source file.
+        :param builder: The builder key.
+        :param exists: The function that tells if an output exists.
+        """
+        record = self.records.get(template_name)
+        if record is None or record.src != src or record.builder != builder:
+            return False
+        if self.signature(src) != record.signature:
+            return False
+        for filename, signature in record.dependencies.items():
+            if self.signature(filename) != signature:
+                return False
+        for dst in record.outputs:
+            if not exists(dst):
+                return False
+        return True
+
+    def record(self, template_name, src, builder, outputs, dependencies=(),
+               duration=0.0):
+        """Record the build of a template."""
+        deps = {}
+        for filename in dependencies:
+            if filename != src:
+                deps[filename] = self.signature(filename)
+        record = Record(src, self.signature(src), builder, list(outputs),
+                        deps, duration)
+        self.set(template_name, record)
+        return record
+
+    def set(self, template_name, record):
+        """Set the record of a template, built in this or another process.
+        """
+        with self._lock:
+            self.version += 1
+            self.records[template_name] = record
+            self._versions[template_name] = self.version
+
+    def changed_since(self, version):
+        """Returns the names of the templates recorded in this process after
+        the given :attr:`version`."""
+        with self._lock:
+            return set(name for name, v in self._versions.items()
+                       if v > version and name in self.records)
+
+    def forget(self, template_names=None):
+        """Forget the records of the given templates, or all of them. They
+        will be built again in the next incremental build."""
+        with self._lock:
+            if template_names is None:
+                self.records.clear()
+            else:
+                for template_name in template_names:
+                    self.records.pop(template_name, None)
+
+    def to_json(self):
+        return {'version': 1,
+                'records': dict((name, record.to_json())
+                                for name, record in self.records.items())}
+
+    def update_json(self, data):
+        for name, record in data.get('records', {}).items():
+            self.records[name] = Record.from_json(record)
+
+    def load(self, path=None):
+        """Load the records from a file, if exists."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except ValueError:
+            # A corrupted manifest is the same as no manifest.
+            return
+        with self._lock:
+            self.update_json(data)
+
+    def save(self, path=None):
+        """Save the records to a file."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = self.to_json()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.rename(tmp, path)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+    Output minification for Folio.
+
+    The minifier is an output transform (see :mod:`folio.pipeline`) that
+    removes the comments and the redundant whitespace of HTML and CSS files
+    in one pass over the output. It's enabled by template name pattern with
+    the configuration::
+
+        proj.config['MINIFY_PATTERNS'] = ['*.html', '*.css']
+
+    The kind of every file is known by the extension of the destination, the
+    ones that are not HTML nor CSS are written untouched. The results are
+    cached by the hash of the content, so a file with the same content is not
+    minified again, and the cache can be kept in a directory between builds.
+
+    The HTML minification is conservative: comments are removed, except the
+    conditional ones, and the whitespace runs are collapsed to a single space
+    or new line, never removed. The content of `pre`, `textarea` and `script`
+    elements is kept as is, the one of `style` elements is minified as CSS.
+
+    :param MINIFY_PATTERNS: A list of template name patterns to minify.
+    :param MINIFY_CACHE_PATH: The directory to keep the minified files
+                              between builds, or None.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+__all__ = ['Minifier', 'minify_html', 'minify_css']
+
+#: The version of the minifiers. It's part of the cache keys, so the cached
+#: results of other versions are not used.
+VERSION = 1
+
+_space = '[ \t\n\r\f]'
+
+_html_re = re.compile(r'''
+    (?P<keep><!--\[if.*?-->)
+  | (?P<comment><!--.*?-->)
+  | (?P<raw><(?P<rawtag>pre|textarea|script)\b.*?</(?P=rawtag)%(s)s*>)
+  | (?P<style><style\b[^>]*>)(?P<css>.*?)(?P<endstyle></style%(s)s*>)
+  | (?P<tag><(?:"[^"]*"|'[^']*'|[^'">])*>)
+  | (?P<text>[^<]+)
+  | (?P<other><)
+''' % {'s': _space}, re.S | re.I | re.X)
+
+_tag_space_re = re.compile(r'("[^"]*"|\'[^\']*\')|%s+(/?>)?' % _space)
+_text_space_re = re.compile('%s+' % _space)
+
+_css_re = re.compile(r'''
+    "(?:\\.|[^"\\])*"
+  | '(?:\\.|[^'\\])*'
+  | /\*.*?\*/
+  | %(s)s+
+  | [{};,>]
+  | [^"'/{};,>%(ns)s]+
+  | /
+''' % {'s': _space, 'ns': _space[1:-1]}, re.S | re.X)
+
+#: The characters that don't need spaces around them in CSS.
+_css_punctuation = frozenset('{};,>')
+
+
+def _collapse_space(match):
+    return '\n' if '\n' in match.group() else ' '
+
+
+def _collapse_tag_space(match):
+    if match.group(1):
+        return match.group(1)
+    return match.group(2) or ' '
+
+
+def minify_html(text):
+    """Returns the HTML text without comments and with the whitespace runs
+    collapsed. The CSS of the `style` elements is minified too."""
+    out = []
+    last = None
+    for match in _html_re.finditer(text):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        elif kind == 'tag':
+            out.append(_tag_space_re.sub(_collapse_tag_space,
+                                         match.group('tag')))
+        elif kind == 'text':
+            value = _text_space_re.sub(_collapse_space, match.group('text'))
+            # The text around a removed comment is joined.
+            if last == 'text' and value[0] in ' \n' and \
+                    out[-1][-1] in ' \n':
+                value = value[1:]
+                if not value:
+                    continue
+            out.append(value)
+        elif kind == 'endstyle':
+            out.append(match.group('style'))
+            out.append(minify_css(match.group('css')))
+            out.append(match.group('endstyle'))
+        else:
+            out.append(match.group())
+        last = kind
+    return ''.join(out)
+
+
+def minify_css(text):
+    """Returns the CSS text without comments, except the ones that start
+    with ``/*!``, nor unnecessary whitespace and semicolons."""
+    out = []
+    space = False
+    for match in _css_re.finditer(text):
+        token = match.group()
+        if token[0] in ' \t\n\r\f' or \
+                (token.startswith('/*') and not token.startswith('/*!')):
+            space = True
+            continue
+        if token in _css_punctuation:
+            if token == '}' and out and out[-1] == ';':
+                out.pop()
+        elif space and out and out[-1] not in _css_punctuation:
+            out.append(' ')
+        space = False
+        out.append(token)
+    return ''.join(out)
+
+
+#: The minifier of every kind of file, by destination extension.
+MINIFIERS = {
+    '.html': minify_html,
+    '.htm': minify_html,
+    '.css': minify_css,
+}
+
+
+class Minifier(object):
+    """An output transform that minifies the HTML and CSS files, with a cache
+    of results by content hash.
+
+    :param cache_path: A directory to keep the results between builds, or
+                       None to keep them only in memory.
+    :param cache_size: Maximum number of results kept in memory.
+    """
+
+    #: Identifies the minifier in the build manifest.
+    cache_key = 'folio.minify:%d' % VERSION
+
+    def __init__(self, cache_path=None, cache_size=1024):
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+        #: Counters of the cache and the bytes removed by the minified files.
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+        self._lock = threading.Lock()
+
+    def __call__(self, env, template_name, dst, data):
+        ext = os.path.splitext(dst)[1].lower()
+        minify = MINIFIERS.get(ext)
+        if minify is None:
+            return data
+
+        key = '%s%s' % (hashlib.sha1(data).hexdigest(), ext)
+        rv = self.get(key)
+        if rv is None:
+            # Every byte is a character in latin-1 and only ASCII characters
+            # are modified, so it works for any ASCII compatible encoding.
+            rv = minify(data.decode('latin-1')).encode('latin-1')
+            self.set(key, rv)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+        with self._lock:
+            self.saved += len(data) - len(rv)
+        return rv
+
+    def _filename(self, key):
+        return os.path.join(self.cache_path, '%d-%s' % (VERSION, key))
+
+    def get(self, key):
+        """Returns a cached result, or None."""
+        with self._lock:
+            rv = self.cache.get(key)
+            if rv is not None:
+                self.cache.pop(key)
+                self.cache[key] = rv
+                return rv
+        if self.cache_path:
+            try:
+                with open(self._filename(key), 'rb') as f:
+                    rv = f.read()
+            except (IOError, OSError):
+                return None
+            self._remember(key, rv)
+        return rv
+
+    def set(self, key, data):
+        """Cache a result."""
+        self._remember(key, data)
+        if self.cache_path:
+            try:
+                if not os.path.isdir(self.cache_path):
+                    os.makedirs(self.cache_path)
+                filename = self._filename(key)
+                tmp = '%s.%d.tmp' % (filename, os.getpid())
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.rename(tmp, filename)
+            except (IOError, OSError):
+                pass
+
+    def _remember(self, key, data):
+        with self._lock:
+            self.cache[key] = data
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def clear(self):
+        """Forget the results kept in memory."""
+        with self._lock:
+            self.cache.clear()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+    Output backends for Folio.
+
+    The builders write their outputs through the output backend of the
+    project, so the site doesn't have to be a directory. There are three
+    backends:
+
+    * :class:`DirectoryOutput`, the default, writes every file in the build
+      path.
+    * :class:`ArchiveOutput` writes the whole site into a tar or zip archive,
+      without intermediate files::
+
+          proj.output = ArchiveOutput('site.tar.gz')
+          proj.build()
+
+    * :class:`MemoryOutput` keeps the files in a dictionary, for tests and
+      to render pages on request::
+
+          proj.output = output = MemoryOutput()
+          proj.build_template('index.html')
+          output.files['index.html']
+
+    The destinations are still the full paths inside the build path, the
+    backends use the names relative to it. Isolated builds, sharded builds
+    and variants write to directories, they only work with the directory
+    backend.
+"""
+
+from __future__ import with_statement
+
+import io
+import os
+import time
+import shutil
+import threading
+
+__all__ = ['Output', 'DirectoryOutput', 'ArchiveOutput', 'MemoryOutput']
+
+
+class Output(object):
+    """The base of the output backends. Subclasses implement :meth:`open`.
+    """
+
+    #: True if the outputs written by forked processes are seen by the
+    #: parent, so it works with isolated builds.
+    shared = False
+
+    def __init__(self):
+        #: The build path of the current build.
+        self.root = None
+
+    def begin(self, root):
+        """Called at the beginning of every build.
+
+        :param root: The build path.
+        """
+        self.root = root
+
+    def end(self):
+        """Called at the end of every build."""
+
+    def name(self, dst):
+        """Returns the name of a destination, relative to the build path and
+        with forward slashes."""
+        return os.path.relpath(dst, self.root).replace(os.sep, '/')
+
+    def prepare(self, dst):
+        """Called before writing a destination."""
+
+    def open(self, dst):
+        """Returns a binary file object to write a destination. The output
+        is complete when the file is closed."""
+        raise NotImplementedError()
+
+    def write(self, dst, data):
+        """Write the bytes of a destination."""
+        with self.open(dst) as f:
+            f.write(data)
+
+    def copy(self, src, dst):
+        """Copy a file to a destination."""
+        with open(src, 'rb') as fsrc:
+            with self.open(dst) as fdst:
+                shutil.copyfileobj(fsrc, fdst)
+
+    def exists(self, dst):
+        """True if the destination was written."""
+        raise NotImplementedError()
+
+
+class DirectoryOutput(Output):
+    """Writes the outputs as files of the build path."""
+
+    shared = True
+
+    def begin(self, root):
+        Output.begin(self, root)
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def prepare(self, dst):
+        dstdir = os.path.dirname(dst)
+        if not os.path.exists(dstdir):
+            os.makedirs(dstdir)
+
+    def open(self, dst):
+        return open(dst, 'wb')
+
+    def copy(self, src, dst):
+        shutil.copy(src, dst)
+
+    def exists(self, dst):
+        return os.path.exists(dst)
+
+
+class _MemberFile(io.BytesIO):
+    """A file kept in memory that calls a function with its content when
+    it's closed."""
+
+    def __init__(self, callback):
+        io.BytesIO.__init__(self)
+        self._callback = callback
+
+    def close(self):
+        if not self.closed:
+            self._callback(self.getvalue())
+        io.BytesIO.close(self)
+
+
+class MemoryOutput(Output):
+    """Keeps the outputs in memory.
+
+    .. attribute:: files
+
+       The content of every output, by name.
+    """
+
+    def __init__(self):
+        Output.__init__(self)
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def open(self, dst):
+        name = self.name(dst)
+
+        def store(data):
+            with self._lock:
+                self.files[name] = data
+        return _MemberFile(store)
+
+    def exists(self, dst):
+        return self.name(dst) in self.files
+
+    def get(self, name):
+        """Returns the content of an output, or None."""
+        return self.files.get(name)
+
+
+class ArchiveOutput(Output):
+    """Writes the outputs into an archive, created at the beginning of every
+    build and completed at the end. Every member is added as soon as it's
+    complete, and static files are streamed from their sources.
+
+    :param path: The archive file name.
+    :param format: ``'tar'``, ``'tar.gz'``, ``'tar.bz2'``, ``'tar.xz'`` or
+                   ``'zip'``. Guessed from the file name by default.
+    """
+
+    #: The formats, by extension.
+    formats = [('.tar.gz', 'tar.gz'), ('.tgz', 'tar.gz'),
+               ('.tar.bz2', 'tar.bz2'), ('.tar.xz', 'tar.xz'),
+               ('.tar', 'tar'), ('.zip', 'zip')]
+
+    def __init__(self, path, format=None):
+        Output.__init__(self)
+        if format is None:
+            for ext, name in self.formats:
+                if path.endswith(ext):
+                    format = name
+                    break
+            else:
+                raise ValueError('Unknown archive format of %s.' % path)
+        if format not in dict((name, ext) for ext, name in self.formats):
+            raise ValueError('Unknown archive format %s.' % format)
+
+        self.path = path
+        self.format = format
+        self.archive = None
+
+        #: The names written in the current build.
+        self.names = set()
+
+        self._lock = threading.Lock()
+
+    def begin(self, root):
+        Output.begin(self, root)
+        self.names = set()
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        if self.format == 'zip':
+            import zipfile
+            self.archive = zipfile.ZipFile(self.path, 'w',
+                                           zipfile.ZIP_DEFLATED)
+        else:
+            import tarfile
+            mode = 'w|' + self.format[4:]
+            self.archive = tarfile.open(self.path, mode)
+
+    def end(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def _add(self, name, data):
+        with self._lock:
+            if self.format == 'zip':
+                self.archive.writestr(name, data)
+            else:
+                info = self.archive.tarinfo(name)
+                info.size = len(data)
+                info.mtime = time.time()
+                self.archive.addfile(info, io.BytesIO(data))
+            self.names.add(name)
+
+    def open(self, dst):
+        name = self.name(dst)
+        return _MemberFile(lambda data: self._add(name, data))
+
+    def copy(self, src, dst):
+        name = self.name(dst)
+        with self._lock:
+            if self.format == 'zip':
+                self.archive.write(src, name)
+            else:
+                info = self.archive.gettarinfo(src, name)
+                with open(src, 'rb') as f:
+                    self.archive.addfile(info, f)
+            self.names.add(name)
+
+    def exists(self, dst):
+        return self.name(dst) in self.names
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+    Output transforms for Folio.
+
+    A transform post-processes the output of a builder in memory, before it's
+    written, like a minifier or a links rewriter. It's called with the jinja
+    environment, the template name, the destination path and the output
+    bytes, and returns the new bytes::
+
+        def strip_whitespace(env, template_name, dst, data):
+            return b'\\n'.join(line.strip() for line in data.splitlines())
+
+        proj.add_transform('*.html', strip_whitespace)
+
+    The transforms of a template are applied in the order they were added,
+    and the output is written once. The identity of the transforms (their
+    `cache_key` attribute, or their name) is part of the builder key in the
+    manifest, so incremental builds rebuild the templates whose transforms
+    changed.
+"""
+
+from __future__ import with_statement
+
+import os
+import fnmatch
+
+from .manifest import builder_key
+from .profiling import span
+
+__all__ = ['Pipeline', 'render_output', 'copy_output', 'write_output']
+
+
+class Pipeline(object):
+    """The transforms of a project, by template name pattern."""
+
+    def __init__(self):
+        #: A list of ``(pattern, transform)`` pairs.
+        self.transforms = []
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def add(self, pattern, transform):
+        if not callable(transform):
+            raise TypeError('Invalid transform. Must be a callable.')
+        self.transforms.append((pattern, transform))
+
+    def match(self, template_name):
+        """Returns the transforms for a template, in order."""
+        return [transform for pattern, transform in self.transforms
+                if fnmatch.fnmatch(template_name, pattern)]
+
+    def key(self, template_name):
+        """Returns a string that identifies the transforms of a template."""
+        return ','.join(builder_key(transform)
+                        for transform in self.match(template_name))
+
+    def apply(self, env, template_name, dst, data, transforms=None):
+        """Returns the data after all the transforms of the template."""
+        if transforms is None:
+            transforms = self.match(template_name)
+        for transform in transforms:
+            name = getattr(transform, '__name__', type(transform).__name__)
+            with span(env, 'transform', template_name, name):
+                data = transform(env, template_name, dst, data)
+        return data
+
+
+def _output(env):
+    output = getattr(env, 'output', None)
+    if output is None:
+        from .output import DirectoryOutput
+        output = DirectoryOutput()
+    return output
+
+
+def _transforms(env, template_name):
+    pipeline = getattr(env, 'pipeline', None)
+    if pipeline is None or not pipeline.transforms:
+        return None
+    return pipeline.match(template_name)
+
+
+def write_output(env, template_name, dst, data, transforms=None):
+    """Apply the transforms to the output bytes and write them with the
+    output backend."""
+    if transforms is None:
+        transforms = _transforms(env, template_name)
+    if transforms:
+        data = env.pipeline.apply(env, template_name, dst, data, transforms)
+    _output(env).write(dst, data)
+
+
+def render_output(env, template_name, template, context, dst, encoding):
+    """Render a template to the destination. Without transforms it's streamed
+    to the output, otherwise it's rendered in memory and transformed.
+
+    :param env: The jinja environment.
+    :param template_name: The template being built.
+    :param template: The jinja template to render.
+    :param context: The context.
+    :param dst: The destination path.
+    :param encoding: The output encoding.
+    """
+    transforms = _transforms(env, template_name)
+    if not transforms:
+        with _output(env).open(dst) as f:
+            template.stream(**context).dump(f, encoding=encoding)
+        return
+    data = template.render(**context).encode(encoding)
+    write_output(env, template_name, dst, data, transforms)
+
+
+def copy_output(env, template_name, src, dst):
+    """Copy a file to the destination, through the transforms if any. The
+    source could be a member of a source archive."""
+    transforms = _transforms(env, template_name)
+    archive, name = None, None
+    if not os.path.exists(src):
+        from .archive import find_member
+        archive, name = find_member(src)
+
+    if not transforms:
+        if archive is None:
+            _output(env).copy(src, dst)
+        else:
+            with _output(env).open(dst) as f:
+                archive.copy(name, f)
+        return
+
+    if archive is None:
+        with open(src, 'rb') as f:
+            data = f.read()
+    else:
+        data = bytes(archive.read(name))
+    write_output(env, template_name, dst, data, transforms)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+    Build profiling for Folio.
+
+    The profiler records nested spans (phases) for every template that is
+    built. Each span has the wall time, the CPU time and, optionally, the
+    peak of memory allocated while it was open (using :mod:`tracemalloc`).
+
+    The results can be printed as a summary table of the slowest templates and
+    context functions, or exported as a Chrome trace-event JSON file that can
+    be opened in ``chrome://tracing`` or Perfetto.
+"""
+
+from __future__ import with_statement
+
+import os
+import json
+import time
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+__all__ = ['Profiler']
+
+
+class _NullSpan(object):
+    """A span that does nothing. Used when profiling is disabled, so the cost
+    of instrumenting a build is a single attribute lookup."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+#: Shared instance of the disabled span.
+null_span = _NullSpan()
+
+
+def span(env, phase, template_name, name=None):
+    """Returns a span for the profiler attached to the given Jinja
+    environment, or a null span if profiling is not enabled. This is the
+    helper builders should use to report their own phases.
+
+    :param env: The Jinja environment of the project.
+    :param phase: The phase name, e.g. ``'transform'``.
+    :param template_name: The template being built.
+    :param name: An optional name for the span. Defaults to the phase.
+    """
+    profiler = getattr(env, 'profiler', None)
+    if profiler is None:
+        return null_span
+    return profiler.span(phase, template_name, name)
+
+
+class Span(object):
+    """A measured phase. Instances are used as context managers and are
+    stored in the profiler when they are closed."""
+
+    __slots__ = ('profiler', 'phase', 'template_name', 'name', 'tid',
+                 'start', 'wall', 'cpu', 'children', 'memory', 'peak',
+                 '_cpu')
+
+    def __init__(self, profiler, phase, template_name, name):
+        self.profiler = profiler
+        self.phase = phase
+        self.template_name = template_name
+        self.name = name or phase
+        self.tid = threading.current_thread().ident
+        self.wall = self.cpu = self.children = 0.0
+        self.memory = self.peak = 0
+
+    def to_json(self):
+        return [self.phase, self.template_name, self.name, self.tid,
+                self.start, self.wall, self.cpu, self.children, self.memory,
+                self.peak]
+
+    @classmethod
+    def from_json(cls, profiler, data):
+        """Returns a closed span recorded in another process."""
+        phase, template_name, name = data[:3]
+        span = cls(profiler, phase, template_name, name)
+        (span.tid, span.start, span.wall, span.cpu, span.children,
+         span.memory, span.peak) = data[3:]
+        return span
+
+    @property
+    def self_wall(self):
+        """Wall time spent in this span but not in its children."""
+        return self.wall - self.children
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = self.peak = current
+        stack.append(self)
+        self._cpu = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.thread_time() - self._cpu
+
+        stack = self.profiler._stack()
+        stack.pop()
+
+        if self.profiler.trace_memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peak = peak - self.memory
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+        if stack:
+            stack[-1].children += self.wall
+
+        self.profiler.spans.append(self)
+        return False
+
+
+class Profiler(object):
+    """Collects the timings of a build.
+
+    Profiling is enabled in a project with :meth:`folio.Folio.profile` or
+    with the `PROFILE` configuration key::
+
+        proj = Folio(__name__)
+        profiler = proj.profile(trace_memory=True)
+        proj.build()
+
+        print(profiler.report())
+        profiler.dump_trace('build-trace.json')
+
+    :param trace_memory: Record the peak of allocated memory in each span
+                         using :mod:`tracemalloc`.
+    """
+
+    def __init__(self, trace_memory=False):
+        if trace_memory and tracemalloc is None:
+            raise RuntimeError('The tracemalloc module is not available.')
+
+        #: Closed spans in the order they finished.
+        self.spans = []
+
+        #: True if the memory usage is being recorded.
+        self.trace_memory = trace_memory
+
+        #: Time reference for the trace events.
+        self.epoch = time.perf_counter()
+
+        self._local = threading.local()
+
+        # The environment it's installed in, and True if it started tracing
+        # the memory allocations.
+        self._env = None
+        self._tracing = False
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def span(self, phase, template_name, name=None):
+        """Returns a new span to be used as context manager.
+
+        :param phase: The phase name. Folio uses ``template`` for the whole
+                      build of a template, ``lookup`` for the builder lookup,
+                      ``context`` and ``provider`` for the context resolution,
+                      ``compile`` for the template compilation and ``build``
+                      for the builder call.
+        :param template_name: The template being built.
+        :param name: An optional name for the span. Defaults to the phase.
+        """
+        return Span(self, phase, template_name, name)
+
+    def install(self, env):
+        """Attach the profiler to a Jinja environment. The template
+        compilation will be recorded as the ``compile`` phase.
+
+        :param env: The Jinja environment.
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+        compile = env.compile
+        profiler = self
+
+        def profiled_compile(source, name=None, *args, **kwargs):
+            with profiler.span('compile', name):
+                return compile(source, name, *args, **kwargs)
+
+        env.compile = profiled_compile
+        env.profiler = self
+        self._env = env
+
+    def close(self):
+        """Detach the profiler from its Jinja environment, and stop tracing
+        the memory allocations if it started it. The recorded spans are
+        kept."""
+        env = self._env
+        if env is not None:
+            # The compile method was set on the instance by install.
+            env.__dict__.pop('compile', None)
+            if env.profiler is self:
+                env.profiler = None
+            self._env = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def clear(self):
+        """Forget all the recorded spans."""
+        self.spans = []
+        self.epoch = time.perf_counter()
+
+    def templates(self):
+        """Returns a list of ``(template_name, span, phases)`` tuples, where
+        phases is a dictionary with the self wall time of every phase spent
+        while building the template. The list is sorted by the total wall time,
+        slowest first."""
+        phases = {}
+        for span in self.spans:
+            if span.phase == 'template':
+                continue
+            times = phases.setdefault(span.template_name, {})
+            times[span.phase] = times.get(span.phase, 0.0) + span.self_wall
+
+        templates = [(span.template_name, span,
+                      phases.get(span.template_name, {}))
+                     for span in self.spans if span.phase == 'template']
+        templates.sort(key=lambda item: item[1].wall, reverse=True)
+        return templates
+
+    def contexts(self):
+        """Returns a list of ``(name, calls, wall, cpu)`` tuples for every
+        context function called, sorted by the total wall time."""
+        found = {}
+        for span in self.spans:
+            if span.phase != 'provider':
+                continue
+            calls, wall, cpu = found.get(span.name, (0, 0.0, 0.0))
+            found[span.name] = (calls + 1, wall + span.wall, cpu + span.cpu)
+
+        contexts = [(name,) + values for name, values in found.items()]
+        contexts.sort(key=lambda item: item[2], reverse=True)
+        return contexts
+
+    def report(self, limit=10):
+        """Returns a summary table of the slowest templates and contexts.
+
+        :param limit: The maximum number of rows for each table.
+        """
+        columns = ('lookup', 'context', 'compile', 'transform', 'build')
+        lines = ['%-40s %9s %9s %s%s' % (
+            'Template', 'Wall ms', 'CPU ms',
+            ''.join('%10s' % c for c in columns),
+            ' %10s' % 'Peak KiB' if self.trace_memory else '')]
+
+        for template_name, span, phases in self.templates()[:limit]:
+            lines.append('%-40s %9.2f %9.2f %s%s' % (
+                template_name[-40:], span.wall * 1000, span.cpu * 1000,
+                ''.join('%10.2f' % (phases.get(c, 0.0) * 1000)
+                        for c in columns),
+                ' %10.1f' % (span.peak / 1024.0) if self.trace_memory
+                else ''))
+
+        contexts = self.contexts()[:limit]
+        if contexts:
+            lines.append('')
+            lines.append('%-40s %9s %9s %9s' % ('Context', 'Calls',
+                                                'Wall ms', 'CPU ms'))
+            for name, calls, wall, cpu in contexts:
+                lines.append('%-40s %9d %9.2f %9.2f' % (
+                    name[-40:], calls, wall * 1000, cpu * 1000))
+
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        """Returns the spans as a list of Chrome trace events."""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = {'template': span.template_name, 'cpu_ms': span.cpu * 1000}
+            if self.trace_memory:
+                args['peak_bytes'] = span.peak
+            events.append({
+                'name': span.name,
+                'cat': span.phase,
+                'ph': 'X',
+                'ts': (span.start - self.epoch) * 1e6,
+                'dur': span.wall * 1e6,
+                'pid': pid,
+                'tid': span.tid,
+                'args': args,
+            })
+        events.sort(key=lambda event: event['ts'])
+        return events
+
+    def dump_trace(self, filename):
+        """Write the Chrome trace-event JSON file.
+
+        :param filename: The destination file name.
+        """
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(),
+                       'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+    Extension registry for Folio.
+
+    Extensions given by name are found without trying to import every
+    candidate module. The registry is an index of the available extensions,
+    by name, built from:
+
+    * the modules of the :mod:`folio.ext` package,
+    * the top level modules named ``folio_<name>``,
+    * the entry points of the ``folio.extensions`` group, so a distribution
+      can register an extension with any module name::
+
+          entry_points={'folio.extensions': ['gallery = mypkg.gallery']}
+
+    The first ones have priority. The modules of :mod:`folio.ext` are found
+    directly in the package, so the built-in extensions don't need the
+    index. The index is built, only for the other names, once per process.
+    It can also be saved to a file, set with the ``FOLIO_EXTENSIONS_CACHE``
+    environment variable, and used again while the entries of ``sys.path``
+    aren't modified, so a name lookup doesn't touch the import path at all.
+    Nothing is written unless the variable is set.
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import json
+import pkgutil
+import threading
+
+from importlib.machinery import PathFinder
+
+__all__ = ['ExtensionRegistry', 'registry']
+
+#: The entry points group of the extensions.
+ENTRY_POINT_GROUP = 'folio.extensions'
+
+
+def default_cache_path():
+    """Returns the cache file of the index, or None if it's not enabled."""
+    return os.environ.get('FOLIO_EXTENSIONS_CACHE') or None
+
+
+def path_signature(paths=None):
+    """Returns the signature of the import path, the modification time of
+    every entry. It changes when a module is added or removed."""
+    signature = []
+    for path in sys.path if paths is None else paths:
+        path = os.path.abspath(path or os.curdir)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        signature.append([path, mtime])
+    return signature
+
+
+def iter_entry_points(group):
+    """Yields the name and value of every entry point of the group."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=group)
+    else:
+        eps = eps.get(group, ())
+    for ep in eps:
+        yield ep.name, ep.value
+
+
+def find_builtin(name):
+    """Returns the import name of a module of the :mod:`folio.ext` package,
+    or None if there isn't one with that name."""
+    import folio.ext
+
+    if not name or '.' in name:
+        return None
+    importname = 'folio.ext.%s' % name
+    if importname in sys.modules or \
+            PathFinder.find_spec(name, folio.ext.__path__) is not None:
+        return importname
+    return None
+
+
+class ExtensionRegistry(object):
+    """Index of the available extensions.
+
+    :param cache_path: Where the index is saved, or None to keep it only in
+                       memory.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+
+        #: The import name of every extension, by extension name. Entry
+        #: points could have an object after a colon, `module:object`.
+        self.extensions = None
+
+        #: True if the index was built in this process, so it's up to date.
+        self.scanned = False
+
+        self._lock = threading.Lock()
+
+    def scan(self):
+        """Build the index looking at the import path."""
+        import folio.ext
+
+        extensions = {}
+        for name, value in iter_entry_points(ENTRY_POINT_GROUP):
+            extensions[name] = value
+        for _, modname, _ in pkgutil.iter_modules():
+            if modname.startswith('folio_'):
+                extensions[modname[6:]] = modname
+        for _, modname, _ in pkgutil.iter_modules(folio.ext.__path__):
+            extensions[modname] = 'folio.ext.%s' % modname
+        return extensions
+
+    def load(self):
+        """Returns the index saved in the cache file, if it's still valid."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('signature') != path_signature():
+            return None
+        return data.get('extensions')
+
+    def save(self):
+        """Save the index to the cache file. Errors are ignored, the cache is
+        just an optimization."""
+        if not self.cache_path:
+            return
+        data = {'signature': path_signature(), 'extensions': self.extensions}
+        try:
+            dirname = os.path.dirname(self.cache_path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            tmp = '%s.%d.tmp' % (self.cache_path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp, self.cache_path)
+        except (IOError, OSError):
+            pass
+
+    def refresh(self):
+        """Build the index again and save it."""
+        with self._lock:
+            self.extensions = self.scan()
+            self.scanned = True
+            self.save()
+
+    def find(self, name):
+        """Returns the import name of an extension, or None if it's not
+        available.
+
+        :param name: The extension name.
+        """
+        importname = find_builtin(name)
+        if importname is not None:
+            return importname
+
+        if self.extensions is None:
+            with self._lock:
+                if self.extensions is None:
+                    self.extensions = self.load()
+            if self.extensions is None:
+                self.refresh()
+
+        importname = self.extensions.get(name)
+        if importname is None and not self.scanned:
+            # Maybe the cache is old, look again before giving up.
+            self.refresh()
+            importname = self.extensions.get(name)
+        return importname
+
+    def resolve(self, name):
+        """Import an extension by name. Returns the module, or the object of
+        the entry point. Raises `LookupError` if it's not available."""
+        importname = self.find(name)
+        if importname is None:
+            raise LookupError("Extension '%s' not found." % name)
+        modname, _, attr = importname.partition(':')
+        try:
+            module = __import__(modname, None, None, ['__name__'])
+        except ImportError:
+            if self.scanned:
+                raise
+            # The entry of the cache is stale, the module was removed.
+            self.refresh()
+            if self.extensions.get(name) is None:
+                raise LookupError("Extension '%s' not found." % name)
+            return self.resolve(name)
+        if attr:
+            for part in attr.split('.'):
+                module = getattr(module, part)
+        return module
+
+
+#: The registry used by the projects.
+registry = ExtensionRegistry(default_cache_path())
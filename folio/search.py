@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+    Client side search index for Folio.
+
+    The search index is a JSON file with the words of the pages of the site,
+    to search them with a script in the browser. It's enabled by template
+    name pattern with the configuration::
+
+        proj.config['SEARCH_PATTERNS'] = ['*.html']
+
+    The pages are tokenized while they are built, from the rendered output
+    that is still in memory (the indexer is an output transform, see
+    :mod:`folio.pipeline`). The words of every page are kept between builds,
+    so after an incremental build only the pages that were built are
+    tokenized again. The postings of their previous words are removed and
+    the new ones added, and only the index files that changed are written:
+    with `SEARCH_CHUNKS`, the chunks of the words of these pages.
+
+    The index has the pages, as a list of ``[url, title]`` (the position is
+    the page id, removed pages are null and their ids reused), and the
+    postings of every word, a flat list of page ids and word counts::
+
+        {"version": 1,
+         "docs": [["index.html", "Home"], ["about.html", "About"]],
+         "terms": {"folio": [0, 3, 1, 1], "about": [1, 2]}}
+
+    With `SEARCH_CHUNKS`, the postings are split in one file per first
+    character of the words, in a directory with the name of the index, and
+    the index has the file of every character in ``chunks``::
+
+        {"version": 1, "docs": [...], "chunks": {"a": "search/a.json", ...}}
+
+    :param SEARCH_PATTERNS: The template name patterns of the pages to index.
+    :param SEARCH_INDEX: The name of the index in the build path. Defaults to
+                         ``'search.json'``.
+    :param SEARCH_CHUNKS: Split the postings in one file per first character.
+    :param SEARCH_STATE_PATH: A file to keep the words of the pages between
+                              processes, or None. Without it, the pages that
+                              are not built are read from the build path.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import json
+import fnmatch
+import hashlib
+import threading
+
+from .manifest import is_reserved, reserved_name
+
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+__all__ = ['SearchIndex', 'extract_text', 'tokenize']
+
+#: The version of the index format.
+VERSION = 1
+
+#: The minimum length of the indexed words.
+MIN_LENGTH = 2
+
+_skip_re = re.compile(r'<(script|style|template)\b.*?</\1\s*>|<!--.*?-->',
+                      re.S | re.I)
+_title_re = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.S | re.I)
+_tag_re = re.compile(r'<[^>]*>')
+_word_re = re.compile(r'\w+', re.U)
+
+
+def extract_text(html):
+    """Returns the title and the text of an HTML page."""
+    match = _title_re.search(html)
+    title = unescape(_tag_re.sub('', match.group(1))).strip() if match \
+        else None
+    html = _title_re.sub(' ', _skip_re.sub(' ', html))
+    return title, unescape(_tag_re.sub(' ', html))
+
+
+def tokenize(text):
+    """Returns the count of every word of a text, in lower case."""
+    counts = {}
+    for word in _word_re.findall(text.lower()):
+        if len(word) >= MIN_LENGTH:
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+class SearchIndex(object):
+    """Builds the search index of a project. It's an output transform for
+    the indexed pages, that leaves the output untouched, and an after build
+    function that writes the index.
+
+    :param folio: The project.
+    :param patterns: The template name patterns of the pages to index.
+    :param name: The name of the index in the build path.
+    :param chunks: Split the postings by first character of the words.
+    :param state_path: The file to keep the words of the pages, or None.
+    """
+
+    #: Identifies the indexer in the build manifest.
+    cache_key = 'folio.search:%d' % VERSION
+
+    def __init__(self, folio, patterns, name='search.json', chunks=False,
+                 state_path=None):
+        self.folio = folio
+        self.patterns = list(patterns)
+        self.name = name
+        self.chunks = chunks
+        self.state_path = state_path
+
+        #: The title and the word counts of every page, by page name.
+        self.pages = {}
+
+        #: The id of every page in the index.
+        self.ids = {}
+
+        #: The postings of every word, as the count by page id, by first
+        #: character of the words. Built from the pages once, then updated
+        #: with the pages that changed.
+        self.postings = None
+
+        #: The ``[url, title]`` of every page id.
+        self.docs = []
+
+        #: The hash of the content of the index files, by name.
+        self.written = {}
+
+        #: The pages tokenized in the current build.
+        self.updated = set()
+
+        #: The name of the index record in the manifest.
+        self.record_name = reserved_name('folio.search', name)
+
+        # The previous words of the pages tokenized or removed since the
+        # postings were updated, None for the new ones.
+        self._replaced = {}
+        self._docs = None
+
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def match(self, template_name):
+        for pattern in self.patterns:
+            if fnmatch.fnmatch(template_name, pattern):
+                return True
+        return False
+
+    def _page_name(self, dst):
+        name = os.path.relpath(dst, self.folio.build_path)
+        return name.replace(os.sep, '/')
+
+    def __call__(self, env, template_name, dst, data):
+        self.index_page(self._page_name(dst), data)
+        return data
+
+    def index_page(self, name, data):
+        """Tokenize a page.
+
+        :param name: The page name, relative to the build path.
+        :param data: The HTML, as bytes.
+        """
+        html = data.decode(self.folio.encoding, 'replace')
+        title, text = extract_text(html)
+        page = {'title': title, 'terms': tokenize(text)}
+        with self._lock:
+            if name not in self._replaced:
+                self._replaced[name] = self.pages.get(name)
+            self.pages[name] = page
+            self.updated.add(name)
+
+    def begin(self, folio):
+        """Called at the beginning of every build."""
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+        self.updated = set()
+
+    def finish(self, folio, builded):
+        """Called at the end of every build. Updates the pages that were
+        built but not tokenized (in worker processes) or missing, forgets the
+        removed pages and writes the index."""
+        # The merge of a sharded build only calls this function.
+        if not self._loaded:
+            self.begin(folio)
+        folio.manifest.forget([self.record_name])
+
+        pages = {}
+        for template_name, record in folio.manifest.records.items():
+            if not is_reserved(template_name) and self.match(template_name):
+                for dst in record.outputs:
+                    pages[self._page_name(dst)] = dst
+
+        builded = set(self._page_name(dst) for _, dst, _ in builded)
+        for name, dst in pages.items():
+            if name not in self.updated and \
+                    (name in builded or name not in self.pages):
+                self._read_page(name, dst)
+
+        for name in list(self.pages):
+            if name not in pages:
+                self._replaced.setdefault(name, self.pages.pop(name))
+        self.write(folio.output, self.update_postings())
+        self.save()
+
+    def _read_page(self, name, dst):
+        """Tokenize a page from the build path."""
+        if not self.folio.output.shared:
+            return
+        try:
+            with open(dst, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return
+        self.index_page(name, data)
+
+    def _assign_ids(self):
+        """Returns the ``[url, title]`` of every id. The pages keep their
+        ids, the ones of removed pages are reused."""
+        for name in list(self.ids):
+            if name not in self.pages:
+                del self.ids[name]
+        used = set(self.ids.values())
+        free = (i for i in range(len(self.pages) + len(used) + 1)
+                if i not in used)
+        for name in sorted(self.pages):
+            if name not in self.ids:
+                self.ids[name] = next(free)
+
+        docs = [None] * (max(self.ids.values()) + 1 if self.ids else 0)
+        for name, i in self.ids.items():
+            docs[i] = [name, self.pages[name]['title']]
+        return docs
+
+    def _update_terms(self, i, terms, add, changed):
+        for term, count in terms.items():
+            chunk = self.postings.setdefault(term[0], {})
+            if add:
+                chunk.setdefault(term, {})[i] = count
+            else:
+                posting = chunk.get(term, {})
+                posting.pop(i, None)
+                if not posting:
+                    chunk.pop(term, None)
+                if not chunk:
+                    del self.postings[term[0]]
+            changed.add(term[0])
+
+    def update_postings(self):
+        """Update the postings with the pages tokenized or removed since
+        the last update, and assign the page ids. Returns the first
+        characters of the words that changed."""
+        replaced, self._replaced = self._replaced, {}
+        if self.postings is None:
+            self.postings = {}
+            replaced = dict.fromkeys(self.pages)
+
+        # The previous words are removed with the previous ids.
+        changed = set()
+        for name, page in replaced.items():
+            if page is not None and name in self.ids:
+                self._update_terms(self.ids[name], page['terms'], False,
+                                   changed)
+        self.docs = self._assign_ids()
+        for name in replaced:
+            if name in self.pages:
+                self._update_terms(self.ids[name],
+                                   self.pages[name]['terms'], True, changed)
+        return changed
+
+    def _terms(self, key):
+        return dict((term, [x for i in sorted(posting)
+                            for x in (i, posting[i])])
+                    for term, posting in self.postings[key].items())
+
+    def files(self, changed=None, missing=()):
+        """Returns the content of the index files, by name. With the first
+        characters of the words that changed, only the files that could
+        have changed and the `missing` ones are returned, the index itself
+        only if the pages or the chunks changed."""
+        if self.postings is None:
+            self.update_postings()
+        index = {'version': VERSION, 'docs': self.docs}
+        files = {}
+        if not self.chunks:
+            if changed is None or changed or self.docs != self._docs or \
+                    self.name in missing:
+                index['terms'] = {}
+                for key in self.postings:
+                    index['terms'].update(self._terms(key))
+                files[self.name] = _dumps(index)
+            return files
+
+        index['chunks'] = dict((key, self._chunk_file(key))
+                               for key in self.postings)
+        for key, name in index['chunks'].items():
+            if changed is None or key in changed or name in missing:
+                files[name] = _dumps({'terms': self._terms(key)})
+        if changed is None or self.docs != self._docs or \
+                self.name in missing or \
+                set(index['chunks'].values()) - set(self.written):
+            files[self.name] = _dumps(index)
+        return files
+
+    def _chunk_file(self, key):
+        base = os.path.splitext(self.name)[0]
+        return '%s/%s.json' % (base, _chunk_name(key))
+
+    def write(self, output, changed=None):
+        """Write the index files that changed, and record them in the
+        manifest.
+
+        :param output: The output backend.
+        :param changed: The first characters of the words that changed, or
+                        None to check every file.
+        """
+        folio = self.folio
+        if self.postings is None:
+            self.update_postings()
+        names = [self.name]
+        if self.chunks:
+            names.extend(self._chunk_file(key) for key in self.postings)
+        dsts = dict((name, os.path.join(folio.build_path, *name.split('/')))
+                    for name in names)
+        missing = set(name for name, dst in dsts.items()
+                      if name not in self.written or not output.exists(dst))
+        files = self.files(changed, missing)
+        written = {}
+        outputs = []
+        for name in sorted(names):
+            dst = dsts[name]
+            data = files.get(name)
+            if data is not None:
+                digest = hashlib.sha1(data).hexdigest()
+                if self.written.get(name) != digest or name in missing:
+                    output.prepare(dst)
+                    output.write(dst, data)
+                written[name] = digest
+            else:
+                written[name] = self.written[name]
+            outputs.append(dst)
+        self.written = written
+        self._docs = self.docs
+
+        # The index files are outputs, for the sync and the link checker.
+        folio.manifest.record(self.record_name, folio.build_path,
+                              self.cache_key, outputs)
+
+    def load(self):
+        """Load the words of the pages from the state file."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') != VERSION:
+            return
+        self.pages = data.get('pages', {})
+        self.ids = data.get('ids', {})
+
+    def save(self):
+        """Save the words of the pages to the state file."""
+        if not self.state_path:
+            return
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': VERSION, 'pages': self.pages,
+                       'ids': self.ids}, f)
+        os.rename(tmp, self.state_path)
+
+
+def _chunk_name(key):
+    """Returns a file name for the chunk of a character."""
+    if key.isalnum() and ord(key) < 128:
+        return key
+    return 'u%04x' % ord(key)
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True,
+                      ensure_ascii=False).encode('utf-8')
@@ -1,19 +1,186 @@
 # -*- coding: utf-8 -*-
 """
     Folio local development web server.
+
+    The server has an internal endpoint, ``/__folio/stats``, with the
+    counters and latency histograms of the requests, the rebuilds and the
+    scans of the watcher, and the hit ratios of the caches of the project, as
+    JSON. The histograms have fixed buckets, so the stats are always kept.
 """
 
 import os
+import json
 import time
-import urllib
-import thread
 import shutil
+import threading
+
+try:
+    from thread import start_new_thread
+    from urllib import unquote
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ForkingMixIn
+except ImportError:
+    from _thread import start_new_thread
+    from urllib.parse import unquote
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ForkingMixIn
+
+from .archive import source_mtime
+
+__all__ = ['run', 'Histogram', 'ServerStats']
+__version__ = '0.1'
 
-from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
-from SocketServer import ForkingMixIn
+#: The path of the stats endpoint.
+STATS_PATH = '/__folio/stats'
 
-__all__ = ['run']
-__version__ = '0.1'
+
+class Histogram(object):
+    """A latency histogram with fixed buckets.
+
+    :param bounds: The upper bounds of the buckets, in milliseconds. The last
+                   bucket has the rest.
+    """
+
+    #: The default bounds, in milliseconds.
+    default_bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.default_bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Count a duration, in seconds."""
+        ms = seconds * 1000.0
+        for i, bound in enumerate(self.bounds):
+            if ms <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def to_json(self):
+        buckets = [[bound, count] for bound, count
+                   in zip(self.bounds + (None,), self.counts)]
+        return {'count': self.count, 'total_ms': round(self.total, 3),
+                'max_ms': round(self.max, 3),
+                'mean_ms': round(self.total / self.count, 3)
+                if self.count else None,
+                'buckets': buckets}
+
+
+def _ratio(hits, misses):
+    if not hits + misses:
+        return None
+    return round(float(hits) / (hits + misses), 4)
+
+
+def cache_stats(folio):
+    """Returns the sizes and hit ratios of the caches of a project."""
+    stats = {}
+    if folio.env.cache is not None:
+        stats['templates'] = {'size': len(folio.env.cache)}
+    if folio.data is not None:
+        stats['data'] = {'parses': folio.data.parses,
+                         'hits': folio.data.hits,
+                         'ratio': _ratio(folio.data.hits,
+                                         folio.data.parses)}
+    cache = getattr(folio.env, 'fragment_cache', None)
+    if cache is not None:
+        stats['fragment_cache'] = {'size': len(cache), 'hits': cache.hits,
+                                   'misses': cache.misses,
+                                   'ratio': _ratio(cache.hits, cache.misses)}
+    for _, transform in folio.pipeline.transforms:
+        hits = getattr(transform, 'hits', None)
+        misses = getattr(transform, 'misses', None)
+        if hits is None or misses is None:
+            continue
+        name = getattr(transform, 'cache_key', type(transform).__name__)
+        stats[name] = {'hits': hits, 'misses': misses,
+                       'ratio': _ratio(hits, misses)}
+    return stats
+
+
+class ServerStats(object):
+    """The counters of a development server and its watcher. It's shared by
+    the server thread and the watcher."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.statuses = {}
+        self.extensions = {}
+        self.request_latency = Histogram()
+
+        self.rebuilds = 0
+        self.rebuild_failures = 0
+        self.rebuild_duration = Histogram()
+        self.last_rebuild = None
+
+        self.scans = 0
+        self.scan_duration = Histogram()
+        self.modified = 0
+        #: The templates waiting to be rebuilt by the watcher.
+        self.pending = 0
+
+    def request(self, status, ext, seconds):
+        """Count a request."""
+        with self._lock:
+            self.requests += 1
+            status = str(status)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.extensions[ext] = self.extensions.get(ext, 0) + 1
+            self.request_latency.add(seconds)
+
+    def rebuild(self, template_name, seconds, failed=False):
+        """Count the rebuild of a template by the watcher."""
+        with self._lock:
+            self.rebuilds += 1
+            if failed:
+                self.rebuild_failures += 1
+            self.rebuild_duration.add(seconds)
+            self.last_rebuild = {'template': template_name,
+                                 'duration_ms': round(seconds * 1000.0, 3),
+                                 'failed': failed}
+            self.pending = max(0, self.pending - 1)
+
+    def scan(self, seconds, modified):
+        """Count a scan of the watcher, and the templates it found to
+        rebuild."""
+        with self._lock:
+            self.scans += 1
+            self.scan_duration.add(seconds)
+            self.modified += modified
+            self.pending = modified
+
+    def to_json(self, folio=None):
+        with self._lock:
+            stats = {
+                'pid': os.getpid(),
+                'uptime': time.time() - self.started,
+                'requests': {'count': self.requests,
+                             'status': dict(self.statuses),
+                             'extensions': dict(self.extensions),
+                             'latency': self.request_latency.to_json()},
+                'rebuilds': {'count': self.rebuilds,
+                             'failures': self.rebuild_failures,
+                             'duration': self.rebuild_duration.to_json(),
+                             'last': self.last_rebuild},
+                'watcher': {'scans': self.scans,
+                            'duration': self.scan_duration.to_json(),
+                            'modified': self.modified,
+                            'pending': self.pending},
+            }
+        if folio is not None:
+            stats['caches'] = cache_stats(folio)
+        return stats
 
 
 class FolioHTTPServer(HTTPServer, ForkingMixIn, object):
@@ -27,6 +194,9 @@ class FolioHTTPServer(HTTPServer, ForkingMixIn, object):
         self.folio = folio
         self.logger = self.folio.logger
 
+        #: The :class:`ServerStats`, served at ``/__folio/stats``.
+        self.stats = kwargs.pop('stats', None) or ServerStats()
+
         HTTPServer.__init__(self, *args, **kwargs)
 
         self.logger.info('Serving %s', self.folio.build_path)
@@ -72,29 +242,62 @@ class FolioHTTPRequestHandler(BaseHTTPRequestHandler, object):
     def __init__(self, folio, request, client_address, server):
         self.wpath = folio.build_path
         self.debug = folio.config['DEBUG']
+        self.status = None
 
         BaseHTTPRequestHandler.__init__(self, request, client_address, server)
 
     def do_GET(self):
         """Serve a GET request."""
-        path = self.send_headers()
-        if path:
-            _, ext = os.path.splitext(path)
-            fmode = 'rb' if ext in self.bin_extensions else 'r'
-            f = open(path, fmode)
+        if self.path.split('?', 1)[0] == STATS_PATH:
+            return self.send_stats()
 
-            if ext in self.bin_extensions:
-                shutil.copyfileobj(f, self.wfile)
-            else:
-                content = f.read()
+        start = time.time()
+        try:
+            path = self.send_headers()
+            if path:
+                _, ext = os.path.splitext(path)
+                f = open(path, 'rb')
 
-                self.wfile.write(content)
+                if ext in self.bin_extensions:
+                    shutil.copyfileobj(f, self.wfile)
+                else:
+                    content = f.read()
 
-            f.close()
+                    self.wfile.write(content)
+
+                f.close()
+        finally:
+            self.count_request(start)
 
     def do_HEAD(self):
         """Serve a HEAD request."""
-        self.send_headers()
+        start = time.time()
+        try:
+            self.send_headers()
+        finally:
+            self.count_request(start)
+
+    def send_response(self, code, message=None):
+        self.status = code
+        BaseHTTPRequestHandler.send_response(self, code, message)
+
+    def count_request(self, start):
+        """Add the request to the stats of the server."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+        _, ext = os.path.splitext(path)
+        self.server.stats.request(self.status, ext, time.time() - start)
+
+    def send_stats(self):
+        """Serve the stats of the server as JSON."""
+        stats = self.server.stats.to_json(self.server.folio)
+        content = json.dumps(stats, indent=1, sort_keys=True).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-type", 'application/json')
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
 
     def send_headers(self):
         """Based on SimpleHTTPRequestHandler.send_head, but doesn't send the
@@ -126,7 +329,7 @@ class FolioHTTPRequestHandler(BaseHTTPRequestHandler, object):
         """Translate URL to local file system."""
         path = path.split('?', 1)[0]
         path = path.split('#', 1)[0]
-        path = os.path.normpath(urllib.unquote(path))
+        path = os.path.normpath(unquote(path))
         path = os.path.join(self.wpath, *path.split('/'))
 
         return path
@@ -148,9 +351,12 @@ def run(folio, host='127.0.0.1', port=8080):
     :param port: The port of the server.
     """
 
+    stats = ServerStats()
+
     def serve():
         """Create a FolioHTTPServer and serve forever."""
-        server = FolioHTTPServer(folio, (host, port), FolioHTTPRequestHandler)
+        server = FolioHTTPServer(folio, (host, port), FolioHTTPRequestHandler,
+                                 stats=stats)
         server.serve_forever()
 
     def watch(interval=1):
@@ -163,19 +369,58 @@ def run(folio, host='127.0.0.1', port=8080):
         """
         mtimes = {}
         while True:
+            start = time.time()
+            modified = []
             for template_name in folio.list_templates():
                 filename = os.path.join(folio.source_path, template_name)
                 otime = mtimes.get(filename)
-                mtime = os.path.getmtime(filename)
+                mtime = source_mtime(filename)
                 mtimes[filename] = mtime
                 if otime is None:
                     continue
                 elif mtime > otime:
                     folio.logger.info('Template %s modified' % template_name)
+                    modified.append(template_name)
+
+            # Rebuild the templates that depend on a modified file, like a
+            # data file.
+            changed = set()
+            for filename in set().union(*folio.dependencies.values()):
+                otime = mtimes.get(filename)
+                try:
+                    mtime = os.path.getmtime(filename)
+                except OSError:
+                    mtime = None
+                mtimes[filename] = mtime
+                if otime is not None and mtime != otime:
+                    folio.logger.info('File %s modified' % filename)
+                    changed.add(filename)
+
+            if changed:
+                if folio.data is not None:
+                    folio.data.reset()
+                for template_name, files in list(folio.dependencies.items()):
+                    if files & changed and template_name not in modified:
+                        modified.append(template_name)
+
+            # Update the content index before building, so the templates
+            # see the new metadata.
+            if modified and folio.index is not None:
+                folio.index.update(modified)
+
+            stats.scan(time.time() - start, len(modified))
+
+            for template_name in modified:
+                start = time.time()
+                failed = True
+                try:
                     folio.build_template(template_name)
+                    failed = False
+                finally:
+                    stats.rebuild(template_name, time.time() - start, failed)
             time.sleep(interval)
 
-    thread.start_new_thread(serve, ())
+    start_new_thread(serve, ())
 
     try:
         watch()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+    Sharded builds for Folio.
+
+    A big project can be built in slices, by many processes or machines that
+    share the file system. Every shard builds its own part of the templates
+    into its own directory and writes a partial manifest::
+
+        proj.build(shard=(0, 4))    # In the first process or machine.
+        proj.build(shard=(1, 4))    # ...
+        proj.build(shard=(2, 4))
+        proj.build(shard=(3, 4))
+
+        proj.merge_shards(4)        # When all of them are done.
+
+    The templates are partitioned by a stable hash of their names. If the
+    manifest of a previous build is available (see the `MANIFEST_PATH`
+    configuration), they are partitioned by their build times instead, so the
+    shards take about the same time. Every shard must see the same manifest
+    to get the same plan.
+
+    The after build functions, like the ones of the search index, are not
+    called by the shards. They are called by the merge, with every merged
+    output, so the outputs they write cover the whole site.
+
+    :param SHARD_PATH: The directory of every shard, formatted with the build
+                       path and the shard index. Defaults to
+                       ``'%(build_path)s.shard%(index)d'``.
+"""
+
+from __future__ import with_statement
+
+import os
+import zlib
+import multiprocessing
+
+from .helpers import link_or_copy
+from .manifest import Manifest
+
+__all__ = ['build_shards', 'merge_shards', 'plan_shards', 'shard_path']
+
+#: The file name of the partial manifest, inside the shard directory.
+MANIFEST_NAME = '.folio-manifest.json'
+
+
+def stable_hash(name):
+    """Returns a hash of the name that is the same in every process."""
+    return zlib.crc32(name.encode('utf-8')) & 0xffffffff
+
+
+def plan_shards(templates, count, durations=None):
+    """Partition the templates in `count` shards. Returns a list with the
+    template names of every shard.
+
+    Without durations, every template goes to the shard given by the hash of
+    its name. With the durations of a previous build, the slowest templates
+    are placed first, each one in the least loaded shard. The templates
+    without a duration count as the average.
+
+    :param templates: The template names.
+    :param count: The number of shards.
+    :param durations: The build time of the templates, by name.
+    """
+    if count < 1:
+        raise ValueError('The number of shards must be positive.')
+
+    shards = [[] for _ in range(count)]
+    known = [durations[name] for name in templates
+             if durations and name in durations]
+    if not known:
+        for name in sorted(templates):
+            shards[stable_hash(name) % count].append(name)
+        return shards
+
+    average = sum(known) / len(known)
+    weighted = sorted(((durations.get(name, average), name)
+                       for name in templates),
+                      key=lambda item: (-item[0], item[1]))
+    loads = [0.0] * count
+    for duration, name in weighted:
+        index = min(range(count), key=lambda i: (loads[i], i))
+        shards[index].append(name)
+        loads[index] += duration
+    return [sorted(names) for names in shards]
+
+
+def shard_path(folio, index):
+    """Returns the build directory of a shard."""
+    return folio._make_abspath(folio.config['SHARD_PATH'] % {
+        'build_path': folio.build_path,
+        'index': index,
+    })
+
+
+def merge_shards(folio, count):
+    """Combine the outputs and the partial manifests of the shards into the
+    build path of the project. The outputs are hard linked if possible.
+    Returns the set of merged files, as :meth:`folio.Folio.build` does.
+
+    Nothing is written if a template or a destination was built by more than
+    one shard, a `ValueError` is raised instead, unless they built the same
+    output from the same source, like the bundles. A `LookupError` is raised
+    if a shard wasn't built.
+
+    Then the after build functions of the project are called.
+
+    :param folio: The project.
+    :param count: The number of shards.
+    """
+    merged = Manifest()
+    owners = {}
+    links = []
+    for index in range(count):
+        path = shard_path(folio, index)
+        filename = os.path.join(path, MANIFEST_NAME)
+        if not os.path.exists(filename):
+            raise LookupError('The shard %d was not built.' % index)
+
+        partial = Manifest(filename)
+        partial.load()
+        for template_name in sorted(partial.records):
+            record = partial.records[template_name]
+            names = [os.path.relpath(output, path)
+                     for output in record.outputs]
+            if template_name in merged:
+                if _same_build(merged.records[template_name], record,
+                               names, folio.build_path):
+                    continue
+                raise ValueError('The template %s was built by more than one'
+                                 ' shard.' % template_name)
+
+            outputs = []
+            for output, name in zip(record.outputs, names):
+                if name in owners:
+                    raise ValueError('The destination %s is built by %s and'
+                                     ' %s.' % (name, owners[name],
+                                               template_name))
+                owners[name] = template_name
+
+                dst = os.path.join(folio.build_path, name)
+                links.append((record.src, output, dst))
+                outputs.append(dst)
+
+            record.outputs = outputs
+            merged.records[template_name] = record
+
+    builded = set()
+    for src, output, dst in links:
+        dstdir = os.path.dirname(dst)
+        if not os.path.exists(dstdir):
+            os.makedirs(dstdir)
+        link_or_copy(output, dst)
+        builded.add((src, dst, None))
+
+    folio.manifest.forget()
+    for template_name, record in merged.records.items():
+        folio.manifest.set(template_name, record)
+
+    # The outputs of the whole site are written once, from the merged ones.
+    if folio.after_build_funcs:
+        output = folio.output
+        output.begin(folio.build_path)
+        folio.manifest.begin()
+        try:
+            for func in folio.after_build_funcs:
+                func(folio, builded)
+        finally:
+            folio.manifest.end()
+            output.end()
+
+    if folio.manifest.path:
+        folio.manifest.save()
+
+    return builded
+
+
+def _same_build(merged, record, names, build_path):
+    """True if a shard built the same outputs, given by name relative to
+    its directory, as the merged record, from the same source and with the
+    same builder."""
+    return merged.src == record.src and \
+        merged.signature == record.signature and \
+        merged.builder == record.builder and \
+        [os.path.relpath(dst, build_path) for dst in merged.outputs] == names
+
+
+#: The project being built, inherited by the forked workers.
+_current = None
+
+
+def _build_shard(shard):
+    _current.build(shard=shard)
+    return shard
+
+
+def build_shards(folio, count, jobs=None):
+    """Build all the shards of a project in local processes, then merge
+    them. Useful to test a sharded build in one machine.
+
+    :param folio: The project.
+    :param count: The number of shards.
+    :param jobs: The number of processes. Defaults to the number of shards,
+                 up to the number of CPUs.
+    """
+    global _current
+
+    if jobs is None:
+        jobs = min(count, multiprocessing.cpu_count())
+
+    shards = [(index, count) for index in range(count)]
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for shard in shards:
+            folio.build(shard=shard)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        _current = folio
+        try:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+                list(executor.map(_build_shard, shards))
+        finally:
+            _current = None
+
+    return merge_shards(folio, count)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+    Delta sync of the build outputs for Folio.
+
+    After a build, the outputs can be copied to the directory where the site
+    is served. Only the outputs that changed since the previous sync are
+    copied, the rest of the target directory is not even read::
+
+        proj.build(incremental=True)
+        proj.sync('/var/www/site')
+
+    The outputs are taken from the build manifest, so the sync must run in
+    the process that built the project or the manifest must be saved (see the
+    `MANIFEST_PATH` configuration). The target directory keeps a state file
+    with the signature of every output it received, so an output is changed
+    if its signature in the build path is different, and it's an orphan if
+    it's not an output anymore.
+
+    Only the outputs of the templates recorded in the manifest since the
+    previous sync of the project, and the new outputs, are checked. The first
+    sync of a process, or one with `verify`, checks every output.
+
+    Every step is atomic: the outputs are copied to a temporary file in the
+    target directory and renamed over the old ones, and the orphans are
+    removed at the end. The outputs other than HTML, like stylesheets and
+    images, are copied before the HTML pages, so a new page is never served
+    before the files it references.
+"""
+
+from __future__ import with_statement
+
+import os
+import json
+import shutil
+
+from .manifest import file_signature
+
+__all__ = ['SyncResult', 'sync']
+
+#: The file name of the sync state, inside the target directory.
+STATE_NAME = '.folio-sync.json'
+
+#: The extensions of the pages, copied after the other outputs.
+PAGE_EXTENSIONS = ('.html', '.htm')
+
+
+class SyncResult(object):
+    """What a sync did.
+
+    :param copied: The names of the copied outputs, in order.
+    :param removed: The names of the removed orphans.
+    :param unchanged: The number of outputs that were already up to date.
+    """
+
+    def __init__(self, copied, removed, unchanged):
+        self.copied = copied
+        self.removed = removed
+        self.unchanged = unchanged
+
+    def __repr__(self):
+        return '<SyncResult copied=%d removed=%d unchanged=%d>' % (
+            len(self.copied), len(self.removed), self.unchanged)
+
+    def to_json(self):
+        return dict(self.__dict__)
+
+
+def load_state(target):
+    """Returns the signature of every output synced to the target, by name.
+    """
+    filename = os.path.join(target, STATE_NAME)
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_state(target, state):
+    filename = os.path.join(target, STATE_NAME)
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.rename(tmp, filename)
+
+
+def _output_name(folio, dst):
+    return os.path.relpath(dst, folio.build_path).replace(os.sep, '/')
+
+
+def outputs(folio, template_names=None):
+    """Returns the path of every output in the manifest, by name relative to
+    the build path.
+
+    :param template_names: Only the outputs of these templates.
+    """
+    records = folio.manifest.records
+    if template_names is not None:
+        records = dict((name, records[name]) for name in template_names
+                       if name in records)
+    rv = {}
+    for record in records.values():
+        for dst in record.outputs:
+            rv[_output_name(folio, dst)] = dst
+    return rv
+
+
+def _sync_order(name):
+    return (os.path.splitext(name)[1].lower() in PAGE_EXTENSIONS, name)
+
+
+def _replace(src, dst, link=False):
+    """Replace the destination with a copy or a hard link of the source, in
+    one step."""
+    dstdir = os.path.dirname(dst)
+    if not os.path.exists(dstdir):
+        os.makedirs(dstdir)
+    tmp = os.path.join(dstdir, '.%s.folio-tmp' % os.path.basename(dst))
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    if link:
+        try:
+            os.link(src, tmp)
+        except (OSError, AttributeError):
+            shutil.copy2(src, tmp)
+    else:
+        shutil.copy2(src, tmp)
+    os.rename(tmp, dst)
+
+
+def _remove(filename, target):
+    """Remove a file and its parent directories that become empty, up to the
+    target directory."""
+    if os.path.exists(filename):
+        os.remove(filename)
+    dirname = os.path.dirname(filename)
+    while dirname != target and dirname.startswith(target):
+        try:
+            os.rmdir(dirname)
+        except OSError:
+            break
+        dirname = os.path.dirname(dirname)
+
+
+def sync(folio, target, link=False, dry_run=False, template_names=None):
+    """Copy the outputs that changed since the previous sync to the target
+    directory, and remove the ones that are not outputs anymore. Returns a
+    :class:`SyncResult`.
+
+    :param folio: The project.
+    :param target: The target directory.
+    :param link: Hard link the outputs instead of copying them. The target
+                 then shares the files with the build path, so the outputs
+                 shouldn't be rebuilt in place while they are served.
+    :param dry_run: Only return what would be done.
+    :param template_names: The templates built since the previous sync. Only
+                           their outputs and the ones that were never synced
+                           are checked. By default every output is checked.
+    """
+    target = os.path.abspath(target)
+    state = load_state(target)
+    current = outputs(folio)
+
+    if template_names is None:
+        checked = current
+    else:
+        checked = outputs(folio, template_names)
+        for name, dst in current.items():
+            if name not in state:
+                checked[name] = dst
+
+    changed = []
+    missing = set()
+    signatures = {}
+    for name, dst in checked.items():
+        signature = file_signature(dst)
+        if signature is None:
+            missing.add(name)
+            continue
+        signatures[name] = signature
+        if state.get(name) != signature:
+            changed.append(name)
+    changed.sort(key=_sync_order)
+    removed = sorted(name for name in state
+                     if name not in current or name in missing)
+    result = SyncResult(changed, removed,
+                        len(current) - len(missing) - len(changed))
+    if dry_run:
+        return result
+
+    if not os.path.exists(target):
+        os.makedirs(target)
+
+    try:
+        for name in changed:
+            _replace(current[name], os.path.join(target, *name.split('/')),
+                     link)
+            state[name] = signatures[name]
+        for name in removed:
+            _remove(os.path.join(target, *name.split('/')), target)
+            del state[name]
+    finally:
+        # The state is saved even if a step failed, so the next sync
+        # continues from there.
+        save_state(target, state)
+
+    return result
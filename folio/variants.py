@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+    Variant builds for Folio.
+
+    A variant is the same site built with another theme or configuration, for
+    example another locale, into its own subdirectory of the build path. All
+    the variants are built in one run, sharing the work that doesn't depend on
+    them:
+
+    * the list of source templates,
+    * the contexts registered in the project,
+    * the transformed content of the :class:`folio.builders.Wrapper`
+      builders, like the Markdown conversion,
+    * the static files of the source directory, copied once and linked in the
+      other variants.
+
+    Then every variant renders its templates in parallel.
+"""
+
+from __future__ import with_statement
+
+import os
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .builders import Wrapper, static_builder
+from .helpers import link_or_copy
+from .pipeline import copy_output
+
+__all__ = ['Variant', 'build_variants']
+
+
+class Variant(object):
+    """A variant of the project.
+
+    :param name: The variant name, used as the output subdirectory.
+    :param theme: The theme of the variant, for the themes extension.
+    :param config: Configuration values that override the project ones.
+    :param contexts: A list of ``(pattern, context)`` pairs only for this
+                     variant. They are merged over the project contexts.
+    :param build_path: The output directory. Defaults to the variant name
+                       inside the build path of the project.
+    """
+
+    def __init__(self, name, theme=None, config=None, contexts=(),
+                 build_path=None):
+        self.name = name
+        self.theme = theme
+        self.config = config or {}
+        self.contexts = list(contexts)
+        self.build_path = build_path
+
+    def create_folio(self, folio):
+        """Create the project for this variant, as a copy of the given
+        project."""
+        from folio import Folio
+
+        build_path = self.build_path or os.path.join(folio.build_path,
+                                                     self.name)
+        jinja_extensions = [type(ext) for ext in folio.env.extensions.values()]
+
+        proj = Folio(folio.import_name, source_path=folio.source_path,
+                     build_path=folio._make_abspath(build_path),
+                     encoding=folio.encoding,
+                     jinja_extensions=jinja_extensions)
+
+        for key, value in folio.config.items():
+            proj.config[key] = list(value) if isinstance(value, list) \
+                else value
+        proj.config.update(self.config)
+        if self.theme is not None:
+            proj.config['THEME'] = self.theme
+
+        # Share the builders and transforms added to the project, the content
+        # index and the data files. The ones of the configuration, like the
+        # extensions, are registered again for the variant, in the same
+        # order.
+        builders, transforms = folio._configured
+        proj.builders = folio.builders[:builders.start]
+        proj.pipeline.transforms = folio.pipeline.transforms[:transforms.start]
+        proj.index = folio.index
+        proj.data = folio.data
+
+        for pattern, context in self.contexts:
+            proj.add_context(pattern, context)
+
+        proj.init_config()
+        proj.builders.extend(folio.builders[builders.stop:])
+        proj.pipeline.transforms.extend(
+            folio.pipeline.transforms[transforms.stop:])
+        return proj
+
+
+class VariantsBuild(object):
+    """A build of many variants of a project.
+
+    :param folio: The project.
+    :param variants: A list of :class:`Variant`.
+    """
+
+    def __init__(self, folio, variants):
+        self.folio = folio
+        self.variants = variants
+
+        #: The projects of every variant.
+        self.projects = []
+
+        #: The contexts of the project, by template name.
+        self.contexts = {}
+
+        #: The templates of every variant, by variant name.
+        self.templates = {}
+
+        #: Static files already copied to every variant, by variant name.
+        self.copied = {}
+
+        #: Transformed content shared by the wrapper builders.
+        self.memo = {}
+
+    def prepare(self):
+        """Do the work shared by every variant."""
+        folio = self.folio
+        folio.init_config()
+
+        if folio.index is not None:
+            folio.index.scan()
+        if folio.data is not None:
+            folio.data.reset()
+
+        for func in folio.before_build_funcs:
+            func(folio)
+
+        # The sources are listed once, only the templates of the themes (or
+        # any other loader) are listed by variant.
+        sources = [name for name in folio.jinja_loader.loaders[0]
+                   .list_templates() if folio.is_template(name)]
+
+        self.projects = [variant.create_folio(folio)
+                         for variant in self.variants]
+
+        for variant, proj in zip(self.variants, self.projects):
+            names = set(sources)
+            for loader in proj.jinja_loader.loaders[1:]:
+                names.update(name for name in loader.list_templates()
+                             if proj.is_template(name))
+            self.templates[variant.name] = sorted(names)
+
+            for builder in self._builders(proj):
+                if isinstance(builder, Wrapper):
+                    builder.memo = self.memo
+
+        all_names = set()
+        for names in self.templates.values():
+            all_names.update(names)
+        for template_name in sorted(all_names):
+            self.contexts[template_name] = folio.get_context(template_name)
+
+        # Transform the sources of the wrappers once, before the variants are
+        # built in parallel.
+        for template_name in sources:
+            for proj in self.projects:
+                builder = proj.get_builder(template_name)
+                if isinstance(builder, Wrapper) and not builder.stream:
+                    src = os.path.join(folio.source_path, template_name)
+                    builder.read(proj.env, template_name, src)
+                    break
+
+        self._copy_static(sources)
+
+    def _builders(self, proj):
+        return [builder for _, builder in proj.builders]
+
+    def _copy_static(self, sources):
+        """Copy the static files of the source directory to the first
+        variant, and link them in the others."""
+        for template_name in sources:
+            builders = [proj.get_builder(template_name)
+                        for proj in self.projects]
+            if any(builder is not static_builder for builder in builders):
+                continue
+            if any(proj.pipeline.match(template_name)
+                   for proj in self.projects):
+                continue
+
+            src = os.path.join(self.folio.source_path, template_name)
+            first = None
+            for variant, proj in zip(self.variants, self.projects):
+                dst = proj._make_destination(
+                    proj.translate_template_name(template_name))
+                if first is None:
+                    copy_output(proj.env, template_name, src, dst)
+                    first = dst
+                else:
+                    link_or_copy(first, dst)
+                self.copied.setdefault(variant.name, set()).add(
+                    (template_name, src, dst))
+
+    def build_variant(self, i):
+        """Build a variant, returns the set of builded templates."""
+        variant, proj = self.variants[i], self.projects[i]
+        copied = self.copied.get(variant.name, set())
+        skip = set(template_name for template_name, _, _ in copied)
+
+        builded = set((src, dst, None) for _, src, dst in copied)
+
+        for func in proj.before_build_funcs:
+            func(proj)
+
+        for template_name in self.templates[variant.name]:
+            if template_name in skip:
+                continue
+
+            context = dict(self.contexts.get(template_name, {}))
+            context.update(proj.get_context(template_name))
+
+            rv = proj.build_template(template_name, context)
+            if isinstance(rv, list):
+                builded.update(rv)
+            elif rv:
+                builded.add(rv)
+
+        for func in proj.after_build_funcs:
+            func(proj, builded)
+
+        return builded
+
+    def finish(self):
+        for proj in self.projects:
+            for builder in self._builders(proj):
+                if isinstance(builder, Wrapper):
+                    builder.memo = None
+
+
+#: The build being run, inherited by the forked workers.
+_current = None
+
+
+def _build_variant(i):
+    return _current.build_variant(i)
+
+
+def build_variants(folio, variants, jobs=None):
+    """Build all the variants of a project. Returns a dictionary with the set
+    of builded templates of every variant, by variant name.
+
+    The variants are built in parallel, in forked processes if the platform
+    supports it, or in threads.
+
+    :param folio: The project.
+    :param variants: A list of :class:`Variant`.
+    :param jobs: The number of variants built at the same time. Defaults to
+                 the number of variants, up to the number of CPUs.
+    """
+    global _current
+
+    names = [variant.name for variant in variants]
+    if len(set(names)) != len(names):
+        raise ValueError('The variant names must be unique.')
+
+    run = VariantsBuild(folio, variants)
+    run.prepare()
+
+    if jobs is None:
+        jobs = min(len(variants), multiprocessing.cpu_count())
+
+    try:
+        if jobs <= 1:
+            results = [run.build_variant(i) for i in range(len(variants))]
+        elif 'fork' in multiprocessing.get_all_start_methods():
+            _current = run
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+                results = list(executor.map(_build_variant,
+                                            range(len(variants))))
+        else:
+            with ThreadPoolExecutor(jobs) as executor:
+                results = list(executor.map(run.build_variant,
+                                            range(len(variants))))
+    finally:
+        _current = None
+        run.finish()
+
+    builded = set()
+    for result in results:
+        builded.update(result)
+    for func in folio.after_build_funcs:
+        func(folio, builded)
+
+    return dict(zip(names, results))
@@ -0,0 +1,150 @@
+from __future__ import with_statement
+
+import io
+import os
+import time
+import tarfile
+import zipfile
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.archive import SourceArchive, close_archives, source_mtime
+from folio.builders import Wrapper, static_builder, template_builder
+
+
+SOURCES = {
+    '_layout.html': '<body>{% block body %}{% endblock %}</body>',
+    '_wrap.html': '<p>{{ content }}</p>',
+    'index.html': '{% extends "_layout.html" %}'
+                  '{% block body %}{{ index.get("blog/post.html").title }}'
+                  '{% endblock %}',
+    'blog/post.html': '---\ntitle: Post\n---\nPost',
+    'notes.txt': 'Notes',
+    'static/style.css': 'body {}',
+    '.hidden': 'Hidden',
+    '_drafts/draft.html': 'Draft',
+}
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        close_archives()
+        rmtree(self.root)
+
+    def make_zip(self, sources, compression=zipfile.ZIP_STORED):
+        path = os.path.join(self.root, 'src.zip')
+        with zipfile.ZipFile(path, 'w', compression) as archive:
+            for name in sorted(sources):
+                archive.writestr(name, sources[name])
+        return path
+
+    def make_tar(self, sources, ext='.tar', mtime=None):
+        path = os.path.join(self.root, 'src' + ext)
+        with tarfile.open(path, 'w:' + ext[5:]) as archive:
+            for name in sorted(sources):
+                data = sources[name].encode('utf-8')
+                info = tarfile.TarInfo('./' + name)
+                info.size = len(data)
+                info.mtime = mtime or time.time()
+                archive.addfile(info, io.BytesIO(data))
+        return path
+
+    def make_folio(self, source_path):
+        build_path = os.path.join(self.root, 'build')
+        if os.path.exists(build_path):
+            rmtree(build_path)
+        proj = folio.Folio(__name__, source_path=source_path,
+                           build_path=build_path)
+        proj.config['INDEX_PATTERNS'] = ['blog/*']
+        proj.add_builder('*', static_builder)
+        proj.add_builder('*.html', template_builder)
+        proj.add_builder('*.txt', Wrapper('_wrap.html'))
+        return proj
+
+    def build(self, source_path):
+        proj = self.make_folio(source_path)
+        proj.build()
+        outputs = {}
+        for dirpath, _, filenames in os.walk(proj.build_path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path) as f:
+                    outputs[os.path.relpath(path, proj.build_path)] = \
+                        f.read()
+        return proj, outputs
+
+    def test_archives(self):
+        srcdir = os.path.join(self.root, 'src')
+        for name, content in SOURCES.items():
+            filename = os.path.join(srcdir, name)
+            if not os.path.exists(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as f:
+                f.write(content)
+        expected_proj, expected = self.build(srcdir)
+        self.assertEquals('<body>Post</body>', expected['index.html'])
+        self.assertEquals('<p>Notes</p>', expected['notes.html'])
+
+        for path in [self.make_zip(SOURCES),
+                     self.make_zip(SOURCES, zipfile.ZIP_DEFLATED),
+                     self.make_tar(SOURCES),
+                     self.make_tar(SOURCES, '.tar.gz')]:
+            proj, outputs = self.build(path)
+            self.assertEquals(expected_proj.list_templates(),
+                              proj.list_templates())
+            self.assertEquals(expected, outputs)
+
+    def test_mmap(self):
+        archive = SourceArchive(self.make_zip(SOURCES))
+        self.assertTrue(archive.members['notes.txt'].offset is not None)
+        self.assertEquals(b'Notes', bytes(archive.read('notes.txt')))
+        archive.close()
+
+        archive = SourceArchive(self.make_zip(SOURCES, zipfile.ZIP_DEFLATED))
+        self.assertTrue(archive.members['notes.txt'].offset is None)
+        self.assertEquals(b'Notes', archive.read('notes.txt'))
+        archive.close()
+
+        archive = SourceArchive(self.make_tar(SOURCES))
+        self.assertEquals(b'body {}', bytes(archive.read('static/style.css')))
+        self.assertEquals(len(SOURCES), len(archive))
+        archive.close()
+
+    def test_compressed_tar(self):
+        archive = SourceArchive(self.make_tar(SOURCES, '.tar.gz'))
+
+        # The archive is decompressed once, the members are not read from the
+        # compressed stream.
+        archive.archive.extractfile = None
+        for name in sorted(SOURCES, reverse=True):
+            self.assertEquals(SOURCES[name].encode('utf-8'),
+                              bytes(archive.read(name)))
+        archive.close()
+
+    def test_incremental(self):
+        path = self.make_tar(SOURCES, mtime=1000)
+        proj = self.make_folio(path)
+        proj.build()
+        self.assertEquals(1000, source_mtime(os.path.join(path, 'notes.txt')))
+
+        self.assertEquals(set(), proj.build(incremental=True))
+
+        self.make_tar(dict(SOURCES, **{'notes.txt': 'New'}), mtime=1000)
+        builded = proj.build(incremental=True)
+        self.assertEquals(['notes.html'],
+                          sorted(os.path.basename(dst)
+                                 for _, dst, _ in builded))
+        with open(os.path.join(proj.build_path, 'notes.html')) as f:
+            self.assertEquals('<p>New</p>', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+from __future__ import with_statement
+
+import io
+import os
+import unittest
+import tracemalloc
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+from folio.builders import Paginator, Taxonomy, Wrapper, iter_chunks
+
+
+class GeneratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srcdir = mkdtemp()
+        self.outdir = mkdtemp()
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.outdir)
+        self.proj.add_context('*', {'items': [
+            {'title': 'One', 'tags': ['python', 'Jinja']},
+            {'title': 'Two', 'tags': 'python'},
+            {'title': 'Three'},
+        ]})
+
+    def tearDown(self):
+        rmtree(self.srcdir)
+        rmtree(self.outdir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.outdir, name)) as f:
+            return f.read()
+
+    def test_paginator(self):
+        self.write('archive.html', '{{ page.number }}/{{ page.count }}:'
+                                   '{% for i in page.items %}'
+                                   '{{ i.title }}{% endfor %}:'
+                                   '{{ page.next }}')
+        self.proj.init_config()
+        self.proj.add_builder('archive.html', Paginator(per_page=2))
+
+        builded = self.proj.build()
+
+        self.assertEquals(2, len(builded))
+        self.assertEquals('1/2:OneTwo:archive/2.html',
+                          self.read('archive.html'))
+        self.assertEquals('2/2:Three:None', self.read('archive/2.html'))
+
+    def test_taxonomy(self):
+        self.write('tags.html', '{% if term %}{{ term }}:'
+                                '{% for i in items %}{{ i.title }}{% endfor %}'
+                                '{% else %}{{ terms|length }}{% endif %}')
+        self.proj.init_config()
+        self.proj.add_builder('tags.html', Taxonomy())
+
+        loads = []
+        get_template = self.proj.env.get_template
+        self.proj.env.get_template = lambda *a: loads.append(a) or \
+            get_template(*a)
+
+        builded = self.proj.build()
+
+        self.assertEquals(3, len(builded))
+        self.assertEquals(1, len(loads))
+        self.assertEquals('2', self.read('tags.html'))
+        self.assertEquals('python:OneTwo', self.read('tags/python.html'))
+        self.assertEquals('Jinja:One', self.read('tags/jinja.html'))
+
+    def test_taxonomy_slugs(self):
+        self.write('tags.html', '{% if term %}{{ term }}{% else %}'
+                                '{{ slugs["c++"] }}{% endif %}')
+        self.proj.add_context('*', {'items': [
+            {'tags': ['C++', 'c++', 'a b', 'a/b']},
+        ]})
+        self.proj.init_config()
+        self.proj.add_builder('tags.html', Taxonomy())
+
+        builded = self.proj.build()
+
+        self.assertEquals(5, len(builded))
+        self.assertEquals('c++-2', self.read('tags.html'))
+        self.assertEquals('C++', self.read('tags/c++.html'))
+        self.assertEquals('c++', self.read('tags/c++-2.html'))
+        self.assertEquals('a b', self.read('tags/a-b.html'))
+        self.assertEquals('a/b', self.read('tags/a-b-2.html'))
+
+    def test_call(self):
+        self.write('archive.html', '{{ page.number }}')
+        self.proj.init_config()
+
+        paginator = Paginator(per_page=2)
+        context = self.proj.get_context('archive.html')
+        dst = os.path.join(self.outdir, 'archive.html')
+        dsts = paginator(self.proj.env, 'archive.html', context,
+                         os.path.join(self.srcdir, 'archive.html'), dst,
+                         'utf-8')
+
+        self.assertEquals(
+            [dst, os.path.join(self.outdir, 'archive', '2.html')], dsts)
+        self.assertEquals('1', self.read('archive.html'))
+        self.assertEquals('2', self.read('archive/2.html'))
+
+
+class StreamingWrapperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srcdir = mkdtemp()
+        self.outdir = mkdtemp()
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.outdir)
+        self.write('_wrap.html', '<pre>{% for chunk in content %}'
+                                 '{{ chunk }}{% endfor %}</pre>')
+
+    def tearDown(self):
+        rmtree(self.srcdir)
+        rmtree(self.outdir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.outdir, name)) as f:
+            return f.read()
+
+    def test_iter_chunks(self):
+        f = io.StringIO(u'one\ntwo\nthree\nfour')
+        self.assertEquals([u'one\n', u'two\n', u'three\n', u'four'],
+                          list(iter_chunks(f, 5)))
+        f = io.StringIO(u'a very long line\nb')
+        self.assertEquals([u'a ver', u'y lon', u'g lin', u'e\n', u'b'],
+                          list(iter_chunks(f, 5)))
+
+    def test_stream(self):
+        def upper(chunks):
+            for chunk in chunks:
+                yield chunk.upper()
+
+        self.write('notes.txt', 'first line\nsecond line\n')
+        self.proj.init_config()
+        self.proj.add_builder('*.txt', Wrapper('_wrap.html',
+                                               transformer=upper,
+                                               stream=True, chunk_size=8))
+
+        self.proj.build()
+        self.assertEquals('<pre>FIRST LINE\nSECOND LINE\n</pre>',
+                          self.read('notes.html'))
+
+    def test_stream_front_matter(self):
+        self.write('post.txt', '---\ntitle: Post\n---\nBody\n')
+        self.proj.config['INDEX_PATTERNS'] = ['*.txt']
+        self.proj.init_config()
+        self.proj.add_builder('*.txt', Wrapper('_wrap.html', stream=True))
+
+        self.proj.build()
+        self.assertEquals('<pre>\n\n\nBody\n</pre>', self.read('post.html'))
+
+    def test_stream_memory(self):
+        line = 'x' * 99 + '\n'
+        with open(os.path.join(self.srcdir, 'big.txt'), 'w') as f:
+            for _ in range(40000):
+                f.write(line)
+        self.proj.init_config()
+        self.proj.add_builder('*.txt', Wrapper('_wrap.html', stream=True))
+
+        tracemalloc.start()
+        try:
+            self.proj.build()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # The source has 4MB, only a few chunks are in memory at once.
+        self.assertTrue(peak < 1024 * 1024, peak)
+        self.assertEquals(4000000 + 11,
+                          os.path.getsize(os.path.join(self.outdir,
+                                                       'big.html')))
+
+
+if __name__ == '__main__':
+    unittest.main()
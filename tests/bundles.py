@@ -0,0 +1,114 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+
+class BundlesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        themedir = os.path.join(self.root, 'themes', 'basic')
+        os.makedirs(self.srcdir)
+        os.makedirs(themedir)
+        with open(os.path.join(themedir, 'theme.css'), 'w') as f:
+            f.write('body {\n  margin: 0;\n}\n')
+
+        self.write('a.css', '/* A */\na { color: red; }\n')
+        self.write('b.css', 'b { color: blue; }')
+        self.write('index.html', "{{ bundle('css/site.css') }}")
+        self.write('about.html', 'About')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+        self.proj.logger.disabled = True
+        self.proj.config['EXTENSIONS'] = ['themes']
+        self.proj.config['THEMES_PATHS'] = [os.path.join(self.root,
+                                                         'themes')]
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(filename) + 10
+        os.utime(filename, (mtime, mtime))
+
+    def read(self, name):
+        with open(os.path.join(self.builddir, name)) as f:
+            return f.read()
+
+    def test_bundle(self):
+        self.proj.add_bundle('css/site.css', ['theme.css', 'a.css', 'b.css'],
+                             minify=True)
+        self.proj.build()
+
+        url = self.read('index.html')
+        self.assertTrue(url.startswith('/css/site.'))
+        self.assertEquals(len('/css/site..css') + 10, len(url))
+        self.assertEquals('body{margin: 0}a{color: red}b{color: blue}',
+                          self.read(url[1:]).strip())
+
+        record = self.proj.manifest.records['<folio.bundles>/css/site.css']
+        self.assertEquals([os.path.join(self.builddir, url[1:])],
+                          record.outputs)
+
+    def test_config(self):
+        self.write('a.js', 'var a = 1')
+        self.write('b.js', 'var b = 2\n')
+        self.write('index.html', "{{ bundle('site.js') }}")
+        self.proj.config['BUNDLES'] = {'site.js': ['a.js', 'b.js']}
+        self.proj.config['BUNDLES_URL'] = '/static/'
+        self.proj.build()
+
+        url = self.read('index.html')
+        self.assertTrue(url.startswith('/static/site.'))
+        self.assertEquals('var a = 1\n;\nvar b = 2\n',
+                          self.read(url[len('/static/'):]))
+
+    def test_config_not_shared(self):
+        self.proj.config['BUNDLES']['site.js'] = ['a.js']
+        other = folio.Folio(__name__, source_path=self.srcdir,
+                            build_path=self.builddir)
+        self.assertEquals({}, other.config['BUNDLES'])
+        self.assertEquals({}, folio.Folio.default_config['BUNDLES'])
+
+    def test_incremental(self):
+        self.proj.add_bundle('css/site.css', ['theme.css', 'a.css', 'b.css'])
+        self.proj.build()
+        bundles = self.proj.bundles
+        url = self.read('index.html')
+        self.assertEquals(1, bundles.builds)
+
+        # Nothing changed, the bundle and the page are not built again.
+        builded = self.proj.build(incremental=True)
+        self.assertEquals(1, bundles.builds)
+        self.assertEquals(set(), builded)
+
+        # A member changed, the bundle is built again with a new name and
+        # the page that uses it too.
+        self.write('b.css', 'b { color: green; }')
+        builded = self.proj.build(incremental=True)
+        self.assertEquals(2, bundles.builds)
+        names = sorted(os.path.relpath(dst, self.builddir)
+                       for _, dst, _ in builded)
+        self.assertEquals(['b.css', 'index.html'], names)
+
+        new_url = self.read('index.html')
+        self.assertNotEqual(url, new_url)
+        self.assertTrue(self.read(new_url[1:]).endswith('green; }\n'))
+        self.assertFalse(os.path.exists(os.path.join(self.builddir,
+                                                     url[1:])))
+
+
+if __name__ == '__main__':
+    unittest.main()
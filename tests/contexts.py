@@ -0,0 +1,117 @@
+from __future__ import with_statement
+
+import os
+import time
+import asyncio
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+
+class ContextsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srcdir = mkdtemp()
+        self.outdir = mkdtemp()
+
+        for name in ('one.html', 'two.html', 'three.html'):
+            with open(os.path.join(self.srcdir, name), 'w') as f:
+                f.write('{{ name }}:{{ comments }}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.outdir)
+
+    def tearDown(self):
+        rmtree(self.srcdir)
+        rmtree(self.outdir)
+
+    def read(self, name):
+        with open(os.path.join(self.outdir, name)) as f:
+            return f.read()
+
+    def test_async_concurrent(self):
+        @self.proj.context('*.html')
+        async def first(env):
+            await asyncio.sleep(0.1)
+            return {'name': 'first'}
+
+        @self.proj.context('*.html')
+        async def second(env):
+            await asyncio.sleep(0.1)
+            return {'name': 'second'}
+
+        start = time.time()
+        context = self.proj.get_context('one.html')
+
+        self.assertTrue(time.time() - start < 0.19)
+        self.assertEquals({'name': 'second'}, context)
+
+    def test_merge_order(self):
+        @self.proj.context('*.html')
+        async def first(env):
+            await asyncio.sleep(0.01)
+            return {'name': 'async'}
+
+        self.proj.add_context('*.html', {'name': 'sync'})
+
+        self.assertEquals({'name': 'sync'}, self.proj.get_context('one.html'))
+
+    def test_batch(self):
+        calls = []
+
+        @self.proj.context(['one.html', 'two.html'], batch=True)
+        async def comments(env, template_names):
+            calls.append(sorted(template_names))
+            return dict((name, {'comments': len(name)})
+                        for name in template_names)
+
+        self.proj.build()
+
+        self.assertEquals([['one.html', 'two.html']], calls)
+        self.assertEquals(':8', self.read('one.html'))
+        self.assertEquals(':', self.read('three.html'))
+
+        self.assertEquals({'comments': 8}, self.proj.get_context('two.html'))
+        self.assertEquals(['two.html'], calls[-1])
+
+    def test_build_loop(self):
+        loops = []
+
+        @self.proj.context('*.html')
+        async def name(env):
+            loops.append(asyncio.get_running_loop())
+            return {'name': 'async'}
+
+        self.proj.config['CONTEXT_WORKERS'] = 2
+        self.proj.build()
+
+        self.assertEquals(3, len(loops))
+        self.assertEquals(1, len(set(loops)))
+        self.assertTrue(loops[0].is_closed())
+        self.assertEquals('async:', self.read('one.html'))
+
+    def test_running_loop(self):
+        @self.proj.context('*.html')
+        async def name(env):
+            return {'name': 'async'}
+
+        async def main():
+            return self.proj.get_context('one.html')
+
+        self.assertEquals({'name': 'async'}, asyncio.run(main()))
+
+    def test_workers(self):
+        self.proj.config['CONTEXT_WORKERS'] = 2
+        self.proj.add_context('*.html', lambda env: {'name': 'sync'})
+
+        builded = self.proj.build()
+
+        self.assertEquals(3, len(builded))
+        self.assertEquals('sync:', self.read('two.html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+from __future__ import with_statement
+
+import io
+import os
+import json
+import threading
+import unittest
+
+from contextlib import redirect_stdout
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.daemon import (BuildDaemon, Client, DaemonError,
+                          DaemonUnavailable, build, main)
+
+
+class DaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        os.makedirs(self.srcdir)
+        with open(os.path.join(self.srcdir, 'index.html'), 'w') as f:
+            f.write('Index')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=os.path.join(self.root, 'build'))
+        self.address = os.path.join(self.root, 'folio.sock')
+        self.daemon = BuildDaemon(self.proj, self.address)
+        self.client = Client(self.address, timeout=10)
+        self.thread = None
+
+    def tearDown(self):
+        if self.thread is not None:
+            self.client.request('shutdown')
+            self.thread.join()
+        rmtree(self.root)
+
+    def serve(self):
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        while self.daemon.server is None:
+            self.thread.join(0.01)
+
+    def test_commands(self):
+        self.serve()
+        self.assertEquals(1, self.daemon.builds)
+
+        # Nothing changed since the warm up build.
+        self.assertEquals(0, self.client.request('build')['count'])
+        self.assertEquals(1, self.client.request('build', full=True)['count'])
+
+        result = self.client.request('build-template', template='index.html')
+        self.assertEquals(1, result['count'])
+
+        self.client.request('invalidate')
+        self.assertEquals(1, self.client.request('build')['count'])
+
+        stats = self.client.request('stats')
+        self.assertEquals(4, stats['builds'])
+        self.assertEquals(1, stats['templates'])
+
+    def main(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEquals(0, main(list(argv) + ['--socket',
+                                                    self.address]))
+        return json.loads(out.getvalue())
+
+    def test_main(self):
+        with open(os.path.join(self.srcdir, 'about.html'), 'w') as f:
+            f.write('About')
+        self.serve()
+
+        result = self.main('build-template', 'index.html')
+        self.assertEquals([1], [r['count'] for r in result])
+
+        # Only the given template is forgotten.
+        self.assertEquals({'templates': 1},
+                          self.main('invalidate', 'about.html'))
+        self.assertEquals(1, self.main('build')['count'])
+
+        self.assertEquals({'templates': 0}, self.main('invalidate'))
+        self.assertEquals(2, self.main('build')['count'])
+
+    def test_errors(self):
+        self.proj.logger.disabled = True
+        self.serve()
+        self.assertRaises(DaemonError, self.client.request, 'unknown')
+        self.assertRaises(DaemonError, self.client.request,
+                          'build-template', template='missing.html')
+        self.assertTrue(self.client.is_running())
+
+    def test_fallback(self):
+        self.assertFalse(self.client.is_running())
+        self.assertRaises(DaemonUnavailable, build, None, self.address)
+
+        result = build(self.proj, self.address)
+        self.assertEquals(1, result['count'])
+        result = build(lambda: self.proj, self.address)
+        self.assertEquals(0, result['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import with_statement
+
+import os
+import time
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+
+class DataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.datadir = os.path.join(self.root, 'data')
+        os.makedirs(self.srcdir)
+        os.makedirs(os.path.join(self.datadir, 'menu'))
+
+        self.write(self.datadir, 'site.json', '{"name": "Folio"}')
+        self.write(self.datadir, 'menu/main.csv', 'title,url\nHome,/\n')
+        self.write(self.datadir, 'authors.ini', '[juan]\nemail = j@x\n')
+
+        self.write(self.srcdir, 'index.html', '{{ data.site.name }}')
+        self.write(self.srcdir, 'menu.html',
+                   '{% for i in data.menu.main %}{{ i.title }}{% endfor %}'
+                   '{{ data.authors.juan.email }}')
+        self.write(self.srcdir, 'plain.html', 'Plain')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=os.path.join(self.root, 'build'))
+        self.proj.config['DATA_PATH'] = self.datadir
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, path, name, content):
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.root, 'build', name)) as f:
+            return f.read()
+
+    def test_build(self):
+        self.proj.build()
+
+        self.assertEquals('Folio', self.read('index.html'))
+        self.assertEquals('Homej@x', self.read('menu.html'))
+
+    def test_dependencies(self):
+        self.proj.build()
+
+        site = os.path.join(self.datadir, 'site.json')
+        self.assertEquals(set([site]), self.proj.dependencies['index.html'])
+        self.assertEquals(2, len(self.proj.dependencies['menu.html']))
+        self.assertNotIn('plain.html', self.proj.dependencies)
+
+    def test_parse_once(self):
+        self.proj.add_context('*', lambda env: {
+            'name': env.globals['data'].site['name']})
+        self.proj.build()
+        self.assertEquals(3, self.proj.data.parses)
+
+        self.proj.build()
+        self.assertEquals(3, self.proj.data.parses)
+
+        self.write(self.datadir, 'site.json', '{"name": "Changed"}')
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.datadir, 'site.json'), (mtime, mtime))
+
+        self.proj.build()
+        self.assertEquals(4, self.proj.data.parses)
+        self.assertEquals('Changed', self.read('index.html'))
+
+        context_deps = self.proj.dependencies['plain.html']
+        self.assertEquals(1, len(context_deps))
+
+    def test_missing(self):
+        self.proj.init_config()
+        data = self.proj.env.globals['data']
+
+        self.assertNotIn('nothing', data)
+        self.assertEquals(['authors', 'menu', 'site'], list(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
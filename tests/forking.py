@@ -0,0 +1,146 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from jinja2.utils import LRUCache
+
+import folio
+
+from folio.builders import Wrapper, static_builder, template_builder
+from folio.forking import ForkedBuild, can_fork
+
+
+class ForkedBuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(self.srcdir)
+
+        self.write('_layout.html', '<{% block body %}{% endblock %}>')
+        self.write('_wrap.html', '[{{ content }}]')
+        self.pages = ['page%d.html' % i for i in range(8)]
+        for name in self.pages:
+            self.write(name, '{% extends "_layout.html" %}'
+                             '{% block body %}{{ pid }}{% endblock %}')
+        self.write('notes.txt', 'Notes')
+        self.write('style.css', 'body {}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+        self.proj.config['BUILD_FORKS'] = 3
+        self.proj.logger.disabled = True
+        self.proj.add_builder('*', static_builder)
+        self.proj.add_builder('*.html', template_builder)
+        self.proj.add_builder('*.txt', Wrapper('_wrap.html'))
+
+        @self.proj.context('*.html')
+        def pid(env):
+            return {'pid': os.getpid()}
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(filename) + 10
+        os.utime(filename, (mtime, mtime))
+
+    def read(self, name):
+        with open(os.path.join(self.builddir, name)) as f:
+            return f.read()
+
+    def test_warm(self):
+        self.proj.init_config()
+        templates = self.proj.list_templates()
+        run = ForkedBuild(self.proj, templates, 3)
+        run.warm()
+
+        self.assertEquals(sorted(self.pages + ['_layout.html',
+                                               '_wrap.html']),
+                          sorted(run.compiled))
+        self.assertEquals('_layout.html', run.compiled[-1])
+        self.assertEquals(sorted(templates), sorted(run.contexts))
+        self.assertEquals(3, len(run.slices))
+        self.assertEquals(sorted(templates),
+                          sorted(sum(run.slices, [])))
+
+    def test_warm_cache(self):
+        self.proj.init_config()
+        env = self.proj.env
+        env.cache = LRUCache(2)
+        parsed = []
+        parse = env.parse
+        env.parse = lambda source, name=None, filename=None: \
+            parsed.append(name) or parse(source, name, filename)
+
+        run = ForkedBuild(self.proj, self.proj.list_templates(), 3)
+        run.warm()
+
+        # Every template is parsed once and none is evicted.
+        self.assertEquals(sorted(run.compiled), sorted(parsed))
+        self.assertEquals(sorted(run.compiled),
+                          sorted(key[1] for key in env.cache.keys()))
+        self.assertTrue(env.cache.capacity >= len(run.compiled))
+
+    @unittest.skipIf(not can_fork(), 'fork is not available')
+    def test_build(self):
+        builded = self.proj.build()
+        self.assertEquals(10, len(builded))
+
+        # The contexts are resolved in the project process.
+        for name in self.pages:
+            self.assertEquals('<%d>' % os.getpid(), self.read(name))
+        self.assertEquals('[Notes]', self.read('notes.html'))
+
+        # The records and dependencies come back from the workers.
+        layout = os.path.join(self.srcdir, '_layout.html')
+        self.assertEquals(10, len(self.proj.manifest))
+        self.assertEquals(set([layout]),
+                          self.proj.dependencies['page0.html'])
+        self.assertEquals(0, len(self.proj.build(incremental=True)))
+
+        self.write('_layout.html', '({% block body %}{% endblock %})')
+        builded = self.proj.build(incremental=True)
+        self.assertEquals(8, len(builded))
+        self.assertEquals('(%d)' % os.getpid(), self.read('page0.html'))
+
+    @unittest.skipIf(not can_fork(), 'fork is not available')
+    def test_merge(self):
+        data = os.path.join(self.srcdir, 'data.txt')
+        self.write('data.txt', 'Data')
+
+        @self.proj.context('page0.html')
+        def read_data(env):
+            self.proj.add_dependency(data)
+            return {}
+
+        # A template that fails doesn't stop the others. The failures and
+        # the profiler spans of the workers are merged.
+        self.write('page1.html', '{{ missing.attr.other }}')
+        profiler = self.proj.profile()
+        builded = self.proj.build()
+
+        self.assertEquals(10, len(builded))
+        self.assertEquals([('page1.html', 'error')],
+                          [(f.template_name, f.reason)
+                           for f in self.proj.failures])
+        self.assertTrue('UndefinedError' in self.proj.failures[0].error)
+        self.assertEquals(sorted(self.proj.list_templates()),
+                          sorted(name for name, _, _ in profiler.templates()))
+        self.assertTrue(data in self.proj.dependencies['page0.html'])
+
+    def test_output(self):
+        self.proj.output = folio.output.MemoryOutput()
+        self.assertRaises(ValueError, self.proj.build)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from jinja2 import Environment, DictLoader, FileSystemLoader
+
+import folio
+from folio.ext.fragcache import FragmentCache, FragmentCacheExtension
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+
+    def test_lru(self):
+        cache = FragmentCache(size=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+
+        self.assertEquals('1', cache.get('a'))
+        self.assertEquals(None, cache.get('b'))
+        self.assertEquals(2, len(cache))
+
+    def test_save_load(self):
+        tmpdir = mkdtemp()
+        path = os.path.join(tmpdir, 'fragments.json')
+
+        cache = FragmentCache(path=path)
+        cache.set('a', '1')
+        cache.save()
+
+        cache = FragmentCache(path=path)
+        cache.load()
+        self.assertEquals('1', cache.get('a'))
+
+        rmtree(tmpdir)
+
+
+class FragmentCacheExtensionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.env = Environment(loader=DictLoader({
+            'page.html': '{% cache "nav", section %}'
+                         '{{ count() }}{% endcache %}',
+            'other.html': '{% cache "nav", section %}'
+                          '{{ count() }}!{% endcache %}',
+        }), extensions=[FragmentCacheExtension])
+        self.env.globals['count'] = self.count
+
+    def count(self):
+        self.calls.append(True)
+        return len(self.calls)
+
+    def render(self, name, **context):
+        return self.env.get_template(name).render(**context)
+
+    def test_cache(self):
+        self.assertEquals('1', self.render('page.html', section='a'))
+        self.assertEquals('1', self.render('page.html', section='a'))
+        self.assertEquals(1, self.env.fragment_cache.hits)
+
+    def test_dependencies(self):
+        self.assertEquals('1', self.render('page.html', section='a'))
+        self.assertEquals('2', self.render('page.html', section='b'))
+
+    def test_source_hash(self):
+        self.assertEquals('1', self.render('page.html', section='a'))
+        self.assertEquals('2!', self.render('other.html', section='a'))
+
+    def test_included_templates(self):
+        tmpdir = mkdtemp()
+        nav = os.path.join(tmpdir, 'nav.html')
+        with open(nav, 'w') as f:
+            f.write('a')
+        with open(os.path.join(tmpdir, 'page.html'), 'w') as f:
+            f.write('{% cache "nav" %}{% include "nav.html" %}{% endcache %}')
+
+        env = Environment(loader=FileSystemLoader(tmpdir),
+                          extensions=[FragmentCacheExtension])
+        self.assertEquals('a', env.get_template('page.html').render())
+
+        with open(nav, 'w') as f:
+            f.write('bb')
+        self.assertEquals('bb', env.get_template('page.html').render())
+        self.assertEquals(0, env.fragment_cache.hits)
+
+        rmtree(tmpdir)
+
+    def test_replay_dependencies(self):
+        tmpdir = mkdtemp()
+        srcdir = os.path.join(tmpdir, 'src')
+        os.mkdir(srcdir)
+        nav = os.path.join(srcdir, '_nav.html')
+        with open(nav, 'w') as f:
+            f.write('a')
+        for name in ('a.html', 'b.html'):
+            with open(os.path.join(srcdir, name), 'w') as f:
+                f.write('{% cache "nav" %}{% include "_nav.html" %}'
+                        '{% endcache %}')
+
+        proj = folio.Folio(__name__, source_path=srcdir,
+                           build_path=os.path.join(tmpdir, 'build'),
+                           extensions=['fragcache'])
+        proj.config['FRAGMENT_CACHE_PATH'] = os.path.join(tmpdir,
+                                                          'fragments.json')
+        proj.build()
+
+        # The second page reuses the fragment, and depends on the include.
+        self.assertEquals(1, proj.env.fragment_cache.hits)
+        self.assertEquals(set([nav]), proj.dependencies['a.html'])
+        self.assertEquals(set([nav]), proj.dependencies['b.html'])
+
+        with open(nav, 'w') as f:
+            f.write('bb')
+        proj.build()
+
+        with open(os.path.join(tmpdir, 'build', 'b.html')) as f:
+            self.assertEquals('bb', f.read())
+
+        rmtree(tmpdir)
+
+    def test_register(self):
+        outdir = mkdtemp()
+
+        proj = folio.Folio(__name__, source_path=outdir, build_path=outdir,
+                           extensions=['fragcache'])
+        proj.config['FRAGMENT_CACHE_SIZE'] = 10
+        proj.build()
+
+        self.assertEquals(10, proj.env.fragment_cache.size)
+
+        rmtree(outdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
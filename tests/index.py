@@ -0,0 +1,137 @@
+from __future__ import with_statement
+
+import os
+import time
+import datetime
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+from folio.index import read_front_matter, strip_front_matter
+
+
+class FrontMatterTestCase(unittest.TestCase):
+
+    def test_read_front_matter(self):
+        tmpdir = mkdtemp()
+        filename = os.path.join(tmpdir, 'page.html')
+        with open(filename, 'w') as f:
+            f.write('---\ntitle: Hello\ndate: 2013-02-28\n'
+                    'tags: [a, b]\ndraft: false\n---\nBody')
+
+        meta = read_front_matter(filename)
+        self.assertEquals({'title': 'Hello',
+                           'date': datetime.date(2013, 2, 28),
+                           'tags': ['a', 'b'], 'draft': False}, meta)
+
+        rmtree(tmpdir)
+
+    def test_non_ascii_first_line(self):
+        tmpdir = mkdtemp()
+        filename = os.path.join(tmpdir, 'page.html')
+        with open(filename, 'wb') as f:
+            f.write(u'<p>Hola mundo, \xf1or</p>\n'.encode('utf-8'))
+
+        # The first line is cut in the middle of a character.
+        self.assertEquals({}, read_front_matter(filename))
+
+        rmtree(tmpdir)
+
+    def test_strip_front_matter(self):
+        self.assertEquals('\n\n\nBody', strip_front_matter('---\na: 1\n---\n'
+                                                           'Body'))
+        self.assertEquals('---\nBody', strip_front_matter('---\nBody'))
+        self.assertEquals('Body', strip_front_matter('Body'))
+
+
+class ContentIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srcdir = mkdtemp()
+        self.outdir = mkdtemp()
+
+        self.write('blog/one.html', 'title: One\ndate: 2013-01-01\n'
+                                    'tags: [a]', 'One')
+        self.write('blog/two.html', 'title: Two\ndate: 2013-02-01\n'
+                                    'tags: [a, b]', 'Two')
+        self.write('index.html', None,
+                   '{% for e in index.filter("blog/*").order_by("-date") %}'
+                   '{{ e.title }}{% endfor %}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.outdir)
+        self.proj.config['INDEX_PATTERNS'] = ['*.html']
+
+    def tearDown(self):
+        rmtree(self.srcdir)
+        rmtree(self.outdir)
+
+    def write(self, name, meta, body):
+        filename = os.path.join(self.srcdir, name)
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            if meta is not None:
+                f.write('---\n%s\n---\n' % meta)
+            f.write(body)
+
+    def read(self, name):
+        with open(os.path.join(self.outdir, name)) as f:
+            return f.read()
+
+    def test_build(self):
+        self.proj.build()
+
+        self.assertEquals('TwoOne', self.read('index.html'))
+        self.assertEquals('\n\n\n\n\nOne', self.read('blog/one.html'))
+
+    def test_query(self):
+        self.proj.build()
+        index = self.proj.index
+
+        self.assertEquals(3, len(index))
+        self.assertEquals(['blog/two.html'],
+                          [e.name for e in index.filter(tag='b')])
+        self.assertEquals(2, len(index.tags()['a']))
+        self.assertEquals('blog/one.html', index.order_by('date')[0].name)
+        self.assertEquals('index.html', index.order_by('date')[-1].name)
+        self.assertEquals(['blog/two.html'],
+                          [e.name for e in index.all().paginate(2, 1)])
+
+    def test_mixed_dates(self):
+        self.write('blog/three.html', 'title: Three\ndate: 2013-01-15 10:30',
+                   'Three')
+        self.proj.build()
+        index = self.proj.index
+
+        self.assertEquals(['blog/two.html', 'blog/three.html',
+                           'blog/one.html'],
+                          [e.name for e in index.filter('blog/*')
+                           .order_by('-date')])
+        self.assertEquals(['blog/three.html'],
+                          [e.name for e in index.filter(
+                              since=datetime.datetime(2013, 1, 2),
+                              until=datetime.date(2013, 2, 1))])
+
+    def test_update(self):
+        self.proj.build()
+        entry = self.proj.index.get('blog/two.html')
+
+        self.proj.index.scan()
+        self.assertIs(entry, self.proj.index.get('blog/two.html'))
+
+        self.write('blog/two.html', 'title: Three', 'Three')
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.srcdir, 'blog/two.html'), (mtime, mtime))
+        os.remove(os.path.join(self.srcdir, 'blog/one.html'))
+
+        self.proj.index.update(['blog/one.html', 'blog/two.html'])
+
+        self.assertEquals('Three', self.proj.index.get('blog/two.html').title)
+        self.assertNotIn('blog/one.html', self.proj.index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from __future__ import with_statement
+
+import os
+import time
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+
+class IsolatedBuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(self.srcdir)
+
+        self.write('_layout.html', '<{% block body %}{% endblock %}>')
+        for name in ('index.html', 'about.html', 'slow.html', 'error.html'):
+            self.write(name, '{% extends "_layout.html" %}'
+                             '{% block body %}{{ name }}{% endblock %}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+        self.proj.config['BUILD_TIMEOUT'] = 1
+        self.proj.config['BUILD_WORKERS'] = 2
+        self.proj.logger.disabled = True
+
+        @self.proj.context('*.html')
+        def name(env):
+            return {'name': 'Folio'}
+
+        @self.proj.context('slow.html')
+        def slow(env):
+            time.sleep(10)
+            return {}
+
+        @self.proj.context('error.html')
+        def error(env):
+            raise ValueError('broken')
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def test_build(self):
+        start = time.time()
+        builded = self.proj.build()
+        self.assertTrue(time.time() - start < 5)
+
+        self.assertEquals(['about.html', 'index.html'],
+                          sorted(os.path.basename(dst)
+                                 for _, dst, _ in builded))
+        with open(os.path.join(self.builddir, 'index.html')) as f:
+            self.assertEquals('<Folio>', f.read())
+
+        failures = dict((failure.template_name, failure)
+                        for failure in self.proj.failures)
+        self.assertEquals(['error.html', 'slow.html'], sorted(failures))
+
+        slow = failures['slow.html']
+        self.assertEquals('timeout', slow.reason)
+        self.assertEquals(['template', 'context', 'provider:slow'],
+                          slow.running)
+        self.assertTrue(slow.timings['provider:slow'] >= 1)
+        self.assertIn('provider:name', slow.timings)
+
+        error = failures['error.html']
+        self.assertEquals('error', error.reason)
+        self.assertEquals('ValueError: broken', error.error)
+
+    def test_dependencies(self):
+        self.proj.build()
+        layout = os.path.join(self.srcdir, '_layout.html')
+        self.assertEquals(set([layout]), self.proj.dependencies['index.html'])
+        self.assertIn('index.html', self.proj.manifest)
+
+        # The templates built by the workers are fresh in the parent.
+        self.proj.config['BUILD_TIMEOUT'] = None
+        self.proj.config['BUILD_WORKERS'] = 0
+        self.proj.contexts = self.proj.contexts[:1]
+        builded = self.proj.build(incremental=True)
+        self.assertEquals(['error.html', 'slow.html'],
+                          sorted(os.path.basename(dst)
+                                 for _, dst, _ in builded))
+        self.assertEquals([], self.proj.failures)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.linkcheck import LinkChecker, extract_links, resolve
+
+
+class LinksTestCase(unittest.TestCase):
+
+    def test_extract_links(self):
+        html = (b'<a href="a.html">A</a><img  src=\'b.png\'>'
+                b'<!-- <a href="c.html"> --><link rel=x href=d.css>'
+                b'<div data-src="e.png"></div>')
+        self.assertEquals(['a.html', 'b.png', 'd.css'], extract_links(html))
+
+    def test_resolve(self):
+        self.assertEquals('blog/a.html', resolve('a.html', 'blog/b.html'))
+        self.assertEquals('a.html', resolve('../a.html#top', 'blog/b.html'))
+        self.assertEquals('a.html', resolve('/a.html?q=1', 'blog/b.html'))
+        self.assertEquals('blog/index.html', resolve('./', 'blog/b.html'))
+        self.assertEquals('index.html', resolve('/', 'blog/b.html'))
+        self.assertEquals('a b.html', resolve('a%20b.html', 'index.html'))
+        self.assertEquals('../a.html', resolve('../a.html', 'index.html'))
+        for url in ['#top', 'http://example.com/', '//cdn.example.com/x.js',
+                    'mailto:a@example.com', 'data:image/png;base64,xx', '']:
+            self.assertEquals(None, resolve(url, 'index.html'))
+
+
+class LinkCheckTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        os.makedirs(os.path.join(self.srcdir, 'blog'))
+
+        self.write('index.html', '<a href="blog/">Blog</a>'
+                                 '<a href="/about.html">About</a>'
+                                 '<img src="logo.png">')
+        self.write('blog/index.html', '<a href="../index.html">Home</a>'
+                                      '<a href="../missing.html">?</a>')
+        self.write('logo.png', '')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=os.path.join(self.root, 'build'))
+        self.proj.logger.disabled = True
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(filename) + 10
+        os.utime(filename, (mtime, mtime))
+
+    def test_check(self):
+        self.proj.config['LINK_CHECK'] = True
+        self.proj.build()
+
+        report = self.proj.link_report
+        self.assertEquals(2, report.pages)
+        self.assertEquals(2, report.parsed)
+        self.assertEquals(5, report.links)
+        self.assertEquals({'index.html': ['/about.html'],
+                           'blog/index.html': ['../missing.html']},
+                          report.by_template())
+        self.assertEquals('2 broken links in 2 of 2 pages\n'
+                          'blog/index.html: ../missing.html\n'
+                          'index.html: /about.html', str(report))
+
+        # Only the new page is parsed, the links to it are fixed.
+        self.write('about.html', '<a href="index.html">Home</a>')
+        self.proj.build(incremental=True)
+        report = self.proj.link_report
+        self.assertEquals((3, 1), (report.pages, report.parsed))
+        self.assertEquals(['../missing.html'],
+                          [link.url for link in report.broken])
+
+        # The links to a removed page are broken again.
+        os.remove(os.path.join(self.srcdir, 'about.html'))
+        self.proj.build(incremental=True)
+        self.assertEquals(['../missing.html', '/about.html'],
+                          sorted(link.url for link
+                                 in self.proj.link_report.broken))
+
+    def test_workers(self):
+        for n in range(60):
+            self.write('page%d.html' % n, '<a href="page%d.html">x</a>'
+                                          % (n + 1))
+        self.proj.build()
+
+        checker = LinkChecker(self.proj, workers=2)
+        report = checker.check()
+        self.assertEquals(62, report.parsed)
+        self.assertEquals(['../missing.html', '/about.html', 'page60.html'],
+                          sorted(link.url for link in report.broken))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.manifest import Manifest
+
+
+class IncrementalBuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(self.srcdir)
+
+        self.write('_layout.html', '<{% block body %}{% endblock %}>')
+        self.write('index.html', '{% extends "_layout.html" %}'
+                                 '{% block body %}Index{% endblock %}')
+        self.write('about.html', 'About')
+        self.write('style.css', 'body {}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        # Make sure the modification time changes.
+        mtime = os.path.getmtime(filename) if os.path.exists(filename) \
+            else None
+        with open(filename, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(filename, (mtime + 1, mtime + 1))
+
+    def built(self, builded):
+        return sorted(os.path.relpath(dst, self.builddir)
+                      for _, dst, _ in builded)
+
+    def test_noop(self):
+        self.assertEquals(3, len(self.proj.build(incremental=True)))
+        self.assertEquals([], self.built(self.proj.build(incremental=True)))
+        self.assertEquals(3, len(self.proj.manifest))
+
+    def test_modified_source(self):
+        self.proj.build()
+        self.write('about.html', 'About us')
+        self.assertEquals(['about.html'],
+                          self.built(self.proj.build(incremental=True)))
+
+    def test_modified_layout(self):
+        self.proj.build()
+        self.assertEquals(set([os.path.join(self.srcdir, '_layout.html')]),
+                          self.proj.dependencies['index.html'])
+
+        self.write('_layout.html', '[{% block body %}{% endblock %}]')
+        self.assertEquals(['index.html'],
+                          self.built(self.proj.build(incremental=True)))
+        with open(os.path.join(self.builddir, 'index.html')) as f:
+            self.assertEquals('[Index]', f.read())
+
+        # The dependencies of the skipped templates are kept.
+        self.proj.build(incremental=True)
+        self.assertIn('index.html', self.proj.dependencies)
+
+    def test_missing_output(self):
+        self.proj.build()
+        os.remove(os.path.join(self.builddir, 'style.css'))
+        self.assertEquals(['style.css'],
+                          self.built(self.proj.build(incremental=True)))
+
+    def test_removed_source(self):
+        self.proj.build()
+        os.remove(os.path.join(self.srcdir, 'about.html'))
+        self.proj.build(incremental=True)
+        self.assertNotIn('about.html', self.proj.manifest)
+
+    def test_new_builder(self):
+        self.proj.build()
+        self.proj.add_builder('*.css', lambda *args: None)
+        self.assertEquals(['style.css'],
+                          self.built(self.proj.build(incremental=True)))
+
+    def test_index_dependency(self):
+        self.proj.config['INDEX_PATTERNS'] = ['posts/*']
+        os.makedirs(os.path.join(self.srcdir, 'posts'))
+        self.write('posts/a.html', '---\ntitle: A\n---\nA')
+        self.write('list.html', '{% for e in index.all() %}'
+                                '{{ e.title }}{% endfor %}')
+        self.proj.build()
+
+        self.write('posts/b.html', '---\ntitle: B\n---\nB')
+        # The directory modification time may not change in the same second.
+        posts = os.path.join(self.srcdir, 'posts')
+        mtime = os.path.getmtime(posts) + 1
+        os.utime(posts, (mtime, mtime))
+        self.assertEquals(['list.html', 'posts/b.html'],
+                          self.built(self.proj.build(incremental=True)))
+
+
+class ManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.src = os.path.join(self.root, 'index.html')
+        with open(self.src, 'w') as f:
+            f.write('Index')
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_save_load(self):
+        path = os.path.join(self.root, 'manifest.json')
+        manifest = Manifest(path)
+        manifest.record('index.html', self.src, 'builder', [self.src])
+        manifest.save()
+
+        loaded = Manifest(path)
+        loaded.load()
+        self.assertTrue(loaded.is_fresh('index.html', self.src, 'builder'))
+        self.assertFalse(loaded.is_fresh('index.html', self.src, 'other'))
+
+    def test_corrupted(self):
+        path = os.path.join(self.root, 'manifest.json')
+        with open(path, 'w') as f:
+            f.write('{')
+        manifest = Manifest(path)
+        manifest.load()
+        self.assertEquals(0, len(manifest))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.ext.mdwnbuilder import MarkdownBuilder, available
+
+
+@unittest.skipIf(not available, 'markdown is not installed')
+class MarkdownBuilderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srcdir = mkdtemp()
+        self.outdir = mkdtemp()
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.outdir)
+        self.proj.add_builder('*.md', MarkdownBuilder('_page.html'))
+
+    def tearDown(self):
+        rmtree(self.srcdir)
+        rmtree(self.outdir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.outdir, name)) as f:
+            return f.read()
+
+    def test_references(self):
+        self.write('_page.html', '{{ content }}')
+        self.write('a.md', '[one][x]\n\n[x]: http://a.example.com/\n')
+        self.write('b.md', '[two][x]\n')
+
+        builder = self.proj.get_builder('a.md')
+        env = self.proj.env
+        builder(env, 'a.md', {}, os.path.join(self.srcdir, 'a.md'),
+                os.path.join(self.outdir, 'a.html'), 'utf-8')
+        builder(env, 'b.md', {}, os.path.join(self.srcdir, 'b.md'),
+                os.path.join(self.outdir, 'b.html'), 'utf-8')
+
+        self.assertEquals('<p><a href="http://a.example.com/">one</a></p>',
+                          self.read('a.html'))
+
+        # The references of the first page are not seen by the second one.
+        self.assertEquals('<p>[two][x]</p>', self.read('b.html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
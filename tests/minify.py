@@ -0,0 +1,98 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.minify import Minifier, minify_css, minify_html
+
+
+class MinifyTestCase(unittest.TestCase):
+
+    def test_html(self):
+        html = ('<div  class="a  b" >\n  <!-- x -->\n  <p>Hello,\n'
+                '   world  !</p>\n</div>')
+        self.assertEquals('<div class="a  b">\n<p>Hello,\nworld !</p>\n'
+                          '</div>', minify_html(html))
+
+    def test_html_raw(self):
+        html = ('<pre>  a\n  b </pre> <textarea> c  </textarea>'
+                '<script>var a  =  "<b>";</script>'
+                '<!--[if IE]> <p> <![endif]-->')
+        self.assertEquals(html, minify_html(html))
+
+    def test_html_style(self):
+        self.assertEquals('<style media="all">a{color:red}</style>',
+                          minify_html('<style media="all">\n a {\n'
+                                      '   color:red;\n }\n</style>'))
+
+    def test_css(self):
+        css = ('/*! License */\na , b > c {\n  color:red ;\n'
+               '  width: calc(1px + 2px) /* x */ ;\n}\n'
+               'div /* x */ p { content: "a  ;  b"; }\n')
+        self.assertEquals('/*! License */ a,b>c{color:red;'
+                          'width: calc(1px + 2px)}div p{content: "a  ;  b"}',
+                          minify_css(css))
+
+    def test_cache(self):
+        minifier = Minifier()
+        data = b'a  {  color:red; }'
+        self.assertEquals(b'a{color:red}',
+                          minifier(None, 'a.css', '/a.css', data))
+        self.assertEquals(b'a{color:red}',
+                          minifier(None, 'b.css', '/b.css', data))
+        self.assertEquals((1, 1), (minifier.misses, minifier.hits))
+        self.assertEquals(data, minifier(None, 'a.js', '/a.js', data))
+
+    def test_cache_path(self):
+        root = mkdtemp()
+        self.addCleanup(rmtree, root)
+
+        data = '<p>  caf\xe9  </p>'.encode('utf-8')
+        minifier = Minifier(root)
+        self.assertEquals('<p> caf\xe9 </p>'.encode('utf-8'),
+                          minifier(None, 'a.html', '/a.html', data))
+
+        minifier = Minifier(root)
+        minifier(None, 'a.html', '/a.html', data)
+        self.assertEquals((0, 1), (minifier.misses, minifier.hits))
+
+
+class MinifyBuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(self.srcdir)
+
+        for name, content in [('index.html', '<p>\n  {{ 1 }}  </p>'),
+                              ('style.css', 'a {  color: red; }'),
+                              ('other.html', '<p>  x  </p>')]:
+            with open(os.path.join(self.srcdir, name), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def read(self, name):
+        with open(os.path.join(self.builddir, name)) as f:
+            return f.read()
+
+    def test_build(self):
+        proj = folio.Folio(__name__, source_path=self.srcdir,
+                           build_path=self.builddir)
+        proj.config['MINIFY_PATTERNS'] = ['index.html', '*.css']
+        proj.build()
+
+        self.assertEquals('<p>\n1 </p>', self.read('index.html'))
+        self.assertEquals('a{color: red}', self.read('style.css'))
+        self.assertEquals('<p>  x  </p>', self.read('other.html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+from __future__ import with_statement
+
+import os
+import tarfile
+import zipfile
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.builders import Paginator, static_builder, template_builder
+from folio.output import ArchiveOutput, MemoryOutput
+
+
+class OutputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(os.path.join(self.srcdir, 'static'))
+
+        self.write('index.html', 'Hello {{ 1 + 1 }}')
+        self.write('archive.html', '{{ page.number }}')
+        self.write('static/style.css', 'body {}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+        self.proj.add_builder('*', static_builder)
+        self.proj.add_builder('*.html', template_builder)
+        self.proj.add_builder('archive.html', Paginator(per_page=1))
+        self.proj.add_context('archive.html', {'items': [1, 2]})
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    expected = {
+        'index.html': b'Hello 2',
+        'archive.html': b'1',
+        'archive/2.html': b'2',
+        'static/style.css': b'body {}',
+    }
+
+    def test_memory(self):
+        self.proj.output = output = MemoryOutput()
+        builded = self.proj.build()
+
+        self.assertEquals(4, len(builded))
+        self.assertEquals(self.expected, output.files)
+        self.assertFalse(os.path.exists(self.builddir))
+
+        self.assertEquals(set(), self.proj.build(incremental=True))
+
+        self.write('index.html', 'Bye')
+        self.proj.build(incremental=True)
+        self.assertEquals(b'Bye', output.get('index.html'))
+
+    def test_memory_template(self):
+        self.proj.output = output = MemoryOutput()
+        self.proj.init_config()
+        self.proj.build_template('index.html')
+        self.assertEquals({'index.html': b'Hello 2'}, output.files)
+
+    def test_tar(self):
+        path = os.path.join(self.root, 'site.tar.gz')
+        self.proj.output = ArchiveOutput(path)
+        self.proj.build()
+
+        self.assertFalse(os.path.exists(self.builddir))
+        with tarfile.open(path) as tar:
+            files = dict((name, tar.extractfile(name).read())
+                         for name in tar.getnames())
+        self.assertEquals(self.expected, files)
+
+    def test_zip(self):
+        path = os.path.join(self.root, 'site.zip')
+        self.proj.output = ArchiveOutput(path)
+        self.proj.build()
+
+        with zipfile.ZipFile(path) as archive:
+            files = dict((name, archive.read(name))
+                         for name in archive.namelist())
+        self.assertEquals(self.expected, files)
+
+    def test_before_build_error(self):
+        path = os.path.join(self.root, 'site.zip')
+        self.proj.output = output = ArchiveOutput(path)
+
+        @self.proj.before_build
+        def broken(proj):
+            raise ValueError('broken')
+
+        self.assertRaises(ValueError, self.proj.build)
+
+        # The archive is closed, and it's valid.
+        self.assertEquals(None, output.archive)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEquals([], archive.namelist())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, ArchiveOutput, 'site.rar')
+        self.assertRaises(ValueError, ArchiveOutput, 'site', 'rar')
+
+        self.proj.output = MemoryOutput()
+        self.proj.config['BUILD_WORKERS'] = 2
+        self.assertRaises(ValueError, self.proj.build)
+
+
+if __name__ == '__main__':
+    unittest.main()
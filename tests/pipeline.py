@@ -0,0 +1,91 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.builders import Paginator, Wrapper
+
+
+def upper(env, template_name, dst, data):
+    return data.upper()
+
+
+def exclaim(env, template_name, dst, data):
+    return data + b'!'
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(self.srcdir)
+
+        self.write('_wrap.html', '<{{ content }}>')
+        self.write('index.html', 'index')
+        self.write('style.css', 'body')
+        self.write('page.txt', 'page')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=self.builddir)
+        self.proj.init_config()
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.builddir, name)) as f:
+            return f.read()
+
+    def test_transforms(self):
+        self.proj.add_transform('*', upper)
+        self.proj.add_transform(['*.html', '*.css'], exclaim)
+        self.proj.build()
+
+        self.assertEquals('INDEX!', self.read('index.html'))
+        self.assertEquals('BODY!', self.read('style.css'))
+
+    def test_builder_transforms(self):
+        self.write('archive.html', '{{ page.number }}')
+        self.proj.add_builder('*.txt', Wrapper('_wrap.html'),
+                              transforms=[upper])
+        self.proj.add_builder('archive.html', Paginator(per_page=1),
+                              transforms=[exclaim])
+        self.proj.add_context('archive.html', {'items': [1, 2]})
+        self.proj.build()
+
+        self.assertEquals('<PAGE>', self.read('page.html'))
+        self.assertEquals('index', self.read('index.html'))
+        self.assertEquals('1!', self.read('archive.html'))
+        self.assertEquals('2!', self.read('archive/2.html'))
+
+    def test_order(self):
+        self.proj.add_transform('index.html', exclaim)
+        self.proj.add_transform('index.html', upper)
+        self.proj.build()
+        self.assertEquals('INDEX!', self.read('index.html'))
+
+    def test_incremental(self):
+        self.proj.build()
+        self.proj.add_transform('index.html', upper)
+        builded = self.proj.build(incremental=True)
+        self.assertEquals(['index.html'],
+                          [os.path.basename(dst) for _, dst, _ in builded])
+        self.assertEquals('INDEX', self.read('index.html'))
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, self.proj.add_transform, '*', None)
+
+
+if __name__ == '__main__':
+    unittest.main()
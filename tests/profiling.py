@@ -0,0 +1,100 @@
+from __future__ import with_statement
+
+import os
+import json
+import asyncio
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+import folio.profiling
+
+from tests import SOURCE_DIR
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = mkdtemp()
+        self.proj = folio.Folio(__name__, source_path=SOURCE_DIR,
+                                build_path=self.outdir)
+
+    def tearDown(self):
+        rmtree(self.outdir)
+
+    def test_disabled(self):
+        self.proj.build()
+
+        self.assertEquals(None, self.proj.profiler)
+        self.assertIs(folio.profiling.null_span,
+                      self.proj._span('template', 'helloworld.html'))
+
+    def test_profile(self):
+        calls = []
+        self.proj.add_context('*.html', lambda env: calls.append(1) or {})
+
+        profiler = self.proj.profile()
+        self.proj.build()
+
+        phases = set(span.phase for span in profiler.spans)
+        self.assertEquals(set(['template', 'lookup', 'context', 'provider',
+                               'compile', 'build']), phases)
+
+        templates = profiler.templates()
+        self.assertEquals(['helloworld.html'], [t[0] for t in templates])
+        self.assertIn('compile', templates[0][2])
+
+        self.assertEquals(1, profiler.contexts()[0][1])
+        self.assertIn('helloworld.html', profiler.report())
+
+    def test_async_provider(self):
+        @self.proj.context('*.html')
+        async def slow(env):
+            await asyncio.sleep(0.05)
+            return {}
+
+        profiler = self.proj.profile()
+        self.proj.build()
+
+        # The provider is measured while it's awaited.
+        spans = [span for span in profiler.spans if span.phase == 'provider']
+        self.assertEquals(['async'], [span.name for span in spans])
+        self.assertTrue(spans[0].wall >= 0.05)
+
+    def test_trace_memory(self):
+        profiler = self.proj.profile(trace_memory=True)
+        self.proj.build()
+
+        span = profiler.templates()[0][1]
+        self.assertTrue(span.peak > 0)
+
+        profiler.close()
+        self.assertFalse(folio.profiling.tracemalloc.is_tracing())
+        self.assertEquals(None, self.proj.profiler)
+
+    def test_builds(self):
+        profiler = self.proj.profile()
+        self.proj.build()
+        self.proj.build()
+
+        # Only the spans of the last build are kept.
+        self.assertEquals(1, len(profiler.templates()))
+
+    def test_dump_trace(self):
+        profiler = self.proj.profile()
+        self.proj.build()
+
+        filename = os.path.join(self.outdir, 'trace.json')
+        profiler.dump_trace(filename)
+
+        with open(filename) as f:
+            events = json.load(f)['traceEvents']
+
+        self.assertTrue(all(event['ph'] == 'X' for event in events))
+        self.assertEquals(len(profiler.spans), len(events))
+
+
+if __name__ == '__main__':
+    unittest.main()
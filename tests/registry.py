@@ -0,0 +1,113 @@
+from __future__ import with_statement
+
+import os
+import sys
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from folio.registry import ExtensionRegistry, default_cache_path
+
+
+class CountingRegistry(ExtensionRegistry):
+
+    scans = 0
+
+    def scan(self):
+        self.scans += 1
+        return ExtensionRegistry.scan(self)
+
+
+class ExtensionRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.path = os.path.join(self.root, 'modules')
+        os.makedirs(self.path)
+        self.write('folio_sample.py', 'NAME = "sample"\n')
+        sys.path.insert(0, self.path)
+
+        self.cache_path = os.path.join(self.root, 'cache', 'extensions.json')
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        sys.modules.pop('folio_sample', None)
+        sys.modules.pop('folio_other', None)
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.path, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def test_find(self):
+        registry = ExtensionRegistry()
+        self.assertEquals('folio.ext.themes', registry.find('themes'))
+        self.assertEquals('folio_sample', registry.find('sample'))
+        self.assertEquals(None, registry.find('missing'))
+
+    def test_builtin(self):
+        # The built-in extensions are found without scanning.
+        registry = CountingRegistry()
+        self.assertEquals('folio.ext.themes', registry.find('themes'))
+        self.assertEquals(None, registry.extensions)
+        self.assertEquals(0, registry.scans)
+
+        self.assertEquals('folio_sample', registry.find('sample'))
+        self.assertEquals(1, registry.scans)
+
+    def test_resolve(self):
+        registry = ExtensionRegistry()
+        self.assertEquals('sample', registry.resolve('sample').NAME)
+        self.assertRaises(LookupError, registry.resolve, 'missing')
+
+    def test_cache(self):
+        CountingRegistry(self.cache_path).find('other')
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        registry = CountingRegistry(self.cache_path)
+        self.assertEquals('folio_sample', registry.find('sample'))
+        self.assertEquals(0, registry.scans)
+
+        # A missing name is looked up again before giving up.
+        self.assertEquals(None, registry.find('missing'))
+        self.assertEquals(1, registry.scans)
+
+    def test_cache_outdated(self):
+        CountingRegistry(self.cache_path).find('other')
+
+        self.write('folio_other.py', '')
+        mtime = os.path.getmtime(self.path) + 1
+        os.utime(self.path, (mtime, mtime))
+
+        registry = CountingRegistry(self.cache_path)
+        self.assertEquals('folio_other', registry.find('other'))
+        self.assertEquals(1, registry.scans)
+
+    def test_cache_stale(self):
+        CountingRegistry(self.cache_path).find('other')
+
+        # The module is removed without changing the import path signature.
+        mtime = os.path.getmtime(self.path)
+        os.remove(os.path.join(self.path, 'folio_sample.py'))
+        os.utime(self.path, (mtime, mtime))
+
+        registry = CountingRegistry(self.cache_path)
+        self.assertRaises(LookupError, registry.resolve, 'sample')
+        self.assertEquals(1, registry.scans)
+
+    def test_default_cache_path(self):
+        environ = dict(os.environ)
+        try:
+            os.environ.pop('FOLIO_EXTENSIONS_CACHE', None)
+            self.assertEquals(None, default_cache_path())
+            os.environ['FOLIO_EXTENSIONS_CACHE'] = self.cache_path
+            self.assertEquals(self.cache_path, default_cache_path())
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+from __future__ import with_statement
+
+import os
+import json
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.search import extract_text, tokenize
+
+
+class TokenizeTestCase(unittest.TestCase):
+
+    def test_extract_text(self):
+        html = ('<html><head><title>A &amp; B</title>'
+                '<style>p { color: red }</style></head>'
+                '<body><p>Hello<br>world</p><!-- hidden -->'
+                '<script>var x = 1;</script></body></html>')
+        title, text = extract_text(html)
+        self.assertEquals('A & B', title)
+        self.assertEquals(['hello', 'world'], sorted(tokenize(text)))
+
+    def test_tokenize(self):
+        self.assertEquals({'the': 2, 'cat': 1, 'café': 1},
+                          tokenize(u'The cat, the CAFÉ. A'))
+
+
+class SearchIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(os.path.join(self.srcdir, 'blog'))
+
+        self.write('index.html', '<title>Home</title><p>Hello folio</p>')
+        self.write('blog/post.html', '<title>Post</title>'
+                                     '<p>Folio builds folio sites</p>')
+        self.write('style.css', 'p { color: red }')
+
+        self.proj = self.project()
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def project(self, **config):
+        proj = folio.Folio(__name__, source_path=self.srcdir,
+                           build_path=self.builddir)
+        proj.logger.disabled = True
+        proj.config['SEARCH_PATTERNS'] = ['*.html']
+        proj.config.update(config)
+        return proj
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(filename) + 10
+        os.utime(filename, (mtime, mtime))
+
+    def read(self, name):
+        with open(os.path.join(self.builddir, name)) as f:
+            return json.load(f)
+
+    def test_index(self):
+        self.proj.build()
+
+        index = self.read('search.json')
+        self.assertEquals(1, index['version'])
+        self.assertEquals([['blog/post.html', 'Post'],
+                           ['index.html', 'Home']], index['docs'])
+        self.assertEquals({'builds': [0, 1], 'folio': [0, 2, 1, 1],
+                           'hello': [1, 1], 'sites': [0, 1]},
+                          index['terms'])
+
+        # The index is an output of the build.
+        record = self.proj.manifest.records['<folio.search>/search.json']
+        self.assertEquals([os.path.join(self.builddir, 'search.json')],
+                          record.outputs)
+
+    def test_incremental(self):
+        self.proj.build()
+        indexer = self.proj.search_index
+
+        self.write('index.html', '<title>Home</title><p>Goodbye folio</p>')
+        self.proj.build(incremental=True)
+        self.assertEquals(set(['index.html']), indexer.updated)
+        index = self.read('search.json')
+        self.assertEquals([['blog/post.html', 'Post'],
+                           ['index.html', 'Home']], index['docs'])
+        self.assertEquals([1, 1], index['terms']['goodbye'])
+        self.assertFalse('hello' in index['terms'])
+
+        # The removed pages are null, their ids are reused.
+        os.remove(os.path.join(self.srcdir, 'blog', 'post.html'))
+        self.proj.build(incremental=True)
+        self.assertEquals([None, ['index.html', 'Home']],
+                          self.read('search.json')['docs'])
+
+        self.write('about.html', '<title>About</title><p>About</p>')
+        self.proj.build(incremental=True)
+        self.assertEquals(set(['about.html']), indexer.updated)
+        self.assertEquals([['about.html', 'About'], ['index.html', 'Home']],
+                          self.read('search.json')['docs'])
+
+    def test_postings(self):
+        self.proj.build()
+        indexer = self.proj.search_index
+        updates = []
+        update_terms = indexer._update_terms
+        indexer._update_terms = lambda i, terms, add, changed: \
+            updates.append((i, add)) or update_terms(i, terms, add, changed)
+
+        # Only the postings of the page that was built are updated.
+        self.write('index.html', '<title>Home</title><p>Goodbye folio</p>')
+        self.proj.build(incremental=True)
+        self.assertEquals([(1, False), (1, True)], updates)
+        self.assertEquals({'builds': [0, 1], 'folio': [0, 2, 1, 1],
+                           'goodbye': [1, 1], 'sites': [0, 1]},
+                          self.read('search.json')['terms'])
+
+        # Nothing is written if no page changed.
+        os.utime(os.path.join(self.builddir, 'search.json'), (0, 0))
+        self.proj.build(incremental=True)
+        self.assertEquals(0, os.path.getmtime(
+            os.path.join(self.builddir, 'search.json')))
+
+    def test_chunks(self):
+        proj = self.project(SEARCH_CHUNKS=True)
+        proj.build()
+
+        index = self.read('search.json')
+        self.assertEquals({'b': 'search/b.json', 'f': 'search/f.json',
+                           'h': 'search/h.json', 's': 'search/s.json'},
+                          index['chunks'])
+        self.assertFalse('terms' in index)
+        self.assertEquals({'terms': {'folio': [0, 2, 1, 1]}},
+                          self.read('search/f.json'))
+
+        # Only the chunks that changed are written again.
+        chunks = os.path.join(self.builddir, 'search')
+        for name in os.listdir(chunks):
+            os.utime(os.path.join(chunks, name), (0, 0))
+        self.write('index.html', '<title>Home</title><p>Hello folio!</p>')
+        self.write('blog/post.html', '<title>Post</title>'
+                                     '<p>Folio builds sites</p>')
+        proj.build(incremental=True)
+        changed = sorted(name for name in os.listdir(chunks)
+                         if os.path.getmtime(os.path.join(chunks, name)))
+        self.assertEquals(['f.json'], changed)
+
+    def test_state(self):
+        config = dict(SEARCH_STATE_PATH=os.path.join(self.root, 'state.json'),
+                      MANIFEST_PATH=os.path.join(self.root, 'manifest.json'))
+        self.project(**config).build()
+
+        # A new process only tokenizes the pages it builds.
+        self.write('index.html', '<title>Home</title><p>Goodbye</p>')
+        proj = self.project(**config)
+        proj.build(incremental=True)
+        self.assertEquals(set(['index.html']), proj.search_index.updated)
+        self.assertEquals(['blog/post.html', 'index.html'],
+                          sorted(proj.search_index.pages))
+        self.assertEquals([1, 1], self.read('search.json')['terms']['goodbye'])
+
+
+if __name__ == '__main__':
+    unittest.main()
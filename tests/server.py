@@ -0,0 +1,113 @@
+from __future__ import with_statement
+
+import os
+import json
+import threading
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+try:
+    from urllib2 import HTTPError, urlopen
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+import folio
+
+from folio.minify import Minifier
+from folio.server import (FolioHTTPRequestHandler, FolioHTTPServer,
+                          Histogram, ServerStats)
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_add(self):
+        histogram = Histogram([1, 10])
+        for seconds in [0.0005, 0.001, 0.005, 0.5]:
+            histogram.add(seconds)
+
+        data = histogram.to_json()
+        self.assertEquals([[1, 2], [10, 1], [None, 1]], data['buckets'])
+        self.assertEquals(4, data['count'])
+        self.assertEquals(500.0, data['max_ms'])
+        self.assertEquals(126.625, data['mean_ms'])
+
+    def test_empty(self):
+        data = Histogram().to_json()
+        self.assertEquals(0, data['count'])
+        self.assertEquals(None, data['mean_ms'])
+        self.assertEquals(13, len(data['buckets']))
+
+
+class ServerStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        os.makedirs(self.srcdir)
+        with open(os.path.join(self.srcdir, 'index.html'), 'w') as f:
+            f.write('<p>  Index  </p>')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=os.path.join(self.root, 'build'))
+        self.proj.logger.disabled = True
+        self.proj.config['MINIFY_PATTERNS'] = ['*.html']
+        self.proj.build()
+
+        self.stats = ServerStats()
+        self.server = FolioHTTPServer(self.proj, ('127.0.0.1', 0),
+                                      FolioHTTPRequestHandler,
+                                      stats=self.stats)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        rmtree(self.root)
+
+    def get(self, path):
+        url = 'http://127.0.0.1:%d%s' % (self.server.server_address[1], path)
+        try:
+            f = urlopen(url, timeout=10)
+        except HTTPError as e:
+            e.close()
+            return e.code, None
+        try:
+            return f.getcode(), f.read()
+        finally:
+            f.close()
+
+    def test_stats(self):
+        self.assertEquals((200, b'<p> Index </p>'), self.get('/'))
+        self.assertEquals(404, self.get('/missing.html')[0])
+        self.assertEquals(403, self.get('/secret.py')[0])
+        self.stats.scan(0.002, 1)
+        self.stats.rebuild('index.html', 0.03)
+
+        status, content = self.get('/__folio/stats')
+        self.assertEquals(200, status)
+        stats = json.loads(content.decode('utf-8'))
+
+        # The stats endpoint is not counted.
+        requests = stats['requests']
+        self.assertEquals(3, requests['count'])
+        self.assertEquals({'200': 1, '403': 1, '404': 1}, requests['status'])
+        self.assertEquals({'.html': 2, '.py': 1}, requests['extensions'])
+        self.assertEquals(3, requests['latency']['count'])
+
+        self.assertEquals(1, stats['rebuilds']['count'])
+        self.assertEquals('index.html', stats['rebuilds']['last']['template'])
+        self.assertEquals([50, 1], stats['rebuilds']['duration']['buckets'][5])
+        self.assertEquals(0, stats['watcher']['pending'])
+        self.assertEquals(1, stats['watcher']['scans'])
+
+        cache = stats['caches'][Minifier.cache_key]
+        self.assertEquals({'hits': 0, 'misses': 1, 'ratio': 0.0}, cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+from __future__ import with_statement
+
+import os
+import json
+import unittest
+
+from filecmp import dircmp
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+
+from folio.sharding import build_shards, plan_shards, shard_path
+
+
+class PlanShardsTestCase(unittest.TestCase):
+
+    def test_hash(self):
+        templates = ['page%d.html' % n for n in range(20)]
+        shards = plan_shards(templates, 3)
+        self.assertEquals(3, len(shards))
+        self.assertEquals(sorted(templates), sorted(sum(shards, [])))
+        self.assertEquals(shards, plan_shards(list(reversed(templates)), 3))
+
+    def test_durations(self):
+        durations = {'a': 4.0, 'b': 3.0, 'c': 2.0, 'd': 1.0}
+        shards = plan_shards(['a', 'b', 'c', 'd', 'e'], 2, durations)
+        # The new template counts as the average.
+        self.assertEquals([['a', 'c'], ['b', 'd', 'e']], shards)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, plan_shards, ['a'], 0)
+
+
+class ShardedBuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.builddir = os.path.join(self.root, 'build')
+        os.makedirs(os.path.join(self.srcdir, 'pages'))
+
+        self.write('_layout.html', '<{% block body %}{% endblock %}>')
+        for n in range(10):
+            self.write('pages/page%d.html' % n,
+                       '{%% extends "_layout.html" %%}'
+                       '{%% block body %%}%d{%% endblock %%}' % n)
+        self.write('style.css', 'body {}')
+
+        self.proj = self.create_folio()
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.srcdir, name), 'w') as f:
+            f.write(content)
+
+    def create_folio(self):
+        proj = folio.Folio(__name__, source_path=self.srcdir,
+                           build_path=self.builddir)
+        proj.config['MANIFEST_PATH'] = os.path.join(self.root,
+                                                    'manifest.json')
+        return proj
+
+    def assertSameBuild(self):
+        full = os.path.join(self.root, 'full')
+        folio.Folio(__name__, source_path=self.srcdir,
+                    build_path=full).build()
+        cmp = dircmp(full, self.builddir)
+        self.assertEquals([], cmp.left_only + cmp.right_only)
+        self.assertEquals([], cmp.diff_files)
+        self.assertEquals([], cmp.subdirs['pages'].diff_files)
+
+    def test_shards(self):
+        names = set()
+        for index in range(3):
+            # Every shard is built by its own project, as in other process.
+            builded = self.create_folio().build(shard=(index, 3))
+            for _, dst, _ in builded:
+                self.assertTrue(dst.startswith(shard_path(self.proj, index)))
+                names.add(os.path.relpath(dst, shard_path(self.proj, index)))
+        self.assertEquals(11, len(names))
+
+        self.assertEquals(11, len(self.proj.merge_shards(3)))
+        self.assertEquals(11, len(self.proj.manifest))
+        self.assertTrue(os.path.exists(os.path.join(self.root,
+                                                    'manifest.json')))
+        self.assertSameBuild()
+
+        # The timings of the merged manifest are used by the next plan.
+        proj = self.create_folio()
+        proj.build(shard=(0, 2))
+        self.assertTrue(all(record.duration > 0 for record in
+                            proj.manifest.records.values()))
+
+    def test_build_shards(self):
+        self.assertEquals(11, len(build_shards(self.proj, 2)))
+        self.assertSameBuild()
+
+    def test_after_build(self):
+        self.write('reset.css', 'a {}')
+        for index in range(3):
+            proj = self.create_folio()
+            proj.config['SEARCH_PATTERNS'] = ['pages/*.html']
+            proj.config['BUNDLES'] = {'site.css': ['reset.css', 'style.css']}
+            proj.build(shard=(index, 3))
+            self.assertFalse(os.path.exists(os.path.join(
+                shard_path(proj, index), 'search.json')))
+
+        proj = self.create_folio()
+        proj.config['SEARCH_PATTERNS'] = ['pages/*.html']
+        proj.config['BUNDLES'] = {'site.css': ['reset.css', 'style.css']}
+        proj.merge_shards(3)
+
+        # The search index is written once, with the pages of every shard.
+        with open(os.path.join(self.builddir, 'search.json')) as f:
+            docs = json.load(f)['docs']
+        self.assertEquals(['pages/page%d.html' % n for n in range(10)],
+                          sorted(doc[0] for doc in docs))
+
+        # Every shard built the same bundle, it's merged once.
+        bundles = [name for name in os.listdir(self.builddir)
+                   if name.startswith('site.')]
+        self.assertEquals(1, len(bundles))
+
+    def test_missing_shard(self):
+        self.proj.build(shard=(0, 2))
+        self.assertRaises(LookupError, self.proj.merge_shards, 2)
+
+    def test_collision(self):
+        # Every template is built to the same destination.
+        for index in range(2):
+            proj = self.create_folio()
+            proj.translate_template_name = lambda template_name: 'same.html'
+            proj.build(shard=(index, 2))
+
+        self.assertRaises(ValueError, self.proj.merge_shards, 2)
+        self.assertFalse(os.path.exists(self.builddir))
+
+
+if __name__ == '__main__':
+    unittest.main()
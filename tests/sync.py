@@ -0,0 +1,112 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+import folio.sync
+
+from folio.output import MemoryOutput
+
+
+class SyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.srcdir = os.path.join(self.root, 'src')
+        self.target = os.path.join(self.root, 'www')
+        os.makedirs(os.path.join(self.srcdir, 'css'))
+
+        self.write('index.html', 'Index')
+        self.write('about.html', 'About')
+        self.write('css/style.css', 'body {}')
+
+        self.proj = folio.Folio(__name__, source_path=self.srcdir,
+                                build_path=os.path.join(self.root, 'build'))
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.srcdir, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(filename) + 10
+        os.utime(filename, (mtime, mtime))
+
+    def read(self, name):
+        with open(os.path.join(self.target, name)) as f:
+            return f.read()
+
+    def test_sync(self):
+        self.proj.build()
+        result = self.proj.sync(self.target)
+        self.assertEquals(['css/style.css', 'about.html', 'index.html'],
+                          result.copied)
+        self.assertEquals('Index', self.read('index.html'))
+
+        result = self.proj.sync(self.target)
+        self.assertEquals(([], [], 3), (result.copied, result.removed,
+                                        result.unchanged))
+
+        self.write('index.html', 'New index')
+        os.remove(os.path.join(self.srcdir, 'css', 'style.css'))
+        self.proj.build(incremental=True)
+
+        result = self.proj.sync(self.target)
+        self.assertEquals(['index.html'], result.copied)
+        self.assertEquals(['css/style.css'], result.removed)
+        self.assertEquals(1, result.unchanged)
+        self.assertEquals('New index', self.read('index.html'))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'css')))
+        self.assertEquals(['.folio-sync.json', 'about.html', 'index.html'],
+                          sorted(os.listdir(self.target)))
+
+    def test_checked(self):
+        self.proj.build()
+        self.proj.sync(self.target)
+
+        checked = []
+        file_signature = folio.sync.file_signature
+        folio.sync.file_signature = lambda dst: checked.append(dst) or \
+            file_signature(dst)
+        try:
+            self.write('index.html', 'New index')
+            self.proj.build(incremental=True)
+            result = self.proj.sync(self.target)
+
+            # Only the output of the built template is checked.
+            self.assertEquals(['index.html'], result.copied)
+            self.assertEquals(2, result.unchanged)
+            self.assertEquals(['index.html'],
+                              [os.path.basename(dst) for dst in checked])
+
+            # An output changed without a build is only seen with verify.
+            with open(os.path.join(self.proj.build_path, 'about.html'),
+                      'w') as f:
+                f.write('Changed')
+            self.assertEquals([], self.proj.sync(self.target).copied)
+            self.assertEquals(['about.html'],
+                              self.proj.sync(self.target,
+                                             verify=True).copied)
+        finally:
+            folio.sync.file_signature = file_signature
+
+    def test_link(self):
+        self.proj.build()
+        self.proj.sync(self.target, link=True)
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.proj.build_path, 'about.html'),
+            os.path.join(self.target, 'about.html')))
+
+    def test_not_directory(self):
+        self.proj.output = MemoryOutput()
+        self.proj.build()
+        self.assertRaises(ValueError, self.proj.sync, self.target)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from __future__ import with_statement
+
+import os
+import time
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+from folio.ext.themes import ThemeManager
+
+
+class ThemesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.themes = os.path.join(self.root, 'themes')
+
+        self.write('src/index.html', '{% extends theme("_base.html") %}'
+                                     '{% block body %}Hi{% endblock %}')
+        self.write('themes/basic/_base.html',
+                   'basic:{% block body %}{% endblock %}')
+        self.write('themes/basic/style.css', 'basic')
+        self.write('themes/basic/js/app.js', 'app')
+        self.write('themes/child/theme.conf', '[theme]\ninherit = basic\n'
+                                              'color = red\n')
+        self.write('themes/child/style.css', 'child')
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def write(self, name, content):
+        filename = os.path.join(self.root, name)
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.root, 'build', name)) as f:
+            return f.read()
+
+    def create_folio(self, theme):
+        proj = folio.Folio(__name__, extensions=['themes'],
+                           source_path=os.path.join(self.root, 'src'),
+                           build_path=os.path.join(self.root, 'build'))
+        proj.config.update({'THEME': theme, 'THEMES_PATHS': [self.themes]})
+        return proj
+
+    def test_build(self):
+        proj = self.create_folio('child')
+        proj.build()
+
+        self.assertEquals('basic:Hi', self.read('index.html'))
+        self.assertEquals('child', self.read('style.css'))
+        self.assertEquals('app', self.read('js/app.js'))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'build',
+                                                     'theme.conf')))
+
+    def test_inheritance(self):
+        manager = ThemeManager(paths=[self.themes])
+        child = manager.get_theme('child')
+
+        self.assertEquals('basic', child.parent.name)
+        self.assertEquals({'color': 'red'}, child.settings)
+
+        index = manager.get_index(child)
+        self.assertEquals(os.path.join(self.themes, 'child', 'style.css'),
+                          index['style.css'])
+        self.assertEquals(os.path.join(self.themes, 'basic', '_base.html'),
+                          index['_base.html'])
+
+    def test_instance_state(self):
+        one = ThemeManager(paths=[self.themes])
+        one.get_theme('basic')
+
+        self.assertEquals({}, ThemeManager().themes)
+        self.assertEquals([], ThemeManager().paths)
+
+    def test_refresh(self):
+        manager = ThemeManager(paths=[self.themes])
+        basic = manager.get_theme('basic')
+        manager.get_index(basic)
+
+        self.write('themes/basic/new.css', 'new')
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.themes, 'basic'), (mtime, mtime))
+        manager.refresh()
+
+        self.assertIn('new.css', manager.get_index(basic))
+
+
+if __name__ == '__main__':
+    unittest.main()
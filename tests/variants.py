@@ -0,0 +1,130 @@
+from __future__ import with_statement
+
+import os
+import unittest
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import folio
+from folio.builders import Wrapper
+from folio.variants import Variant
+
+
+class VariantsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+
+        self.write('src/index.html', '{% extends theme("_base.html") %}'
+                                     '{% block body %}{{ name }} '
+                                     '{{ config.LANG }}{% endblock %}')
+        self.write('src/logo.png', 'PNG')
+        self.write('src/post.txt', 'post')
+        self.write('src/_post.html', '{{ content }}')
+        self.write('themes/light/_base.html',
+                   'light:{% block body %}{% endblock %}')
+        self.write('themes/dark/_base.html',
+                   'dark:{% block body %}{% endblock %}')
+        self.write('themes/dark/dark.css', 'dark')
+
+        self.contexts = []
+        self.transforms = []
+
+        self.proj = folio.Folio(__name__, extensions=['themes'],
+                                source_path=os.path.join(self.root, 'src'),
+                                build_path=os.path.join(self.root, 'build'))
+        self.proj.config.update({'THEME': 'light', 'LANG': 'en',
+                                 'THEMES_PATHS': [os.path.join(self.root,
+                                                               'themes')]})
+        self.proj.add_context('index.html', self.context)
+        self.proj.init_config()
+        self.proj.add_builder('*.txt', Wrapper('_post.html',
+                                               transformer=self.transform))
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def context(self, env):
+        self.contexts.append(True)
+        return {'name': 'Folio'}
+
+    def transform(self, content):
+        self.transforms.append(True)
+        return content.upper()
+
+    def write(self, name, content):
+        filename = os.path.join(self.root, name)
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.root, 'build', name)) as f:
+            return f.read()
+
+    def build(self, jobs):
+        return self.proj.build_variants([
+            Variant('en'),
+            Variant('es', theme='dark', config={'LANG': 'es'}),
+        ], jobs=jobs)
+
+    def assertBuild(self, builded):
+        self.assertEquals(['en', 'es'], sorted(builded))
+        self.assertEquals(3, len(builded['en']))
+        self.assertEquals(4, len(builded['es']))
+
+        self.assertEquals('light:Folio en', self.read('en/index.html'))
+        self.assertEquals('dark:Folio es', self.read('es/index.html'))
+        self.assertEquals('POST', self.read('es/post.html'))
+        self.assertEquals('dark', self.read('es/dark.css'))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'build', 'en',
+                                                     'dark.css')))
+
+        self.assertEquals(1, len(self.contexts))
+        self.assertEquals(1, len(self.transforms))
+
+    def test_build_variants(self):
+        self.assertBuild(self.build(jobs=1))
+
+        en = os.stat(os.path.join(self.root, 'build', 'en', 'logo.png'))
+        es = os.stat(os.path.join(self.root, 'build', 'es', 'logo.png'))
+        self.assertEquals(en.st_ino, es.st_ino)
+
+    def test_build_variants_parallel(self):
+        self.assertBuild(self.build(jobs=2))
+
+    def test_configured_transforms(self):
+        proj = folio.Folio(__name__,
+                           source_path=os.path.join(self.root, 'src'),
+                           build_path=os.path.join(self.root, 'build'))
+        proj.config.update({'SEARCH_PATTERNS': ['*.html'],
+                            'MINIFY_PATTERNS': ['*.html']})
+        proj.add_transform('*.txt', self.transform)
+        proj.init_config()
+        proj.add_builder('*.txt', Wrapper('_post.html'))
+
+        variant = Variant('en').create_folio(proj)
+
+        self.assertEquals(3, len(proj.pipeline))
+        self.assertEquals(3, len(variant.pipeline))
+        self.assertEquals(proj.builders, variant.builders)
+        self.assertIsNot(proj.search_index, variant.search_index)
+        self.assertEquals([variant.search_index],
+                          [t for _, t in variant.pipeline.transforms
+                           if t is variant.search_index])
+
+    def test_memo_transformer(self):
+        memo = {}
+        src = os.path.join(self.root, 'src', 'post.txt')
+        upper = Wrapper('_post.html', transformer=lambda c: c.upper())
+        title = Wrapper('_post.html', transformer=lambda c: c.title())
+        upper.memo = title.memo = memo
+
+        self.assertEquals('POST', upper.read(self.proj.env, 'post.txt', src))
+        self.assertEquals('Post', title.read(self.proj.env, 'post.txt', src))
+
+
+if __name__ == '__main__':
+    unittest.main()